@@ -40,13 +40,14 @@ def _get_austria_polygon():
 
 
 def mask_field_to_austria(lon, lat, field):
-    """Return a copy of `field` with points outside Austria set to NaN.
+    """Return a copy of `field` with points outside Austria set to NaN
+    (float fields keep their type, see --precision).
 
     `lon`, `lat` and `field` are 2D numpy arrays sharing the same shape.
     """
     polygon = _get_austria_polygon()
     inside = contains_xy(polygon, lon, lat)
-    masked = field.astype(float, copy=True)
+    masked = field.astype(field.dtype if field.dtype.kind == 'f' else float, copy=True)
     masked[~inside] = np.nan
     return masked
 
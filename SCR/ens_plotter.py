@@ -232,7 +232,7 @@ def _compute_fields(ens, show, smooth_size, nbh_size, nbh_size_small, eps,
         obs_p90 = np.nanpercentile(obs, 90)
         step = 5. if obs_p90 < 20. else 10.
         threshold = max(step, float(np.ceil(obs_p90 / step) * step))
-        exceed = (data > threshold).astype(float)
+        exceed = (data > threshold).astype(data.dtype)
         if show['nbh']:
             mhe = _nbh_max_filter(exceed, nbh_size, nbh_shape)
             fm['nbh'] = (np.mean(mhe, axis=0), 'nbh')
@@ -1,8 +1,10 @@
 import re
 import numpy as np
-import fss_FFT
+import fss_backends
 import fss_SAT
 import parameter_settings
+import score_table
+import thread_budget
 from itertools import combinations
 from joblib import Parallel, delayed
 
@@ -77,14 +79,46 @@ def add_ensemble_pseudo_members(data_list, ensembles_dict):
     return data_list
 
 
+# bytes of member rows sorted at once by crps_ensemble
+CRPS_CHUNK_BYTES = 2**26
+
+
+def crps_ensemble(members, obs, chunk_bytes=CRPS_CHUNK_BYTES):
+    """
+    Ensemble CRPS per grid point of `members` (M, ny, nx) against `obs`
+    (ny, nx):
+
+        CRPS = mean_i |x_i - y| - 1/(2 M^2) sum_ij |x_i - x_j|
+
+    The pair term is taken from the sorted members x_(1) <= ... <= x_(M),
+    sum_ij |x_i - x_j| = 2 sum_i (2i - M - 1) x_(i), instead of the
+    (M, M, ny, nx) array of all differences.  The grid is processed in row
+    chunks of about `chunk_bytes` of members, so the temporaries stay a
+    fraction of the member cube.  A NaN in any member or the observation
+    gives NaN, as before.
+    """
+    n_members, ny, nx = members.shape
+    weights = (2.0 * np.arange(1, n_members + 1) - n_members - 1) / n_members**2
+    rows = max(1, int(chunk_bytes) // max(1, n_members * nx * 8))
+    crps = np.empty((ny, nx))
+    for start in range(0, ny, rows):
+        chunk = np.asarray(members[:, start:start + rows], dtype=np.float64)
+        t1 = np.mean(np.abs(chunk - obs[start:start + rows]), axis=0)
+        chunk = np.sort(chunk, axis=0)
+        t2 = np.tensordot(weights, chunk, axes=1)
+        crps[start:start + rows] = t1 - t2
+    return crps
+
+
 class Ensemble:
-    def __init__(self, data_list, single_ens_dict, ens_name, args):
+    def __init__(self, data_list, single_ens_dict, ens_name, args, obs_cache=None, scores=None):
         self.member_count = single_ens_dict['member_count']
         self.name = single_ens_dict['name']
         self.data_indices = single_ens_dict['data_indices']
         nx, ny = data_list[self.data_indices[0]]['precip_data_resampled'].shape
         self.precip_field_shape = (self.member_count, nx, ny)
-        self.precip_data_resampled = np.zeros(self.precip_field_shape)
+        self.precip_data_resampled = np.zeros(self.precip_field_shape,
+                                              dtype=data_list[self.data_indices[0]]['precip_data_resampled'].dtype)
         for ii, idx in enumerate(self.data_indices):
             self.precip_data_resampled[ii, :, :] = data_list[idx]['precip_data_resampled']
         self.obs_data_resampled = data_list[0]['precip_data_resampled']
@@ -97,9 +131,9 @@ class Ensemble:
         self.windows = prep_windows(ww, args.fss_calc_mode, nx, ny)
         self.fss_method = args.fss_method
         self.threads = args.threads
-        self.collect_member_scores(data_list)
+        self.collect_member_scores(data_list, scores)
         self.collect_metadata(data_list)
-        self.calc_scores()
+        self.calc_scores(obs_cache=obs_cache)
         self.save()
 
     def collect_metadata(self, data_list):
@@ -143,56 +177,57 @@ class Ensemble:
         'cwfss_robust',
     ]
 
-    def collect_member_scores(self, data_list):
+    def collect_member_scores(self, data_list, scores=None):
+        # scores: score_table.ScoreTable of data_list, built here if None
+        if scores is None:
+            scores = score_table.ScoreTable(data_list, columns=self.MEMBER_SCORE_KEYS)
+        members = [data_list[idx] for idx in self.data_indices]
         self.member_scores = {}
         for key in self.MEMBER_SCORE_KEYS:
-            vals = [data_list[idx].get(key) for idx in self.data_indices]
-            if all(v is not None for v in vals):
-                self.member_scores[key] = np.array(vals, dtype=float)
+            if scores.complete(key, members):
+                self.member_scores[key] = scores.values(key, members).astype(float)
         logger.info(f"  Collected member scores for {self.name}: "
                     f"{list(self.member_scores.keys())}")
         
-    def calc_scores(self):
+    def calc_scores(self, obs_cache=None):
+        # obs_cache (fss_SAT.ObsFSSCache of the observation) is passed through
+        # rather than stored, so it does not end up in the pickle
+        fss_frame = fss_backends.get_backend(self.fss_method, self.obs_data_resampled.shape, self.windows)
         logger.info(f"  Calculating pFSS for {self.name}")
-        if self.fss_method == "legacy":
-            self.pFSS = fss_FFT.fss_frame_eps(self.precip_data_resampled, self.obs_data_resampled, self.windows, self.thresholds)
-        else:
-            self.pFSS = fss_SAT.fss_cumsum_frame(self.precip_data_resampled, self.obs_data_resampled, self.windows, self.thresholds, eps=True)
+        self.pFSS = fss_frame(self.precip_data_resampled, self.obs_data_resampled, self.windows, self.thresholds, eps=True, obs_cache=obs_cache)
         logger.info(f"  Calculating emFSS for {self.name}")
-        if self.fss_method == "legacy":
-            self.emFSS = fss_FFT.fss_frame(np.mean(self.precip_data_resampled, axis=0), self.obs_data_resampled, self.windows, self.thresholds)
-        else:
-            self.emFSS = fss_SAT.fss_cumsum_frame(np.mean(self.precip_data_resampled, axis=0), self.obs_data_resampled, self.windows, self.thresholds)
+        self.emFSS = fss_frame(np.mean(self.precip_data_resampled, axis=0), self.obs_data_resampled, self.windows, self.thresholds, obs_cache=obs_cache)
         logger.info(f"  Calculating dFSS for {self.name}")
-        self.calc_dFSS()
+        self.calc_dFSS(fss_frame)
         logger.info(f"  Calculating CRPS for {self.name}")
         self.calc_CRPS()
 
 
-    def calc_dFSS(self):
-        combos = list(combinations([x for x in range(self.member_count)], 2))
-        if self.fss_method == "legacy":
-            self.dFSS = Parallel(n_jobs=self.threads, backend='threading')(delayed(fss_FFT.fss_raw)(
-            self.precip_data_resampled[combo[0]],
-            self.precip_data_resampled[combo[1]],
-            self.windows,
-            self.thresholds
-            ) for combo in combos)
+    def calc_dFSS(self, fss_frame):
+        if self.fss_method != "legacy" and not np.isnan(self.precip_data_resampled).any():
+            # the exact backends all give the summed area table scores, which
+            # come for all member pairs at once from shared box sums
+            with thread_budget.allocate(self.threads, 1, f"dFSS of {self.name}"):
+                self.dFSS = list(fss_SAT.fss_pairwise(self.precip_data_resampled, self.thresholds,
+                                                      [w[0] for w in self.windows]))
         else:
-            self.dFSS = Parallel(n_jobs=self.threads, backend='threading')(delayed(fss_SAT.fss_cumsum_frame)(
-            self.precip_data_resampled[combo[0]], 
-            self.precip_data_resampled[combo[1]], 
-            self.windows, 
-            self.thresholds, 
-            raw=True) for combo in combos)
+            self.dFSS = self._pairwise_dFSS(fss_frame)
         self.dFSSmean = np.nanmean(self.dFSS, axis=0)
         self.dFSSstdev = np.nanstd(self.dFSS, axis=0)
 
+    def _pairwise_dFSS(self, fss_frame):
+        combos = list(combinations([x for x in range(self.member_count)], 2))
+        with thread_budget.allocate(self.threads, len(combos), f"dFSS of {self.name}",
+                                    inner_tasks=len(self.thresholds)) as alloc:
+            return Parallel(n_jobs=alloc.outer, backend='threading')(delayed(fss_frame)(
+                self.precip_data_resampled[combo[0]],
+                self.precip_data_resampled[combo[1]],
+                self.windows,
+                self.thresholds,
+                raw=True, n_jobs=alloc.inner) for combo in combos)
+
     def calc_CRPS(self):
-        t1 = np.mean(np.abs(self.precip_data_resampled - self.obs_data_resampled), axis=0)
-        diffs = np.abs(self.precip_data_resampled[:, None, :, :] - self.precip_data_resampled[None, :, :, :])
-        t2 = 0.5 * np.mean(diffs, axis=(0, 1))
-        self.CRPS = t1 - t2
+        self.CRPS = crps_ensemble(self.precip_data_resampled, self.obs_data_resampled)
     
     def save(self):
         with open(f"ENS_{self.name}.p", "wb") as f:
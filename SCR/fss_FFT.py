@@ -1,7 +1,9 @@
 # from joblib import Parallel, delayed
 import numpy as np
 import pandas as pd
-from scipy import signal
+from scipy import fft, signal
+
+import quantiles
 
 import logging
 logger = logging.getLogger(__name__)
@@ -28,8 +30,8 @@ def fourier_fss(fcst, obs, threshold, window, percentiles, mode):
     if mode=='valid' and any(np.array(window) > np.array(fcst.shape)):
         return np.nan, np.nan, np.nan, np.nan
     if percentiles:
-      fhat = fourier_filter(fcst >= np.percentile(fcst, threshold), window, mode)
-      ohat = fourier_filter(obs >= np.percentile(obs, threshold), window, mode)
+      fhat = fourier_filter(fcst >= quantiles.percentile(fcst, threshold), window, mode)
+      ohat = fourier_filter(obs >= quantiles.percentile(obs, threshold), window, mode)
     else:
         fhat = fourier_filter(fcst > threshold, window, mode)
         ohat = fourier_filter(obs > threshold, window, mode)
@@ -53,8 +55,8 @@ def fourier_fss_eps(fcst, obs, threshold, window, percentiles, mode):
     if mode=='valid' and any(np.array(window) > np.array(fcst.shape)):
       return np.nan, np.nan, np.nan, np.nan
     if percentiles:
-      fhat = fourier_filter_eps(np.mean(fcst > np.percentile(fcst, threshold), axis=0), window, mode)
-      ohat = fourier_filter_eps(obs > np.percentile(obs, threshold), window, mode)
+      fhat = fourier_filter_eps(np.mean(fcst > quantiles.percentile(fcst, threshold), axis=0), window, mode)
+      ohat = fourier_filter_eps(obs > quantiles.percentile(obs, threshold), window, mode)
     else:
       fhat = fourier_filter_eps(np.mean(fcst > threshold, axis=0), window, mode)
       ohat = fourier_filter_eps(obs > threshold, window, mode)
@@ -65,15 +67,107 @@ def fourier_fss_eps(fcst, obs, threshold, window, percentiles, mode):
        fss_ret = 1.-num/denom
     return num, denom, fss_ret, ovest
     
-def fss_frame(fcst, obs, windows, levels, percentiles=False, mode='same'):
+def spectral_box_sums(fields, windows, mode, workers=None):
+    """
+    Box sums of a stack of fields (..., ny, nx) for every window, as
+    signal.fftconvolve(field, np.ones(window), mode) gives them, yielded
+    per window.
+
+    The fields are zero-padded to one fast FFT size that holds the full
+    linear convolution with the largest window and transformed only once.
+    Each window then costs the product with its kernel spectrum and one
+    inverse transform of the whole stack.  The values agree with
+    fftconvolve up to rounding.
+
+    :param windows: (wy, wx) window sizes.
+    :param workers: threads of the scipy.fft transforms.
+    """
+    fields = np.asarray(fields, dtype=np.float64)
+    ny, nx = fields.shape[-2:]
+    wy_max, wx_max = np.max(np.atleast_2d(windows), axis=0)
+    shape = (fft.next_fast_len(int(ny + wy_max - 1), True), fft.next_fast_len(int(nx + wx_max - 1), True))
+    spectrum = fft.rfft2(fields, s=shape, workers=workers)
+    for wy, wx in windows:
+        kernel = fft.rfft2(np.ones((wy, wx)), s=shape, workers=workers)
+        full = fft.irfft2(spectrum * kernel, s=shape, workers=workers)
+        if mode == 'full':
+            yield full[..., :ny + wy - 1, :nx + wx - 1]
+        elif mode == 'same':
+            oy, ox = (wy - 1) // 2, (wx - 1) // 2
+            yield full[..., oy:oy + ny, ox:ox + nx]
+        elif mode == 'valid':
+            yield full[..., wy - 1:ny, wx - 1:nx]
+        else:
+            raise ValueError(f"Unknown convolution mode {mode!r}")
+
+
+def _binary_levels(field, levels, percentiles, op):
+    """Stack of `field` binarised at every level with `op` (np.greater or
+    np.greater_equal), percentiles of the field with `percentiles`."""
+    cuts = quantiles.percentile(field, levels) if percentiles else np.asarray(levels, dtype=float)
+    return op(field, np.reshape(cuts, (-1,) + (1,) * field.ndim))
+
+
+def fss_spectral(fcst, obs, windows, levels, percentiles=False, mode='same', eps=False, workers=None):
+    """
+    FSS numerator, denominator, score and overestimation arrays (n_levels,
+    n_windows) for all levels and windows at once, the same values as
+    fourier_fss (fourier_fss_eps with `eps`) per level and window.
+
+    The binarised fields of all levels (the member mean for `eps`) are
+    stacked along a leading axis and go through spectral_box_sums together,
+    so each field is transformed once per call instead of once per level
+    and window.
+    """
+    windows = [tuple(int(v) for v in w) for w in windows]
+    ny, nx = obs.shape
+    if eps:
+        fbin = _binary_levels(fcst, levels, percentiles, np.greater).mean(axis=1)
+        obin = _binary_levels(obs, levels, percentiles, np.greater)
+        obs_op = np.greater
+    else:
+        fbin = _binary_levels(fcst, levels, percentiles, np.greater_equal if percentiles else np.greater)
+        obin = _binary_levels(obs, levels, percentiles, np.greater_equal if percentiles else np.greater)
+        obs_op = np.greater_equal
+    nlev = len(levels)
+    shape = (nlev, len(windows))
+    num, denom = np.full(shape, np.nan), np.full(shape, np.nan)
+    fits = [mode != 'valid' or (w[0] <= ny and w[1] <= nx) for w in windows]
+    fitting = [w for w, ok in zip(windows, fits) if ok]
+    if fitting:
+        cols = np.flatnonzero(fits)
+        for jj, hats in zip(cols, spectral_box_sums(np.concatenate([fbin, obin]), fitting, mode, workers)):
+            fhat, ohat = hats[:nlev], hats[nlev:]
+            num[:, jj] = np.nanmean(np.power(fhat - ohat, 2), axis=(-2, -1))
+            denom[:, jj] = np.nanmean(np.power(fhat, 2) + np.power(ohat, 2), axis=(-2, -1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fss_ret = 1. - num / denom
+    ovest_val = np.array([(np.sum(fcst > level) - np.sum(obs_op(obs, level))) / fcst.size
+                          for level in levels])
+    ovest = np.where(fits, ovest_val[:, None], np.nan)
+    return num, denom, fss_ret, ovest
+
+
+def _frames(ret, windows, levels):
+    col_windows = [w[0] for w in windows]
+    return tuple(pd.DataFrame(data, index=levels, columns=col_windows) for data in ret)
+
+
+def fss_frame(fcst, obs, windows, levels, percentiles=False, mode='same', engine="spectral", workers=None):
     """
     Compute the fraction skill score data-frame.
     :paramfcst: nd-array, forecast field.
     :paramobs: nd-array, observation field.
     :param window: list, window sizes.
     :param levels: list, threshold levels.
+    :param engine: "spectral" (fss_spectral, the default) or "convolve"
+        (one fftconvolve per level and window).
+    :param workers: threads of the scipy.fft transforms (spectral engine).
     return: list, dataframes of the FSS: numerator, denominator and score.
     """
+    if engine == "spectral":
+        return _frames(fss_spectral(fcst, obs, windows, levels, percentiles, mode, workers=workers),
+                       windows, levels)
     num_data_fft, den_data_fft, fss_data_fft, overestimated = [], [], [], []
     
     for level in levels:
@@ -82,21 +176,20 @@ def fss_frame(fcst, obs, windows, levels, percentiles=False, mode='same'):
         den_data_fft.append([x[1] for x in _data_fft])
         fss_data_fft.append([x[2] for x in _data_fft])
         overestimated.append([x[3] for x in _data_fft])
-    col_windows = [w[0] for w in windows]
-    return (pd.DataFrame(num_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(den_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(fss_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(overestimated, index=levels, columns=col_windows))
+    return _frames((num_data_fft, den_data_fft, fss_data_fft, overestimated), windows, levels)
 
-def fss_raw(fcst, obs, windows, levels, percentiles=False, mode='same'):
+def fss_raw(fcst, obs, windows, levels, percentiles=False, mode='same', engine="spectral", workers=None):
     """
     Compute the fraction skill score data-frame.
     :paramfcst: nd-array, forecast field.
     :paramobs: nd-array, observation field.
     :param window: list, window sizes.
     :param levels: list, threshold levels.
+    :param engine, workers: see fss_frame.
     return: list, dataframes of the FSS: numerator, denominator and score.
     """
+    if engine == "spectral":
+        return fss_spectral(fcst, obs, windows, levels, percentiles, mode, workers=workers)[2].tolist()
     fss_data_fft = []
     
     for level in levels:
@@ -105,15 +198,19 @@ def fss_raw(fcst, obs, windows, levels, percentiles=False, mode='same'):
         
     return fss_data_fft
 
-def fss_frame_eps(fcst, obs, windows, levels, percentiles=False, mode='same'):
+def fss_frame_eps(fcst, obs, windows, levels, percentiles=False, mode='same', engine="spectral", workers=None):
     """
     Compute the fraction skill score data-frame.
     :paramfcst: nd-array, forecast field.
     :paramobs: nd-array, observation field.
     :param window: list, window sizes.
     :param levels: list, threshold levels.
+    :param engine, workers: see fss_frame.
     return: list, dataframes of the FSS: numerator, denominator and score.
     """
+    if engine == "spectral":
+        return _frames(fss_spectral(fcst, obs, windows, levels, percentiles, mode, eps=True, workers=workers),
+                       windows, levels)
     num_data_fft, den_data_fft, fss_data_fft, overestimated = [], [], [], []
     
     for level in levels:
@@ -122,8 +219,4 @@ def fss_frame_eps(fcst, obs, windows, levels, percentiles=False, mode='same'):
         den_data_fft.append([x[1] for x in _data_fft])
         fss_data_fft.append([x[2] for x in _data_fft])
         overestimated.append([x[3] for x in _data_fft])
-    col_windows = [w[0] for w in windows]
-    return (pd.DataFrame(num_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(den_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(fss_data_fft,  index=levels, columns=col_windows),
-            pd.DataFrame(overestimated, index=levels, columns=col_windows))
+    return _frames((num_data_fft, den_data_fft, fss_data_fft, overestimated), windows, levels)
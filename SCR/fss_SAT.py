@@ -1,16 +1,48 @@
+import functools
+import hashlib
+import threading
 import numpy as np
 import time
 import pandas as pd
 
+import quantiles
+
 import logging
 logger = logging.getLogger(__name__)
 
 
+def _sat_dtype(shape, vmax=1):
+    """
+    Narrowest integer dtype for the summed area table of a field of `shape`
+    whose values lie in [0, vmax].
+
+    The largest table entry is ny * nx * vmax.  Box sums add two corners
+    before subtracting the other two, so int32 is only used while twice that
+    value still fits; larger grids fall back to int64.
+    """
+    npoints = int(np.prod(shape[-2:], dtype=np.int64))
+    if 2 * npoints * max(int(vmax), 1) <= np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
 def compute_integral_table(field):
+    """
+    Summed area table over the last two axes of `field` (2D or 3D).
+
+    Boolean and integer count fields are integrated in the narrowest integer
+    type that cannot overflow (see _sat_dtype) instead of numpy's default
+    int64, which halves the memory of every table and box sum.  Float fields
+    keep their dtype.
+    """
+    dtype = None
+    if field.dtype.kind in "biu":
+        vmax = 1 if field.dtype.kind == "b" or field.size == 0 else field.max()
+        dtype = _sat_dtype(field.shape, vmax)
     if field.ndim == 2:
-        return field.cumsum(1).cumsum(0)
+        return field.cumsum(1, dtype=dtype).cumsum(0, dtype=dtype)
     elif field.ndim == 3:
-        return field.cumsum(2).cumsum(1)
+        return field.cumsum(2, dtype=dtype).cumsum(1, dtype=dtype)
     else:
         logger.critical(f"FSS calculation received a {field.ndim}D array, only 2D and 3D is supported! Aborting...")
         exit(1)
@@ -26,34 +58,81 @@ def integral_filter(field, n):
     :param field: nd-array of binary hits/misses (2D or 3D).
     :param n: window size.
     """
-    w = n // 2
-    if w < 1:
-        return field
+    return next(integral_filter_multi(field, [n]))
 
+
+def integral_filter_multi(field, windows):
+    """
+    Box sums of a summed area table for several window sizes.
+
+    The table is padded (edge mode) only once, to the half width of the
+    largest window, and the box sums of every window are sliced out of views
+    of that single padded buffer.  Edge padding to the larger width and then
+    skipping the outer rows/columns gives exactly the same lookups as padding
+    to each window's own width, so the results are bit-identical to calling
+    integral_filter per window.  Yields one box-sum array per window, in the
+    order given.
+
+    :param field: nd-array, summed area table (2D or 3D).
+    :param windows: iterable of window sizes.
+    """
+    windows = list(windows)
+    W = max([n // 2 for n in windows] + [0])
     rows, cols = field.shape[-2], field.shape[-1]
-    D = 2 * w
+    if W >= 1:
+        pad = ((0, 0),) * (field.ndim - 2) + ((W, W), (W, W))
+        p = np.pad(field, pad, mode='edge')
 
-    # Pad with edge values so clamped lookups become simple slicing
-    if field.ndim == 2:
-        p = np.pad(field, w, mode='edge')
-        return (p[D:D+rows, D:D+cols] + p[:rows, :cols]
-              - p[:rows, D:D+cols] - p[D:D+rows, :cols])
-    else:  # 3D
-        p = np.pad(field, ((0, 0), (w, w), (w, w)), mode='edge')
-        return (p[:, D:D+rows, D:D+cols] + p[:, :rows, :cols]
-              - p[:, :rows, D:D+cols] - p[:, D:D+rows, :cols])
+    for n in windows:
+        w = n // 2
+        if w < 1:
+            yield field
+            continue
+        o = W - w          # offset of this window's padding inside the buffer
+        D = 2 * w
+        yield (p[..., o+D:o+D+rows, o+D:o+D+cols] + p[..., o:o+rows, o:o+cols]
+               - p[..., o:o+rows, o+D:o+D+cols] - p[..., o+D:o+D+rows, o:o+cols])
+
+
+# float64 represents every integer below 2**53 exactly
+_EXACT_FLOAT_LIMIT = 2.0 ** 53
 
 
-def _fss_score(fhat, ohat, inv_area_sq):
-    """Compute FSS num, denom, score using BLAS dot products (zero temp arrays)."""
-    fflat = fhat.ravel()
-    oflat = ohat.ravel()
-    n = fflat.size
+def _products(fhat, ohat, work=None):
+    """
+    Sums ff, oo, fo of the products of two box-sum fields.
 
-    ff = np.dot(fflat, fflat)
-    oo = np.dot(oflat, oflat)
-    fo = np.dot(fflat, oflat)
+    NumPy has no BLAS path for integer dot products, so both fields are
+    copied into the rows of a (2, n) float64 work array and the three sums
+    are BLAS dot products of its rows.  For integer box sums all terms
+    are non-negative, so the float result is exact as long as the largest
+    sum stays below 2**53; beyond that the sums are recomputed in int64.
 
+    :param work: optional (2, fhat.size) float64 buffer, reused between calls.
+    """
+    n = fhat.size
+    if work is None or work.shape != (2, n):
+        work = np.empty((2, n))
+    work[0] = fhat.ravel()
+    work[1] = ohat.ravel()
+    fflat, oflat = work
+    ff, oo, fo = np.dot(fflat, fflat), np.dot(oflat, oflat), np.dot(fflat, oflat)
+    if fhat.dtype.kind in "iu" and ohat.dtype.kind in "iu" and ff + oo >= _EXACT_FLOAT_LIMIT:
+        fflat = fhat.ravel().astype(np.int64)
+        oflat = ohat.ravel().astype(np.int64)
+        ff, oo, fo = np.dot(fflat, fflat), np.dot(oflat, oflat), np.dot(fflat, oflat)
+    return ff, oo, fo
+
+
+def _fss_score(fhat, ohat, inv_area_sq, work=None):
+    """Compute FSS num, denom, score using BLAS dot products, see _products
+    (`work` is its optional buffer)."""
+    ff, oo, fo = _products(fhat, ohat, work)
+    return _score_from_products(ff, oo, fo, fhat.size, inv_area_sq)
+
+
+def _score_from_products(ff, oo, fo, n, inv_area_sq):
+    """FSS num, denom, score from the sums of products of `n` box sums."""
     num   = inv_area_sq * (ff + oo - 2.0 * fo) / n
     denom = inv_area_sq * (ff + oo) / n
 
@@ -62,7 +141,57 @@ def _fss_score(fhat, ohat, inv_area_sq):
     return num, denom, 1.0 - num / denom
 
 
-def _fss_score_masked(Sf, So, C):
+class MaskedWorkspace:
+    """
+    Full-grid float64 buffers of the missing-data score (_fss_score_masked)
+    for one grid shape, so that scoring allocates no temporaries per window
+    and threshold.  Buffers are only valid until the next score computed
+    with the same workspace; use one workspace per thread (see workspace()).
+    """
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.valid = np.empty(self.shape)       # C, valid points per window
+        self.inv = np.empty(self.shape)         # 1 / C
+        self.positive = np.empty(self.shape, dtype=bool)
+        self.a = np.empty(self.shape)
+        self.b = np.empty(self.shape)
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in (self.valid, self.inv, self.positive, self.a, self.b))
+
+
+_workspaces = threading.local()
+
+
+def workspace(shape):
+    """The MaskedWorkspace of the calling thread for grids of `shape`; it is
+    kept and reused until a grid of another shape is scored."""
+    ws = getattr(_workspaces, "ws", None)
+    if ws is None or ws.shape != tuple(shape):
+        ws = _workspaces.ws = MaskedWorkspace(shape)
+    return ws
+
+
+def _valid_counts(invalid_hat, w, out=None):
+    """Valid points C of every window of half width `w`: the window area
+    minus the box sums of the invalid-point table."""
+    return np.subtract((2.0 * w + 1.0) ** 2, invalid_hat, out=out, dtype=np.float64)
+
+
+def _masked_weights(C, ws=None):
+    """Weights 1 / C (0 where C == 0) and their normalisation sum(C) of the
+    missing-data score, into the buffers of `ws` if given."""
+    if ws is None:
+        with np.errstate(divide='ignore'):
+            return np.where(C > 0, 1.0 / C, 0.0), C.sum()
+    np.greater(C, 0, out=ws.positive)
+    ws.inv.fill(0.0)
+    np.divide(1.0, C, out=ws.inv, where=ws.positive)
+    return ws.inv, C.sum()
+
+
+def _fss_score_masked(Sf, So, C, ws=None, weights=None):
     """
     Missing-data FSS score with per-window valid-point weighting.
 
@@ -78,17 +207,32 @@ def _fss_score_masked(Sf, So, C):
     the (boundary-clamped) window, so with no missing data C equals the constant
     window area everywhere and the score reduces exactly to the clean fast path.
     Windows with no valid points (C == 0) drop out naturally.
+
+    With a MaskedWorkspace `ws` the terms are computed in place in its
+    buffers; `weights` are the (1 / C, sum(C)) of _masked_weights, which
+    only depend on the window and are shared by all fields scored for it.
     """
-    with np.errstate(divide='ignore'):
-        inv = np.where(C > 0, 1.0 / C, 0.0)
-    diff = Sf - So
-    wsum = C.sum()
+    inv, wsum = _masked_weights(C, ws) if weights is None else weights
 
     if wsum == 0.0:
         return 0.0, 0.0, np.nan
 
-    num   = np.sum(diff * diff * inv) / wsum
-    denom = np.sum((Sf * Sf + So * So) * inv) / wsum
+    # box sums may be compact integers, square them in float64
+    if ws is None:
+        diff = np.subtract(Sf, So, dtype=np.float64)
+        num   = np.sum(diff * diff * inv) / wsum
+        denom = np.sum((np.square(Sf, dtype=np.float64) + np.square(So, dtype=np.float64)) * inv) / wsum
+    else:
+        a, b = ws.a, ws.b
+        np.subtract(Sf, So, out=a, dtype=np.float64)
+        np.multiply(a, a, out=a)
+        np.multiply(a, inv, out=a)
+        num = np.sum(a) / wsum
+        np.square(Sf, out=a, dtype=np.float64)
+        np.square(So, out=b, dtype=np.float64)
+        np.add(a, b, out=a)
+        np.multiply(a, inv, out=a)
+        denom = np.sum(a) / wsum
 
     if denom == 0.0:
         return num, denom, np.nan
@@ -107,41 +251,132 @@ def fss(fcst, obs, window, fcst_cache, obs_cache, threshold_mode="over", invalid
         binary SATs.
     :return: tuple of FSS numerator, denominator and score.
     """
-    fhat = integral_filter(fcst_cache, window)
-    ohat = integral_filter(obs_cache, window)
+    num, denom, score = _fss_windows(fcst_cache, obs_cache, [window], invalid_cache=invalid_cache)
+    return num[0], denom[0], score[0]
+
+
+def _fss_windows(mod_bin, obs_bin, windows, invalid_cache=None, obs_boxes=None, mod_scale=None,
+                 boxes=integral_filter_multi, valid_weights=None):
+    """
+    FSS numerator, denominator and score for every window from a pair of SATs.
+
+    `mod_bin`/`obs_bin` are either single 2D integral tables or stacks of
+    shape (n_thresholds, ny, nx); the returned arrays have the leading shape
+    of the SATs plus a trailing window axis.  Box sums come from
+    integral_filter_multi, so each SAT is padded only once for all windows.
+    With `invalid_cache` the missing-data path is used, see fss(); the valid
+    count is then the full window area minus the missing points the window
+    contains.  `obs_boxes` optionally supplies the observation box sums for
+    each window (e.g. from an ObsFSSCache), `obs_bin` is then not used.
+    `mod_scale` multiplies the forecast box sums, e.g. to turn integer
+    member counts into ensemble probabilities.  `boxes` yields the box sums
+    of a table for each window (see SATBoxFilter).  `valid_weights`
+    optionally supplies the missing-data weights of each window (e.g. from
+    ObsFSSCache.valid_weights) and selects the missing-data path without an
+    `invalid_cache`.
+    """
+    lead = mod_bin.shape[:-2]
+    num_t = np.zeros(lead + (len(windows),))
+    den_t = np.zeros(lead + (len(windows),))
+    fss_t = np.zeros(lead + (len(windows),))
+    fhats = boxes(mod_bin, windows)
+    ohats = boxes(obs_bin, windows) if obs_boxes is None else iter(obs_boxes)
+    masked = invalid_cache is not None or valid_weights is not None
+    if masked:
+        if valid_weights is None:
+            invalid_hats = boxes(invalid_cache, windows)
+        else:
+            valid_weights = iter(valid_weights)
+        ws = workspace(mod_bin.shape[-2:])
+    else:
+        work = np.empty((2, mod_bin.shape[-2] * mod_bin.shape[-1]))
+    for jj, window in enumerate(windows):
+        fhat = next(fhats)
+        if mod_scale is not None:
+            fhat = fhat * mod_scale
+        ohat = next(ohats)
+        w = window // 2
+        if valid_weights is not None:
+            weights = next(valid_weights)
+        elif masked:
+            weights = _masked_weights(_valid_counts(next(invalid_hats), w, out=ws.valid), ws)
+        else:
+            inv_area_sq = 1.0 / (2.0 * w + 1.0) ** 4
+        for idx in np.ndindex(lead):
+            if masked:
+                score = _fss_score_masked(fhat[idx], ohat[idx], None, ws, weights)
+            else:
+                score = _fss_score(fhat[idx], ohat[idx], inv_area_sq, work)
+            num_t[idx + (jj,)], den_t[idx + (jj,)], fss_t[idx + (jj,)] = score
+    return num_t, den_t, fss_t
+
+
+class SATBoxFilter:
+    """
+    Box-sum stage of the FSS: summed area tables and their box sums.
+
+    This is the default engine of this module.  Other engines (see
+    fss_backends.py) override `table` and `boxes`, or `windows` as a whole,
+    and must reproduce these box sums exactly, boundary clamping included,
+    so that every engine gives the same scores.
+    """
+    name = "sat"
 
-    w = window // 2
+    def table(self, field):
+        """Precomputed table of a (stack of) binary field(s) that the box
+        sums are taken from."""
+        return compute_integral_table(field)
 
-    if invalid_cache is not None:
-        # Valid count = full window area minus the missing points it contains.
-        area = (2.0 * w + 1.0) ** 2
-        C = area - integral_filter(invalid_cache, window)
-        return _fss_score_masked(fhat, ohat, C)
+    def boxes(self, table, windows):
+        """Yield the box sums of `table` for each window."""
+        return integral_filter_multi(table, windows)
 
-    inv_area_sq = 1.0 / (2.0 * w + 1.0) ** 4   # (inv_window_area)^2
+    def windows(self, mod_tab, obs_tab, windows, invalid_tab=None, obs_boxes=None, mod_scale=None,
+                valid_weights=None):
+        """FSS numerator, denominator and score for every window, see _fss_windows."""
+        return _fss_windows(mod_tab, obs_tab, windows, invalid_cache=invalid_tab, obs_boxes=obs_boxes,
+                            mod_scale=mod_scale, boxes=self.boxes, valid_weights=valid_weights)
 
-    return _fss_score(fhat, ohat, inv_area_sq)
+
+SAT_BOX_FILTER = SATBoxFilter()
+
+
+def _binary_stack(field, t1, t2, threshold_mode, tolerance):
+    """Binarise `field` at all thresholds `t1` (and upper bounds `t2` in
+    "between" mode) at once, returning a (n_thresholds, ny, nx) boolean stack.
+    NaN comparisons evaluate to False."""
+    t1 = np.asarray(t1, dtype=float)[:, None, None]
+    with np.errstate(invalid='ignore'):
+        if threshold_mode == "over":
+            return field > t1
+        elif threshold_mode == "under":
+            return field <= t1
+        elif threshold_mode == "between":
+            t2 = np.asarray(t2, dtype=float)[:, None, None]
+            return (field > t1) & (field <= t2)
+        elif threshold_mode == "tolerance":
+            return (field > (1.-tolerance) * t1) & (field <= (1.+tolerance) * t1)
 
 
 def _build_binary_sat(fcst, obs, t1, t2, t1o, t1f, percentiles,
                       threshold_mode, tolerance):
     """Build integral tables for the binarised forecast and observation fields."""
     if threshold_mode == "over":
-        obs_bin = compute_integral_table((obs > t1o).astype(int))
-        mod_bin = compute_integral_table((fcst > t1f).astype(int))
+        obs_bin = compute_integral_table((obs > t1o))
+        mod_bin = compute_integral_table((fcst > t1f))
     elif threshold_mode == "under":
-        obs_bin = compute_integral_table((obs <= t1o).astype(int))
-        mod_bin = compute_integral_table((fcst <= t1f).astype(int))
+        obs_bin = compute_integral_table((obs <= t1o))
+        mod_bin = compute_integral_table((fcst <= t1f))
     elif threshold_mode == "between":
-        t2o = np.percentile(obs, t2) if percentiles else t2
-        t2f = np.percentile(fcst, t2) if percentiles else t2
-        obs_bin = compute_integral_table(((obs > t1o) & (obs <= t2o)).astype(int))
-        mod_bin = compute_integral_table(((fcst > t1f) & (fcst <= t2f)).astype(int))
+        t2o = quantiles.percentile(obs, t2) if percentiles else t2
+        t2f = quantiles.percentile(fcst, t2) if percentiles else t2
+        obs_bin = compute_integral_table(((obs > t1o) & (obs <= t2o)))
+        mod_bin = compute_integral_table(((fcst > t1f) & (fcst <= t2f)))
     elif threshold_mode == "tolerance":
         obs_bin = compute_integral_table(
-            ((obs > (1.-tolerance) * t1o) & (obs <= (1.+tolerance)*t1o)).astype(int))
+            ((obs > (1.-tolerance) * t1o) & (obs <= (1.+tolerance)*t1o)))
         mod_bin = compute_integral_table(
-            ((fcst > (1.-tolerance) * t1f) & (fcst <= (1.+tolerance)*t1f)).astype(int))
+            ((fcst > (1.-tolerance) * t1f) & (fcst <= (1.+tolerance)*t1f)))
     return mod_bin, obs_bin
 
 
@@ -157,13 +392,20 @@ def _invalid_sat(mask):
     Used to subtract missing points from the full window area, so the per-window
     valid count matches the clean path's constant area where nothing is missing.
     """
-    return compute_integral_table((~mask).astype(float))
+    return compute_integral_table(~mask)
 
 
 def _build_binary_sat_masked(fcst, obs, t1, t2, t1o, t1f, percentiles,
-                             threshold_mode, tolerance, mask):
+                             threshold_mode, tolerance, mask, crop=None):
     """Like _build_binary_sat, but zeros out missing points (via `mask`) so they
-    do not contribute to the windowed sums, and binarises to float."""
+    do not contribute to the windowed sums, and binarises to float.  With
+    `crop` (see _valid_crop) only that part of the fields is integrated; the
+    percentile thresholds still come from the whole fields."""
+    if threshold_mode == "between":
+        t2o = quantiles.percentile(obs, t2, nan=True) if percentiles else t2
+        t2f = quantiles.percentile(fcst, t2, nan=True) if percentiles else t2
+    if crop is not None:
+        fcst, obs, mask = fcst[crop], obs[crop], mask[crop]
     with np.errstate(invalid='ignore'):  # NaN comparisons are intentional -> False
         if threshold_mode == "over":
             obs_b = (obs > t1o) & mask
@@ -172,52 +414,257 @@ def _build_binary_sat_masked(fcst, obs, t1, t2, t1o, t1f, percentiles,
             obs_b = (obs <= t1o) & mask
             mod_b = (fcst <= t1f) & mask
         elif threshold_mode == "between":
-            t2o = np.nanpercentile(obs, t2) if percentiles else t2
-            t2f = np.nanpercentile(fcst, t2) if percentiles else t2
             obs_b = (obs > t1o) & (obs <= t2o) & mask
             mod_b = (fcst > t1f) & (fcst <= t2f) & mask
         elif threshold_mode == "tolerance":
             obs_b = (obs > (1.-tolerance) * t1o) & (obs <= (1.+tolerance)*t1o) & mask
             mod_b = (fcst > (1.-tolerance) * t1f) & (fcst <= (1.+tolerance)*t1f) & mask
-    obs_bin = compute_integral_table(obs_b.astype(float))
-    mod_bin = compute_integral_table(mod_b.astype(float))
+    obs_bin = compute_integral_table(obs_b)
+    mod_bin = compute_integral_table(mod_b)
     return mod_bin, obs_bin
 
 
-def fss_threshold(fcst, obs, t1, t2, windows, percentiles=False, threshold_mode="over", tolerance=0.1):
-    num_t = np.zeros(windows.shape)
-    den_t = np.zeros(windows.shape)
-    fss_t = np.zeros(windows.shape)
+def _valid_crop(mask, halo):
+    """
+    Slices of the bounding box of the valid points of `mask`, grown by
+    `halo` points on each side (clipped to the grid).
+
+    Missing points are zero in the masked binary fields, so with `halo` at
+    least half the largest window the box sums inside the crop equal those
+    of the whole grid, and window centres outside it contain no valid point
+    and add nothing to the missing-data sums.  Only the valid counts C see
+    the grid beyond the crop (missing points lower C, points beyond the grid
+    edge do not), so the weights are taken from the whole grid and cropped
+    (see _crop_weights).  The crop is the whole grid when nothing is valid.
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return np.s_[:, :]
+    return (slice(max(rows[0] - halo, 0), rows[-1] + halo + 1),
+            slice(max(cols[0] - halo, 0), cols[-1] + halo + 1))
+
+
+def _valid_weights(invalid_hats, windows):
+    """Yield the missing-data weights (1 / C, sum(C)) of each window from
+    the box sums `invalid_hats` of the invalid-point table."""
+    for n, box in zip(windows, invalid_hats):
+        yield _masked_weights(_valid_counts(box, n // 2))
+
+
+def _crop_weights(weights, crop):
+    """Whole-grid weights of _valid_weights cut to `crop`; sum(C) stays that
+    of the whole grid."""
+    return ((inv[crop], wsum) for inv, wsum in weights)
+
+
+def _crop_boxes(boxes, crop):
+    """Whole-grid box sums (stacks) of each window cut to `crop`."""
+    return (box[(Ellipsis,) + crop] for box in boxes)
+
+
+def _mask_key(mask):
+    """Hashable key of a validity mask, None when nothing is missing."""
+    if mask is None or mask.all():
+        return None
+    return (mask.shape, hashlib.blake2b(np.packbits(mask).tobytes(), digest_size=16).hexdigest())
+
+
+def _window_results(windows, results):
+    """Lookup of the per-window results of a generator over `windows`, which
+    must be requested in the order of `windows` (skipping some is allowed)."""
+    pairs = zip(windows, results)
+
+    def result(n):
+        for window, value in pairs:
+            if window == n:
+                return value
+        raise KeyError(n)
+    return result
+
+
+class ObsFSSCache:
+    """
+    Observation-side FSS intermediates, shared by all simulations that are
+    verified against the same observation field (one subdomain).
+
+    The observation is binarised, integrated and box-summed identically for
+    every model, so the percentile thresholds, binary integral tables, box
+    sums and exceedance counts are computed once and looked up afterwards,
+    as are the valid-point weights of the missing-data score, which only
+    depend on the validity mask.  Entries are keyed by thresholds, threshold_mode, tolerance, window and
+    the validity mask (by hash), so models with different missing-data masks
+    still get correct results.
+
+    Integral tables and box sums are full-grid arrays; they are only stored
+    while the total size stays below `max_bytes`, further ones are computed
+    on the fly.  The cache must only be used with the observation field it
+    was built from.  Lookups are safe from several threads: the store and
+    its byte count are guarded by a lock, and concurrent misses of the same
+    key wait for the thread computing it instead of computing it again.
+    """
+    def __init__(self, obs, max_bytes=2**30):
+        self.obs = obs
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._store = {}
+        self._lock = threading.Lock()
+        self._pending = {}          # key -> lock held while the entry is computed
+
+    def _put(self, key, value, large=False):
+        with self._lock:
+            if key in self._store:
+                return
+            if not large:
+                self._store[key] = value
+                return
+            nbytes = sum(v.nbytes for v in value) if isinstance(value, tuple) else value.nbytes
+            if self.nbytes + nbytes <= self.max_bytes:
+                self._store[key] = value
+                self.nbytes += nbytes
+
+    def _lookup(self, key):
+        """(True, entry) for a stored `key` (counted as a hit), else (False, None)."""
+        with self._lock:
+            if key in self._store:
+                self.hits += 1
+                return True, self._store[key]
+        return False, None
+
+    def _stored(self, keys):
+        with self._lock:
+            return {key for key in keys if key in self._store}
+
+    def get(self, key, func, large=False):
+        """Return the entry stored under `key`, computing it with `func()` on
+        a miss.  `large` entries (full-grid arrays) count against max_bytes."""
+        found, value = self._lookup(key)
+        if found:
+            return value
+        with self._lock:
+            pending = self._pending.setdefault(key, threading.Lock())
+        with pending:
+            try:
+                found, value = self._lookup(key)
+                if found:
+                    return value
+                with self._lock:
+                    self.misses += 1
+                value = func()
+                self._put(key, value, large=large)
+            finally:
+                # also when func() raises, so failed keys leave no lock behind
+                with self._lock:
+                    self._pending.pop(key, None)
+        return value
+
+    def percentile(self, q, nan=False):
+        """np.percentile (np.nanpercentile if `nan`) of the observation."""
+        return quantiles.percentile(self.obs, q, nan=nan)
+
+    def _sat_key(self, t1, t2, threshold_mode, tolerance, mask):
+        t1 = tuple(np.atleast_1d(t1).astype(float).tolist())
+        t2 = None if t2 is None else tuple(np.atleast_1d(t2).astype(float).tolist())
+        return ('sat', t1, t2, threshold_mode, tolerance, _mask_key(mask))
+
+    def sat(self, t1, t2, threshold_mode, tolerance, mask=None):
+        """Integral tables of the binarised observation at thresholds `t1`
+        (and `t2` in "between" mode), as a (n_thresholds, ny, nx) stack.
+        With a mask the missing points are zeroed before integrating."""
+        key = self._sat_key(t1, t2, threshold_mode, tolerance, mask)
+        return self.get(key, lambda: self._build_sat(t1, t2, threshold_mode, tolerance, mask),
+                         large=True)
+
+    def _build_sat(self, t1, t2, threshold_mode, tolerance, mask):
+        obs_b = _binary_stack(self.obs, np.atleast_1d(t1), t2, threshold_mode, tolerance)
+        if _mask_key(mask) is None:
+            return compute_integral_table(obs_b)
+        return compute_integral_table(obs_b & mask)
+
+    def box_sums(self, t1, t2, threshold_mode, tolerance, windows, mask=None, store_sat=True):
+        """Yield the observation box sums for each window (stacked over the
+        thresholds), computing missing windows from a single padded table.
+        With `store_sat=False` only the box sums are kept, not the integral
+        table they were derived from (for one-off thresholds)."""
+        key = self._sat_key(t1, t2, threshold_mode, tolerance, mask)
+        stored = self._stored([key + (n,) for n in windows])
+        missing = [n for n in windows if key + (n,) not in stored]
+        if missing:
+            if store_sat:
+                sat = self.sat(t1, t2, threshold_mode, tolerance, mask=mask)
+            else:
+                sat = self._build_sat(t1, t2, threshold_mode, tolerance, mask)
+            fresh = _window_results(missing, integral_filter_multi(sat, missing))
+        for n in windows:
+            yield self.get(key + (n,), lambda: fresh(n), large=True)
+
+    def invalid_table(self, mask):
+        """Integral table of the missing points of `mask` (_invalid_sat)."""
+        return self.get(('invalid', _mask_key(mask)), lambda: _invalid_sat(mask), large=True)
+
+    def valid_weights(self, mask, windows):
+        """Yield the missing-data weights (1 / C, sum(C)) of _masked_weights
+        for each window, C being the valid points per window of `mask`.
+        They only depend on the mask, so every threshold, percentile run,
+        model and CWFSS sample scored with the same mask shares them."""
+        key = ('weights', _mask_key(mask))
+        stored = self._stored([key + (n,) for n in windows])
+        missing = [n for n in windows if key + (n,) not in stored]
+        if missing:
+            invalid_hats = _window_results(missing, integral_filter_multi(self.invalid_table(mask), missing))
+        for n in windows:
+            yield self.get(key + (n,), lambda: _masked_weights(_valid_counts(invalid_hats(n), n // 2)),
+                           large=True)
+
+    def count_over(self, t, mask=None):
+        """Number of (valid) observation points above each threshold in `t`."""
+        key = ('count', tuple(np.atleast_1d(t).astype(float).tolist()), _mask_key(mask))
+
+        def count():
+            over = _binary_stack(self.obs, np.atleast_1d(t), None, "over", None)
+            if _mask_key(mask) is not None:
+                over &= mask
+            return np.count_nonzero(over, axis=(1, 2))
+        return self.get(key, count)
+
+
+def fss_threshold(fcst, obs, t1, t2, windows, percentiles=False, threshold_mode="over", tolerance=0.1,
+                  obs_cache=None, box_filter=None):
+    if obs_cache is not None or box_filter is not None:
+        # the batched engine knows how to consult the observation cache and
+        # how to use other box filters
+        ret = fss_threshold_batch(fcst, obs, [(t1, t2)], windows, percentiles=percentiles,
+                                  threshold_mode=threshold_mode, tolerance=tolerance,
+                                  obs_cache=obs_cache, box_filter=box_filter)
+        return list(ret[:, 0])
 
     mask = _validity_mask(fcst, obs)
 
     if mask.all():
         # ── clean fast path (unchanged) ──
-        t1o = np.percentile(obs, t1) if percentiles else t1
-        t1f = np.percentile(fcst, t1) if percentiles else t1
+        t1o = quantiles.percentile(obs, t1) if percentiles else t1
+        t1f = quantiles.percentile(fcst, t1) if percentiles else t1
 
         mod_bin, obs_bin = _build_binary_sat(
             fcst, obs, t1, t2, t1o, t1f, percentiles, threshold_mode, tolerance)
 
-        for jj, window in enumerate(windows):
-            num_t[jj], den_t[jj], fss_t[jj] = fss(fcst, obs, window,
-                                                    fcst_cache=mod_bin, obs_cache=obs_bin,
-                                                    threshold_mode=threshold_mode)
+        num_t, den_t, fss_t = _fss_windows(mod_bin, obs_bin, windows)
         ovest_val = (np.sum(fcst > t1) - np.sum(obs > t1)) / fcst.size
     else:
         # ── missing-data path (per-window valid-point weighting) ──
-        t1o = np.nanpercentile(obs, t1) if percentiles else t1
-        t1f = np.nanpercentile(fcst, t1) if percentiles else t1
+        t1o = quantiles.percentile(obs, t1, nan=True) if percentiles else t1
+        t1f = quantiles.percentile(fcst, t1, nan=True) if percentiles else t1
 
+        # only the bounding box of the valid points (plus half a window) is scored
+        crop = _valid_crop(mask, max(windows) // 2)
         mod_bin, obs_bin = _build_binary_sat_masked(
-            fcst, obs, t1, t2, t1o, t1f, percentiles, threshold_mode, tolerance, mask)
-        invalid_sat = _invalid_sat(mask)
-
-        for jj, window in enumerate(windows):
-            num_t[jj], den_t[jj], fss_t[jj] = fss(fcst, obs, window,
-                                                    fcst_cache=mod_bin, obs_cache=obs_bin,
-                                                    threshold_mode=threshold_mode,
-                                                    invalid_cache=invalid_sat)
+            fcst, obs, t1, t2, t1o, t1f, percentiles, threshold_mode, tolerance, mask, crop=crop)
+        weights = _valid_weights(integral_filter_multi(_invalid_sat(mask), windows), windows)
+
+        num_t, den_t, fss_t = _fss_windows(mod_bin, obs_bin, windows,
+                                           valid_weights=_crop_weights(weights, crop))
         nvalid = mask.sum()
         with np.errstate(invalid='ignore'):
             ovest_val = (np.sum((fcst > t1f) & mask) - np.sum((obs > t1o) & mask)) / nvalid
@@ -226,110 +673,270 @@ def fss_threshold(fcst, obs, t1, t2, windows, percentiles=False, threshold_mode=
     return [num_t, den_t, fss_t, ovest]
 
 
-def _eps_prob_masked(fcst, t1f, t2, t2f, threshold_mode, tolerance, member_valid, inv_n):
-    """Per-point ensemble exceedance probability over the *valid* members.
-
-    `member_valid` is the 3D ~isnan mask, `inv_n` the per-point reciprocal of the
-    valid-member count (0 where no member is valid).  NaN members never count as
-    exceeding (NaN comparisons are False) and are excluded from the denominator.
+class MemberExceedance:
     """
-    with np.errstate(invalid='ignore'):  # NaN comparisons are intentional -> False
-        if threshold_mode == "over":
-            exceed = (fcst > t1f) & member_valid
-        elif threshold_mode == "under":
-            exceed = (fcst <= t1f) & member_valid
+    Member counts of an ensemble stack (members, ny, nx) per grid point:
+    how many valid members lie above a cut value, and from that inside the
+    bin of a threshold (see counts()).
+
+    Every distinct cut value is compared with the stack once and its counts
+    are kept, so the thresholds of all calls, their percentile thresholds,
+    tolerance bounds and the overestimation share them.  Missing members
+    (NaN) never lie above a cut; the valid-member count per point is
+    computed once.
+    """
+    def __init__(self, fcst):
+        self.fcst = fcst
+        valid = ~np.isnan(fcst)
+        self.clean = bool(valid.all())
+        self.n_valid = valid.sum(axis=0)
+        self._over = {}
+
+    def thresholds(self, t1, t2, percentiles):
+        """Forecast thresholds of (t1, t2), percentiles of the whole stack
+        if `percentiles` (ignoring missing members)."""
+        if not percentiles:
+            return t1, t2
+        nan = not self.clean
+        t1f = quantiles.percentile(self.fcst, t1, nan=nan)
+        t2f = quantiles.percentile(self.fcst, t2, nan=nan) if t2 is not None else None
+        return t1f, t2f
+
+    @staticmethod
+    def cuts(t1f, t2f, threshold_mode, tolerance):
+        """Cut values whose counts make up the counts of one threshold."""
+        if threshold_mode == "between":
+            return [t1f, t2f]
+        elif threshold_mode == "tolerance":
+            return [(1. - tolerance) * float(t1f), (1. + tolerance) * float(t1f)]
+        return [t1f]
+
+    def prepare(self, cuts):
+        """Count the members above every new value of `cuts`."""
+        for cut in np.unique(np.asarray(cuts, dtype=float)).tolist():
+            if not np.isnan(cut) and cut not in self._over:
+                with np.errstate(invalid='ignore'):  # NaN comparisons -> False
+                    self._over[cut] = (self.fcst > cut).sum(axis=0, dtype=np.int32)
+
+    def over(self, cut):
+        """Per-point number of valid members above `cut` (> cut)."""
+        cut = float(cut)
+        if np.isnan(cut):
+            return np.zeros(self.fcst.shape[1:], dtype=np.int32)
+        if cut not in self._over:
+            self.prepare([cut])
+        return self._over[cut]
+
+    def counts(self, t1f, t2f, threshold_mode, tolerance):
+        """Per-point number of valid members inside the threshold bin, the
+        member sum of _binary_stack(fcst, [t1f], [t2f], ...)."""
+        if threshold_mode == "under":
+            return self.n_valid - self.over(t1f)
         elif threshold_mode == "between":
-            exceed = (fcst > t1f) & (fcst <= t2f) & member_valid
+            return np.maximum(self.over(t1f) - self.over(t2f), 0)
         elif threshold_mode == "tolerance":
-            exceed = (fcst > (1.-tolerance) * t1f) & (fcst <= (1.+tolerance)*t1f) & member_valid
-    return exceed.sum(axis=0) * inv_n
+            lower, upper = self.cuts(t1f, t2f, threshold_mode, tolerance)
+            return np.maximum(self.over(lower) - self.over(upper), 0)
+        return self.over(t1f)
 
 
-def fss_threshold_eps(fcst, obs, t1, t2, windows, percentiles=False, threshold_mode="over", tolerance=0.1):
+def fss_threshold_eps(fcst, obs, t1, t2, windows, percentiles=False, threshold_mode="over", tolerance=0.1,
+                      obs_cache=None, box_filter=None, exceedance=None):
+    """
+    Ensemble (probabilistic) FSS of one threshold.  The member counts are
+    taken from `exceedance`, a MemberExceedance of `fcst` shared between the
+    thresholds (created here if not given).
+    """
     assert fcst.ndim == 3, "eFSS calculation requires Forecast to be a 3D array, but it is {fcst.ndim}D with shape {fcst.shape}"
-    num_t = np.zeros(windows.shape)
-    den_t = np.zeros(windows.shape)
-    fss_t = np.zeros(windows.shape)
-
-    member_valid = ~np.isnan(fcst)            # 3D, valid forecast members
+    if exceedance is None:
+        exceedance = MemberExceedance(fcst)
     obs_valid = ~np.isnan(obs)                # 2D
-
-    if member_valid.all() and obs_valid.all():
-        # ── clean fast path (unchanged) ──
-        t1o = np.percentile(obs, t1) if percentiles else t1
-        t1f = np.percentile(fcst, t1) if percentiles else t1
+    between = threshold_mode == "between"
+    bf = SAT_BOX_FILTER if box_filter is None else box_filter
+
+    def obs_percentile(q, nan):
+        if obs_cache is not None:
+            return obs_cache.percentile(q, nan=nan)
+        return quantiles.percentile(obs, q, nan=nan)
+
+    def obs_boxes(t1o, t2o, mask=None):
+        """Observation box sums for all windows from the cache (2D each)."""
+        return (box[0] for box in obs_cache.box_sums(
+            [t1o], [t2o] if between else None, threshold_mode, tolerance, windows, mask=mask))
+
+    t1f, t2f = exceedance.thresholds(t1, t2 if between else None, percentiles)
+    if exceedance.clean and obs_valid.all():
+        # ── clean fast path ──
+        t1o = obs_percentile(t1, False) if percentiles else t1
+        t2o = t2
         if percentiles and t2:
-            t2o = np.percentile(obs, t2) if percentiles else t2
-            t2f = np.percentile(fcst, t2) if percentiles else t2
-
-        if threshold_mode == "over":
-            obs_bin = compute_integral_table((obs > t1o).astype(int))
-            mod_bin = compute_integral_table(np.mean(fcst > t1f, axis=0))
-        elif threshold_mode == "under":
-            obs_bin = compute_integral_table((obs <= t1o).astype(int))
-            mod_bin = compute_integral_table(np.mean(fcst <= t1f, axis=0))
-        elif threshold_mode == "between":
-            obs_bin = compute_integral_table(((obs > t1o) & (obs <= t2o)).astype(int))
-            mod_bin = compute_integral_table(np.mean((fcst > t1f) & (fcst <= t2f), axis=0))
-        elif threshold_mode == "tolerance":
-            obs_bin = compute_integral_table(
-                ((obs > (1.-tolerance) * t1o) & (obs <= (1.+tolerance)*t1o)).astype(int))
-            mod_bin = compute_integral_table(
-                np.mean((fcst > (1.-tolerance) * t1f) & (fcst <= (1.+tolerance)*t1f), axis=0))
-
-        for jj, window in enumerate(windows):
-            num_t[jj], den_t[jj], fss_t[jj] = fss(fcst, obs, window,
-                                                    fcst_cache=mod_bin, obs_cache=obs_bin,
-                                                    threshold_mode=threshold_mode)
-        ovest_val = (np.sum(fcst > t1) - np.sum(obs > t1)) / fcst.size
+            t2o = obs_percentile(t2, False)
+
+        # integrate the integer member counts, the box sums are turned into
+        # probabilities by mod_scale.  The box sums are exact, unlike those of
+        # a table of float means, so num/den differ from the float-mean
+        # tables by their rounding (~1e-10 relative), not bit for bit.
+        members = exceedance.counts(t1f, t2f, threshold_mode, tolerance)
+        mod_bin = bf.table(members)
+        mod_scale = 1.0 / fcst.shape[0]
+
+        if obs_cache is None:
+            obs_bin = bf.table(
+                _binary_stack(obs, [t1o], [t2o], threshold_mode, tolerance)[0])
+            num_t, den_t, fss_t = bf.windows(mod_bin, obs_bin, windows, mod_scale=mod_scale)
+            obs_over = np.sum(obs > t1)
+        else:
+            num_t, den_t, fss_t = bf.windows(mod_bin, None, windows, obs_boxes=obs_boxes(t1o, t2o),
+                                               mod_scale=mod_scale)
+            obs_over = obs_cache.count_over(t1)[0]
+        ovest_val = (exceedance.over(t1).sum() - obs_over) / fcst.size
     else:
         # ── missing-data path (per-window valid-point weighting) ──
         # A grid point counts when obs is valid AND at least one member is valid.
-        mask = obs_valid & member_valid.any(axis=0)
-        n_valid = member_valid.sum(axis=0)
+        n_valid = exceedance.n_valid
+        mask = obs_valid & (n_valid > 0)
         with np.errstate(divide='ignore'):
             inv_n = np.where(n_valid > 0, 1.0 / n_valid, 0.0)
 
-        t1o = np.nanpercentile(obs, t1) if percentiles else t1
-        t1f = np.nanpercentile(fcst, t1) if percentiles else t1
-        t2o = (np.nanpercentile(obs, t2) if percentiles else t2) if threshold_mode == "between" else None
-        t2f = (np.nanpercentile(fcst, t2) if percentiles else t2) if threshold_mode == "between" else None
+        t1o = obs_percentile(t1, True) if percentiles else t1
+        t2o = (obs_percentile(t2, True) if percentiles else t2) if between else None
+
+        # only the bounding box of the valid points (plus half a window) is scored
+        crop = _valid_crop(mask, max(windows) // 2)
+        mask_c = mask[crop]
+
+        # ensemble probability over the *valid* members of each point
+        p_f = exceedance.counts(t1f, t2f, threshold_mode, tolerance)[crop] * inv_n[crop]
+        p_f = np.where(mask_c, p_f, 0.0)      # zero out missing points
+
+        mod_bin = bf.table(p_f)
+        if obs_cache is None:
+            obs_b = _binary_stack(obs[crop], [t1o], [t2o], threshold_mode, tolerance)[0] & mask_c
+            obs_bin = bf.table(obs_b)
+            weights = _valid_weights(bf.boxes(bf.table(~mask), windows), windows)
+            num_t, den_t, fss_t = bf.windows(mod_bin, obs_bin, windows,
+                                               valid_weights=_crop_weights(weights, crop))
+            obs_hits = obs_b.sum()
+        else:
+            num_t, den_t, fss_t = bf.windows(
+                mod_bin, None, windows, obs_boxes=_crop_boxes(obs_boxes(t1o, t2o, mask=mask), crop),
+                valid_weights=_crop_weights(obs_cache.valid_weights(mask, windows), crop))
+            # the observation hit count is the corner of its (masked) integral table
+            obs_hits = obs_cache.sat([t1o], [t2o] if between else None, threshold_mode,
+                                     tolerance, mask=mask)[0, -1, -1]
+        ovest_val = (p_f.sum() - obs_hits) / mask.sum()
+
+    ovest = np.full(windows.shape, ovest_val)
+    return [num_t, den_t, fss_t, ovest]
+
 
-        p_f = _eps_prob_masked(fcst, t1f, t2, t2f, threshold_mode, tolerance, member_valid, inv_n)
-        p_f = np.where(mask, p_f, 0.0)        # zero out missing points
+def fss_threshold_batch(fcst, obs, calls, windows, percentiles=False, threshold_mode="over", tolerance=0.1,
+                        obs_cache=None, box_filter=None):
+    """
+    Batched equivalent of fss_threshold for all (t1, t2) pairs in `calls`.
+
+    Both fields are binarised at every threshold in one vectorised pass and
+    the integral tables are built for the whole (n_thresholds, ny, nx) stack
+    at once, so each field is only walked once instead of once per threshold.
+    Percentile thresholds come from the fields' shared sorted copies (see
+    quantiles.py), so a field is sorted at most once per run.  The
+    window loop then runs over the full stack.  Results are identical to
+    calling fss_threshold for each pair.
+
+    With an ObsFSSCache (`obs_cache`) built from `obs`, the observation's
+    percentiles, integral tables, box sums and exceedance counts are looked
+    up instead of recomputed.  `box_filter` replaces the summed area table
+    box sums of the model side (and of the observation without a cache),
+    see SATBoxFilter; the default is SAT_BOX_FILTER.
+
+    :return: array of shape (4, n_thresholds, n_windows) holding numerator,
+        denominator, score and overestimation.
+    """
+    t1 = np.array([c[0] for c in calls], dtype=float)
+    t2 = np.array([np.nan if c[1] is None else c[1] for c in calls], dtype=float)
+    between = threshold_mode == "between"
+    bf = SAT_BOX_FILTER if box_filter is None else box_filter
 
+    mask = _validity_mask(fcst, obs)
+    clean = mask.all()
+
+    def obs_percentile(q):
+        if obs_cache is not None:
+            return obs_cache.percentile(q, nan=not clean)
+        return quantiles.percentile(obs, q, nan=not clean)
+
+    t1o = obs_percentile(t1) if percentiles else t1
+    t1f = quantiles.percentile(fcst, t1, nan=not clean) if percentiles else t1
+    t2o = obs_percentile(t2) if percentiles and between else t2
+    t2f = quantiles.percentile(fcst, t2, nan=not clean) if percentiles and between else t2
+    sat_t2o = t2o if between else None
+
+    if clean:
+        # ── clean fast path ──
+        mod_bin = bf.table(_binary_stack(fcst, t1f, t2f, threshold_mode, tolerance))
+        if obs_cache is None:
+            obs_bin = bf.table(_binary_stack(obs, t1o, t2o, threshold_mode, tolerance))
+            num_t, den_t, fss_t = bf.windows(mod_bin, obs_bin, windows)
+            obs_over = np.array([np.sum(obs > t) for t in t1])
+        else:
+            num_t, den_t, fss_t = bf.windows(
+                mod_bin, None, windows,
+                obs_boxes=obs_cache.box_sums(t1o, sat_t2o, threshold_mode, tolerance, windows))
+            obs_over = obs_cache.count_over(t1)
+        ovest_val = (np.array([np.sum(fcst > t) for t in t1]) - obs_over) / fcst.size
+    else:
+        # ── missing-data path (per-window valid-point weighting) ──
+        # only the bounding box of the valid points (plus half a window) is
+        # scored, e.g. a country inside its rectangular subdomain
+        crop = _valid_crop(mask, max(windows) // 2)
+        fcst, mask_c = fcst[crop], mask[crop]
+        mod_b = _binary_stack(fcst, t1f, t2f, threshold_mode, tolerance) & mask_c
+        mod_bin = bf.table(mod_b)
+        if obs_cache is None:
+            obs_c = obs[crop]
+            obs_b = _binary_stack(obs_c, t1o, t2o, threshold_mode, tolerance) & mask_c
+            obs_bin = bf.table(obs_b)
+            weights = _valid_weights(bf.boxes(bf.table(~mask), windows), windows)
+            num_t, den_t, fss_t = bf.windows(mod_bin, obs_bin, windows,
+                                               valid_weights=_crop_weights(weights, crop))
+            with np.errstate(invalid='ignore'):
+                obs_over = np.array([np.sum((obs_c > to) & mask_c) for to in t1o])
+        else:
+            # the valid-point weights only depend on the mask, shared by all calls
+            obs_boxes = obs_cache.box_sums(t1o, sat_t2o, threshold_mode, tolerance, windows, mask=mask)
+            num_t, den_t, fss_t = bf.windows(
+                mod_bin, None, windows, obs_boxes=_crop_boxes(obs_boxes, crop),
+                valid_weights=_crop_weights(obs_cache.valid_weights(mask, windows), crop))
+            obs_over = obs_cache.count_over(t1o, mask=mask)
+        nvalid = mask.sum()
         with np.errstate(invalid='ignore'):
-            if threshold_mode == "over":
-                obs_b = (obs > t1o) & mask
-            elif threshold_mode == "under":
-                obs_b = (obs <= t1o) & mask
-            elif threshold_mode == "between":
-                obs_b = (obs > t1o) & (obs <= t2o) & mask
-            elif threshold_mode == "tolerance":
-                obs_b = (obs > (1.-tolerance) * t1o) & (obs <= (1.+tolerance)*t1o) & mask
-
-        mod_bin = compute_integral_table(p_f)
-        obs_bin = compute_integral_table(obs_b.astype(float))
-        invalid_sat = _invalid_sat(mask)
-
-        for jj, window in enumerate(windows):
-            num_t[jj], den_t[jj], fss_t[jj] = fss(fcst, obs, window,
-                                                    fcst_cache=mod_bin, obs_cache=obs_bin,
-                                                    threshold_mode=threshold_mode,
-                                                    invalid_cache=invalid_sat)
-        ovest_val = (p_f.sum() - obs_b.sum()) / mask.sum()
+            ovest_val = (np.array([np.sum((fcst > tf) & mask_c) for tf in t1f]) - obs_over) / nvalid
 
-    ovest = np.full(windows.shape, ovest_val)
-    return [num_t, den_t, fss_t, ovest]
+    ovest = np.repeat(ovest_val[:, None], len(windows), axis=1)
+    return np.array([num_t, den_t, fss_t, ovest])
 
 
 def fss_cumsum_parallel(fcst, obs, thresholds, windows, percentiles=False, threshold_mode="over", tolerance=0.1,
-                       eps=False, n_jobs=1):
+                       eps=False, n_jobs=1, engine="batched", obs_cache=None, box_filter=None):
+    """
+    FSS for all thresholds and windows, returned as a (4, n_thresholds,
+    n_windows) array of numerator, denominator, score and overestimation.
+
+    engine ... "batched" (default) builds the integral tables of all
+               thresholds as one stack (fss_threshold_batch), "threshold"
+               runs fss_threshold once per threshold.  The ensemble (eps)
+               path always runs per threshold.
+    obs_cache  optional ObsFSSCache built from `obs`, see fss_threshold_batch.
+    box_filter optional box-sum engine (SATBoxFilter interface), see
+               fss_backends.py; summed area tables by default.
+    n_jobs     threads over the thresholds; threads share obs_cache and the
+               fields instead of copying them to worker processes.
+    """
     if not isinstance(thresholds, np.ndarray):
         thresholds = np.array(thresholds)
     if not isinstance(windows, np.ndarray):
         windows = np.array(windows)
-    use_fss_threshold_func = fss_threshold_eps if eps else fss_threshold
+    use_fss_threshold_func = fss_threshold
 
     if threshold_mode == "between":
         thresholds = np.insert(thresholds, 0, -1.) # insert -1 to retain zero values as OK
@@ -337,26 +944,53 @@ def fss_cumsum_parallel(fcst, obs, thresholds, windows, percentiles=False, thres
     elif threshold_mode in ("over", "under", "tolerance"):
         calls = [(t, None) for t in thresholds]
 
+    if eps:
+        # member counts of every distinct cut value of all thresholds, once
+        exceedance = MemberExceedance(fcst)
+        between = threshold_mode == "between"
+        exceedance.prepare([cut for t1, t2 in calls for cut in exceedance.cuts(
+            *exceedance.thresholds(t1, t2 if between else None, percentiles), threshold_mode, tolerance)]
+            + [t1 for t1, _ in calls])
+        use_fss_threshold_func = functools.partial(fss_threshold_eps, exceedance=exceedance)
+
+    if engine == "batched" and not eps:
+        if n_jobs == 1:
+            return fss_threshold_batch(fcst, obs, calls, windows, percentiles=percentiles,
+                                       threshold_mode=threshold_mode, tolerance=tolerance,
+                                       obs_cache=obs_cache, box_filter=box_filter)
+        from joblib import Parallel, delayed
+        chunks = [c for c in np.array_split(np.arange(len(calls)), n_jobs) if c.size]
+        ret = Parallel(n_jobs=n_jobs, backend='threading')(
+            delayed(fss_threshold_batch)(
+                fcst, obs, [calls[ii] for ii in chunk], windows, percentiles=percentiles,
+                threshold_mode=threshold_mode, tolerance=tolerance,
+                obs_cache=obs_cache, box_filter=box_filter) for chunk in chunks)
+        return np.concatenate(ret, axis=1)
+
     if n_jobs == 1:
         ret = [use_fss_threshold_func(
             fcst, obs, t1, t2, windows, percentiles=percentiles,
-            threshold_mode=threshold_mode, tolerance=tolerance) for t1, t2 in calls]
+            threshold_mode=threshold_mode, tolerance=tolerance,
+            obs_cache=obs_cache, box_filter=box_filter) for t1, t2 in calls]
     else:
         from joblib import Parallel, delayed
-        ret = Parallel(n_jobs=n_jobs)(
+        ret = Parallel(n_jobs=n_jobs, backend='threading')(
             delayed(use_fss_threshold_func)(
                 fcst, obs, t1, t2, windows, percentiles=percentiles,
-                threshold_mode=threshold_mode, tolerance=tolerance) for t1, t2 in calls)
+                threshold_mode=threshold_mode, tolerance=tolerance,
+                obs_cache=obs_cache, box_filter=box_filter) for t1, t2 in calls)
 
     ret_arr = np.swapaxes(np.array(ret), 0, 1)
     return ret_arr
 
 def fss_cumsum_frame(fcst, obs, windows, thresholds, percentiles=False, threshold_mode="over", tolerance=0.1,
-                    mode=None, eps=False, raw=False):
+                    mode=None, eps=False, raw=False, engine="batched", obs_cache=None, box_filter=None,
+                    n_jobs=1):
     # adjust windows from legacy format:
     windows = [w[0] for w in windows]
     ret_arr = fss_cumsum_parallel(fcst, obs, thresholds, windows, percentiles=percentiles,
-                                  threshold_mode=threshold_mode, tolerance=tolerance, eps=eps)
+                                  threshold_mode=threshold_mode, tolerance=tolerance, eps=eps, n_jobs=n_jobs,
+                                  engine=engine, obs_cache=obs_cache, box_filter=box_filter)
     if raw:
         return ret_arr[2]
     else:
@@ -366,7 +1000,86 @@ def fss_cumsum_frame(fcst, obs, windows, thresholds, percentiles=False, threshol
                 pd.DataFrame(ret_arr[3], index=thresholds, columns=windows))
 
 
+def fss_pairwise(stack, thresholds, windows):
+    """
+    FSS of every pair of fields of `stack` (n, ny, nx) at the "over"
+    thresholds, as an array (n_pairs, n_thresholds, n_windows) with the
+    pairs in the order of itertools.combinations(range(n), 2).  Identical
+    to fss_cumsum_frame(stack[i], stack[j], ..., raw=True) per pair.
+
+    Each field is binarised, integrated and box-summed once per threshold
+    and window instead of once per pair.  The sums of products of all pairs
+    then come from one Gram matrix G = B B^T of the flattened box sums B,
+    with ff = G_ii, oo = G_jj and fo = G_ij, i.e. sum (fi - fj)^2 =
+    G_ii + G_jj - 2 G_ij.  As in _products the float64 Gram matrix is exact
+    while the sums stay below 2**53, beyond that it is recomputed in int64.
+
+    Only for fields without missing data.
+
+    :param windows: window sizes (not the two-column prep_windows format).
+    """
+    n = stack.shape[0]
+    npoints = stack.shape[-2] * stack.shape[-1]
+    ii, jj = np.triu_indices(n, k=1)   # row-major, the order of combinations
+    out = np.empty((ii.size, len(thresholds), len(windows)))
+    work = np.empty((n, npoints))
+    for it, t in enumerate(thresholds):
+        sat = compute_integral_table(stack > np.float64(t))
+        for iw, (window, box) in enumerate(zip(windows, integral_filter_multi(sat, windows))):
+            box = box.reshape(n, npoints)
+            work[...] = box
+            gram = work @ work.T
+            if 2.0 * gram.diagonal().max(initial=0.0) >= _EXACT_FLOAT_LIMIT:
+                box = box.astype(np.int64)
+                gram = box @ box.T
+            diag = gram.diagonal()
+            ff, oo, fo = diag[ii], diag[jj], gram[ii, jj]
+            inv_area_sq = 1.0 / (2.0 * (window // 2) + 1.0) ** 4
+            num = inv_area_sq * (ff + oo - 2.0 * fo) / npoints
+            denom = inv_area_sq * (ff + oo) / npoints
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[:, it, iw] = np.where(denom == 0.0, np.nan, 1.0 - num / denom)
+    return out
+
+
+class LazyFSS:
+    """
+    FSS of a fixed pair of binary fields (without missing data) at single
+    windows up to `max_window`, computed on demand.  The summed area tables
+    are built and edge-padded once, as in integral_filter_multi, so each
+    window only costs its box sums; scores are remembered per window.  Same
+    values as fss_cumsum_frame of the two fields at a threshold of 0.5.
+    """
+    def __init__(self, fcst_bin, obs_bin, max_window):
+        tables = compute_integral_table(np.array([fcst_bin, obs_bin], dtype=bool))
+        self.shape = tables.shape[-2:]
+        self.W = max(int(max_window) // 2, 0)
+        self.padded = np.pad(tables, ((0, 0), (self.W, self.W), (self.W, self.W)), mode='edge')
+        self.scores = {}      # half width -> FSS
+        self._work = np.empty((2, tables[0].size))
+
+    def _boxes(self, w):
+        rows, cols = self.shape
+        p, o, D = self.padded, self.W - w, 2 * w
+        if w < 1:
+            return p[:, o:o+rows, o:o+cols]
+        return (p[:, o+D:o+D+rows, o+D:o+D+cols] + p[:, o:o+rows, o:o+cols]
+                - p[:, o:o+rows, o+D:o+D+cols] - p[:, o+D:o+D+rows, o:o+cols])
+
+    def __call__(self, window):
+        w = int(window) // 2
+        if w > self.W:
+            raise ValueError(f"Window {window} is larger than max_window {2 * self.W + 1}")
+        if w not in self.scores:
+            fhat, ohat = self._boxes(w)
+            self.scores[w] = _fss_score(fhat, ohat, 1.0 / (2.0 * w + 1.0) ** 4, self._work)[2]
+        return self.scores[w]
+
+
 ### Randomized thresholds and windows
+# resampling indices held in memory at once by CWFSS.bootstrap
+BOOTSTRAP_CHUNK_BYTES = 2**23
+
 # pseudo-random 2D values with good coverage and non-fixed sample count
 def R2(N):
     g = 1.32471795724474602596
@@ -376,33 +1089,19 @@ def R2(N):
     y = (0.5 + a2 * N) %1
     return x, y
 
-class CWFSS:
-    def __init__(self, fcst, obs, nsamples=500, threshold_limits=(0.1, 100.), window_limits=(1, 601),
-                threshold_max_weight=2., window_max_weight=2., threshold_limiting="relative",
-                threshold_mode="over", tolerance=0.1):
-        self.wmin = int(window_limits[0])
-        self.wmax = int(window_limits[1])
-        # NaN-aware: obs (e.g. OPERA) may carry NaN where there is no coverage
-        if threshold_limiting == "relative":
-            obs_max = np.nanmax(obs)
-            self.tmin = threshold_limits[0] * obs_max / 100.
-            self.tmax = threshold_limits[1] * obs_max / 100.
-        elif threshold_limiting == "absolute":
-            self.tmin = threshold_limits[0]
-            self.tmax = threshold_limits[1]
-        elif threshold_limiting == "percentiles":
-            self.tmin = np.nanpercentile(obs, threshold_limits[0])
-            self.tmax = np.nanpercentile(obs, threshold_limits[1])
-        self.nsamples = nsamples
-        self.threshold_mode = threshold_mode
-        self.tolerance = tolerance
-        self.denominators = np.zeros(nsamples)
-        self.numerators = np.zeros(nsamples)
-        self.values = np.zeros(nsamples)
-        self.windows = np.zeros(nsamples)
-        self.thresholds = np.zeros(nsamples)
-        self.__calc__(fcst, obs)
-        self.__calc_cwfss()
+# observation box sums of one sample group held at once by CWFSSObservation
+CWFSS_BOX_BYTES = 2**28
+
+
+def _split_groups(labels):
+    """Index arrays of the entries with equal labels, in order of appearance
+    within each group."""
+    order = np.argsort(labels, kind="stable")
+    return np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+
+
+class _CWFSSSamples:
+    """Threshold binarisation shared by CWFSSObservation and CWFSS."""
 
     def _binarise(self, field, t):
         """Boolean exceedance mask at threshold t using the configured threshold_mode.
@@ -420,58 +1119,228 @@ class CWFSS:
         else:
             return field > t
 
-    def __calc__(self, fcst, obs):
-        # points valid in both fields; missing data path uses per-window weighting
-        mask = _validity_mask(fcst, obs)
-        clean = mask.all()
-        if not clean:
-            invalid_sat = _invalid_sat(mask)
-        for N in range(self.nsamples):
-            x, y = R2(N)
-            t = self.tmin + y * (self.tmax - self.tmin)
-            w = int(self.wmin + x * (self.wmax - self.wmin))
-            self.windows[N] = w
-            self.thresholds[N] = t
-            if clean:
-                obs_bin = compute_integral_table(self._binarise(obs, t).astype(int))
-                mod_bin = compute_integral_table(self._binarise(fcst, t).astype(int))
-                ohat = integral_filter(obs_bin, w)
-                fhat = integral_filter(mod_bin, w)
-                fflat = fhat.ravel()
-                oflat = ohat.ravel()
-                n = fflat.size
-                ff = np.dot(fflat, fflat)
-                oo = np.dot(oflat, oflat)
-                fo = np.dot(fflat, oflat)
-                self.numerators[N] = (ff + oo - 2.0 * fo) / n
-                self.denominators[N] = (ff + oo) / n
-                with np.errstate(divide='ignore', invalid='ignore'):
-                    self.values[N] = 1. - self.numerators[N] / self.denominators[N]
+    def _binary_keys(self, field, thresholds):
+        """
+        Positions of the threshold bounds in the sorted field, one row per
+        threshold.  The binary fields of _binarise only change when a bound
+        crosses a field value, so thresholds with equal rows binarise the
+        field identically.
+        """
+        if self.threshold_mode == "tolerance":
+            bounds = [(1. - self.tolerance) * thresholds, (1. + self.tolerance) * thresholds]
+        else:
+            bounds = [thresholds]
+        fq = quantiles.for_field(field)
+        return np.stack([fq.searchsorted(b) for b in bounds], axis=1)
+
+
+class CWFSSObservation(_CWFSSSamples):
+    """
+    Observation side of the continuous weighted FSS, set up once for a
+    sample set and shared by every forecast verified against it.
+
+    Phase one (the constructor) sets the threshold and window limits from
+    the observation, draws the `nsamples` quasi-random (R2) threshold and
+    window samples and groups them by the binarisation of the observation.
+    Phase two, evaluate(), scores any number of forecasts: the observation
+    integral table of each group and its box sums are built once and used
+    for every forecast with the same missing-data mask.
+
+    Within a group, the samples whose thresholds also binarise a forecast
+    identically share its integral table, and all their windows are
+    box-summed from it in one pass.  With `threshold_bins` the sampled
+    thresholds are snapped onto a grid of that many levels between the
+    threshold limits first, so at most `threshold_bins` tables are built per
+    field however many samples are drawn (the thresholds stored and weighted
+    are the snapped ones).  The default (None) evaluates every sample at its
+    exact threshold.
+    """
+    def __init__(self, obs, nsamples=500, threshold_limits=(0.1, 100.), window_limits=(1, 601),
+                 threshold_limiting="relative", threshold_mode="over", tolerance=0.1,
+                 obs_cache=None, threshold_bins=None):
+        self.wmin = int(window_limits[0])
+        self.wmax = int(window_limits[1])
+        # NaN-aware: obs (e.g. OPERA) may carry NaN where there is no coverage
+        if threshold_limiting == "relative":
+            obs_max = np.nanmax(obs)
+            self.tmin = threshold_limits[0] * obs_max / 100.
+            self.tmax = threshold_limits[1] * obs_max / 100.
+        elif threshold_limiting == "absolute":
+            self.tmin = threshold_limits[0]
+            self.tmax = threshold_limits[1]
+        elif threshold_limiting == "percentiles":
+            if obs_cache is not None:
+                self.tmin, self.tmax = obs_cache.percentile(threshold_limits[:2], nan=True)
             else:
-                with np.errstate(invalid='ignore'):  # NaN comparisons -> False
-                    obs_bin = compute_integral_table((self._binarise(obs, t) & mask).astype(float))
-                    mod_bin = compute_integral_table((self._binarise(fcst, t) & mask).astype(float))
-                Sf = integral_filter(mod_bin, w)
-                So = integral_filter(obs_bin, w)
-                ww = w // 2
-                area = (2.0 * ww + 1.0) ** 2
-                C = area - integral_filter(invalid_sat, w)
-                self.numerators[N], self.denominators[N], self.values[N] = \
-                    _fss_score_masked(Sf, So, C)
-
-    def __calc_cwfss(self):
+                self.tmin = quantiles.percentile(obs, threshold_limits[0], nan=True)
+                self.tmax = quantiles.percentile(obs, threshold_limits[1], nan=True)
+        if threshold_bins is not None and threshold_bins < 2:
+            raise ValueError(f"threshold_bins must be at least 2, got {threshold_bins}")
+        self.obs = obs
+        # valid-point weights of the missing-data score, per mask and window
+        self.obs_cache = obs_cache if obs_cache is not None else ObsFSSCache(obs, max_bytes=CWFSS_BOX_BYTES)
+        self.nsamples = nsamples
+        self.threshold_mode = threshold_mode
+        self.tolerance = tolerance
+        self.threshold_bins = threshold_bins
+        self.thresholds, self.windows = self._samples()
+        _, group = np.unique(self._binary_keys(obs, self.thresholds), axis=0, return_inverse=True)
+        self.groups = _split_groups(group.ravel())
+        self.sat_builds = 0
+        self._local = threading.local()
+
+    def _samples(self):
+        """Thresholds and windows of the R2 samples, the thresholds snapped
+        to the threshold_bins grid if set."""
+        x, y = R2(np.arange(self.nsamples))
+        if self.threshold_bins:
+            y = np.round(y * (self.threshold_bins - 1)) / (self.threshold_bins - 1)
+        return self.tmin + y * (self.tmax - self.tmin), (self.wmin + x * (self.wmax - self.wmin)).astype(int)
+
+    def evaluate(self, fcsts, n_jobs=1):
+        """
+        CWFSS of each forecast in `fcsts` against the observation.  With
+        n_jobs > 1 the sample groups are scored in parallel threads.
+
+        :return: list of CWFSS, one per forecast.
+        """
+        results = [CWFSS.__new__(CWFSS) for _ in fcsts]
+        self._evaluate(list(fcsts), results, n_jobs=n_jobs)
+        return results
+
+    def _evaluate(self, fcsts, results, n_jobs=1):
+        for res in results:
+            res._init_samples(self)
+        # forecasts with the same validity mask share the observation boxes
+        masks = {}
+        for ii, fcst in enumerate(fcsts):
+            mask = _validity_mask(fcst, self.obs)
+            masks.setdefault(_mask_key(mask), (mask, []))[1].append(ii)
+        fcst_keys = [self._binary_keys(fcst, self.thresholds) for fcst in fcsts]
+        tasks = []
+        for key, (mask, indices) in masks.items():
+            tasks += [(indices, None if key is None else mask, members) for members in self.groups]
+        if n_jobs == 1:
+            builds = [self._evaluate_group(fcsts, fcst_keys, results, *task) for task in tasks]
+        else:
+            from joblib import Parallel, delayed
+            builds = Parallel(n_jobs=n_jobs, backend='threading')(
+                delayed(self._evaluate_group)(fcsts, fcst_keys, results, *task) for task in tasks)
+        self.sat_builds += len(tasks)
+        for res, n in zip(results, np.sum(builds, axis=0)):
+            res.sat_builds = int(n)
+            res._calc_cwfss()
+
+    def _evaluate_group(self, fcsts, fcst_keys, results, indices, mask, members):
+        """Score the samples `members` (one observation binarisation) for
+        the forecasts `indices` sharing the validity `mask` (None if nothing
+        is missing); returns the number of forecast integral tables built
+        per forecast."""
+        clean = mask is None
+        builds = np.zeros(len(fcsts), dtype=int)
+        with np.errstate(invalid='ignore'):  # NaN comparisons -> False
+            obs_bin = self._binarise(self.obs, self.thresholds[members[0]])
+            obs_sat = compute_integral_table(obs_bin if clean else obs_bin & mask)
+        work = None
+        if clean:
+            # product buffer reused by every group scored in this thread
+            work = getattr(self._local, "work", None)
+            if work is None or work.shape[1] != obs_sat.size:
+                work = self._local.work = np.empty((2, obs_sat.size))
+        group_windows = np.unique(self.windows[members]).tolist()
+        per_chunk = max(1, CWFSS_BOX_BYTES // obs_sat.nbytes)
+        for start in range(0, len(group_windows), per_chunk):
+            chunk = group_windows[start:start + per_chunk]
+            obs_boxes = dict(zip(chunk, integral_filter_multi(obs_sat, chunk)))
+            if not clean:
+                # weights of the missing-data score, shared by the samples of a
+                # window and, through the cache, by the other groups
+                weights = dict(zip(chunk, self.obs_cache.valid_weights(mask, chunk)))
+                ws = workspace(obs_sat.shape)
+            in_chunk = members[np.isin(self.windows[members], chunk)]
+            for ii in indices:
+                res = results[ii]
+                _, sub = np.unique(fcst_keys[ii][in_chunk], axis=0, return_inverse=True)
+                for sel in _split_groups(sub.ravel()):
+                    samples = in_chunk[sel]
+                    with np.errstate(invalid='ignore'):  # NaN comparisons -> False
+                        mod_bin = self._binarise(fcsts[ii], self.thresholds[samples[0]])
+                        mod_sat = compute_integral_table(mod_bin if clean else mod_bin & mask)
+                    builds[ii] += 1
+                    sample_windows = np.unique(self.windows[samples]).tolist()
+                    for w, fhat in zip(sample_windows, integral_filter_multi(mod_sat, sample_windows)):
+                        idx = samples[self.windows[samples] == w]
+                        if clean:
+                            ff, oo, fo = _products(fhat, obs_boxes[w], work)
+                            n = fhat.size
+                            num = (ff + oo - 2.0 * fo) / n
+                            den = (ff + oo) / n
+                            with np.errstate(divide='ignore', invalid='ignore'):
+                                value = 1. - num / den
+                        else:
+                            num, den, value = _fss_score_masked(fhat, obs_boxes[w], None, ws, weights[w])
+                        res.numerators[idx] = num
+                        res.denominators[idx] = den
+                        res.values[idx] = value
+        return builds
+
+
+class CWFSS(_CWFSSSamples):
+    """
+    Continuous weighted FSS of one forecast, see CWFSSObservation; to score
+    several forecasts against the same observation use
+    CWFSSObservation.evaluate, which gives the same results.
+    """
+    def __init__(self, fcst, obs, nsamples=500, threshold_limits=(0.1, 100.), window_limits=(1, 601),
+                threshold_max_weight=2., window_max_weight=2., threshold_limiting="relative",
+                threshold_mode="over", tolerance=0.1, obs_cache=None, threshold_bins=None):
+        reference = CWFSSObservation(obs, nsamples=nsamples, threshold_limits=threshold_limits,
+                                     window_limits=window_limits, threshold_limiting=threshold_limiting,
+                                     threshold_mode=threshold_mode, tolerance=tolerance,
+                                     obs_cache=obs_cache, threshold_bins=threshold_bins)
+        reference._evaluate([fcst], [self])
+
+    def _init_samples(self, reference):
+        """Take over the limits and samples of `reference`, zero the scores."""
+        for attr in ("wmin", "wmax", "tmin", "tmax", "nsamples", "threshold_mode", "tolerance",
+                     "threshold_bins"):
+            setattr(self, attr, getattr(reference, attr))
+        self.thresholds = reference.thresholds.copy()
+        self.windows = reference.windows.astype(float)
+        self.denominators = np.zeros(self.nsamples)
+        self.numerators = np.zeros(self.nsamples)
+        self.values = np.zeros(self.nsamples)
+        self.sat_builds = 0
+
+    def _weights(self):
+        """Weighted sample FSS and their maximum possible values."""
         t_factor = (self.tmax + self.thresholds) / self.tmax
         w_factor = 2. * self.wmax / (self.wmax + self.windows)
         weighted_fss = (2. * (self.values - 0.5)).clip(0., 1.) * t_factor * w_factor
         weighted_fss_max = t_factor * w_factor
+        return weighted_fss, weighted_fss_max
+
+    def _calc_cwfss(self):
+        weighted_fss, weighted_fss_max = self._weights()
         self.cwfss = np.nanmean(weighted_fss) / np.nanmean(weighted_fss_max)
 
-    def bootstrap(self, N=500):
+    def bootstrap(self, N=500, rng=None, chunk_bytes=BOOTSTRAP_CHUNK_BYTES):
+        """
+        N bootstrap resamples of the cwfss, stored in self.bootstrap_info.
+
+        The resampling indices are drawn as a (rows, nsamples) matrix per
+        chunk of resamples, with at most `chunk_bytes` of indices at a
+        time, and reduced along the sample axis.  The chunking does not
+        change the result.
+
+        :param rng: np.random.Generator or seed (see np.random.default_rng),
+            None draws fresh entropy.
+        """
+        rng = np.random.default_rng(rng)
+        weighted_fss, weighted_fss_max = self._weights()
         self.bootstrap_info = np.zeros(N)
-        t_factor = (self.tmax + self.thresholds) / self.tmax
-        w_factor = 2. * self.wmax / (self.wmax + self.windows)
-        weighted_fss = (2. * (self.values - 0.5)).clip(0., 1.) * t_factor * w_factor
-        weighted_fss_max = t_factor * w_factor
-        for ii in range(N):
-            idx = (self.nsamples * np.random.rand(self.nsamples)).astype(int)
-            self.bootstrap_info[ii] = np.nanmean(weighted_fss[idx]) / np.nanmean(weighted_fss_max[idx])
+        rows = max(1, int(chunk_bytes) // (8 * self.nsamples))
+        for start in range(0, N, rows):
+            idx = rng.integers(0, self.nsamples, size=(min(rows, N - start), self.nsamples))
+            self.bootstrap_info[start:start + idx.shape[0]] = \
+                np.nanmean(weighted_fss[idx], axis=1) / np.nanmean(weighted_fss_max[idx], axis=1)
@@ -0,0 +1,255 @@
+"""Interchangeable FSS backends, selected with --fss_method.
+
+Every backend computes the same FSS frames with the interface of
+fss_SAT.fss_cumsum_frame:
+
+    frame(fcst, obs, windows, thresholds, percentiles=False, threshold_mode="over",
+          tolerance=0.1, mode=None, eps=False, raw=False, obs_cache=None, n_jobs=1)
+
+returning the (num, den, fss, ovest) data frames, or only the FSS values
+with raw=True.  `windows` are in the two-column format of
+scoring.prep_windows, `n_jobs` are threads over the thresholds.
+
+    sat             summed area tables (fss_SAT), the default
+    uniform_filter  scipy.ndimage.uniform_filter box sums
+    numba           JIT-compiled kernel that fuses box sums and products,
+                    only registered when numba is installed
+    legacy          the old FFT approximation (fss_FFT), not exact
+    auto            times the exact backends on a probe of the grid size and
+                    uses the fastest one
+
+The exact backends only swap the box-sum stage of fss_SAT (see
+fss_SAT.SATBoxFilter) and give identical scores, so "auto" never changes
+the results.  Which one is fastest depends on the grid size, the windows
+and the machine.
+"""
+
+import threading
+import time
+
+import numpy as np
+from scipy import ndimage
+
+import fss_FFT
+import fss_SAT
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+class UniformFilterBoxFilter(fss_SAT.SATBoxFilter):
+    """
+    Box sums from scipy.ndimage.uniform_filter on the binary fields.
+
+    The summed area table box sums cover the rows and columns (i-w, i+w]
+    clamped to the grid and never include the first row and column.  This
+    is reproduced by zeroing those and shifting an even-sized (2w) constant
+    padded window by one (origin -1).  The box sums of the binary and count
+    fields are rounded back to exact integers; float fields (probabilities
+    of ensembles with missing data) use the summed area tables, which keeps
+    the results identical to them.
+    """
+    name = "uniform_filter"
+
+    def table(self, field):
+        return field
+
+    def boxes(self, table, windows):
+        if table.dtype.kind not in "biu":
+            yield from fss_SAT.integral_filter_multi(fss_SAT.compute_integral_table(table), windows)
+            return
+        lead = table.ndim - 2
+        shifted = None
+        for n in windows:
+            w = n // 2
+            if w < 1:
+                # the summed area table path yields the table itself here
+                yield fss_SAT.compute_integral_table(table)
+                continue
+            if shifted is None:
+                shifted = table.astype(np.float64)
+                shifted[..., 0, :] = 0.
+                shifted[..., :, 0] = 0.
+            box = ndimage.uniform_filter(shifted, size=(1,) * lead + (2 * w, 2 * w), mode='constant',
+                                         origin=(0,) * lead + (-1, -1))
+            box *= (2 * w) ** 2
+            yield np.rint(box, out=box)
+
+
+def _fused_products_py(S, T, w):
+    """
+    Sums ff, oo, fo of the box sums of two summed area tables for half
+    width w, without materialising the box sums.  Indices are clamped to the
+    grid exactly like the edge padding of fss_SAT.integral_filter_multi.
+    Plain Python, compiled with numba when available.
+    """
+    ny, nx = S.shape
+    ff = 0
+    oo = 0
+    fo = 0
+    for i in range(ny):
+        lo = min(max(i - w, 0), ny - 1)
+        hi = min(i + w, ny - 1)
+        for j in range(nx):
+            le = min(max(j - w, 0), nx - 1)
+            ri = min(j + w, nx - 1)
+            f = S[hi, ri] + S[lo, le] - S[lo, ri] - S[hi, le]
+            o = T[hi, ri] + T[lo, le] - T[lo, ri] - T[hi, le]
+            ff += f * f
+            oo += o * o
+            fo += f * o
+    return ff, oo, fo
+
+
+_fused_products = numba.njit(nogil=True)(_fused_products_py) if numba is not None else None
+
+
+class NumbaBoxFilter(fss_SAT.SATBoxFilter):
+    """
+    Fused JIT kernel for the clean path: the box sums and their products
+    are computed in one pass over the integer summed area tables, with exact
+    int64 accumulators.  Missing-data, ensemble and cached-observation cases
+    use the summed area table path.
+    """
+    name = "numba"
+
+    def windows(self, mod_tab, obs_tab, windows, invalid_tab=None, obs_boxes=None, mod_scale=None,
+                valid_weights=None):
+        if (invalid_tab is not None or obs_boxes is not None or mod_scale is not None
+                or valid_weights is not None
+                or mod_tab.dtype.kind not in "iu" or obs_tab.dtype.kind not in "iu"
+                or min(n // 2 for n in windows) < 1):
+            return super().windows(mod_tab, obs_tab, windows, invalid_tab=invalid_tab,
+                                   obs_boxes=obs_boxes, mod_scale=mod_scale, valid_weights=valid_weights)
+        lead = mod_tab.shape[:-2]
+        num_t = np.zeros(lead + (len(windows),))
+        den_t = np.zeros(lead + (len(windows),))
+        fss_t = np.zeros(lead + (len(windows),))
+        npoints = mod_tab.shape[-2] * mod_tab.shape[-1]
+        for jj, window in enumerate(windows):
+            w = window // 2
+            inv_area_sq = 1.0 / (2.0 * w + 1.0) ** 4
+            for idx in np.ndindex(lead):
+                ff, oo, fo = _fused_products(mod_tab[idx], obs_tab[idx], w)
+                num_t[idx + (jj,)], den_t[idx + (jj,)], fss_t[idx + (jj,)] = \
+                    fss_SAT._score_from_products(ff, oo, fo, npoints, inv_area_sq)
+        return num_t, den_t, fss_t
+
+
+UNIFORM_FILTER = UniformFilterBoxFilter()
+NUMBA = NumbaBoxFilter() if numba is not None else None
+
+BACKENDS = {}
+
+
+def register(name):
+    """Decorator adding a frame function to BACKENDS under `name`."""
+    def deco(func):
+        BACKENDS[name] = func
+        return func
+    return deco
+
+
+@register("sat")
+def sat_frame(fcst, obs, windows, thresholds, **kwargs):
+    return fss_SAT.fss_cumsum_frame(fcst, obs, windows, thresholds, **kwargs)
+
+
+@register("uniform_filter")
+def uniform_filter_frame(fcst, obs, windows, thresholds, **kwargs):
+    return fss_SAT.fss_cumsum_frame(fcst, obs, windows, thresholds, box_filter=UNIFORM_FILTER, **kwargs)
+
+
+if numba is not None:
+    @register("numba")
+    def numba_frame(fcst, obs, windows, thresholds, **kwargs):
+        return fss_SAT.fss_cumsum_frame(fcst, obs, windows, thresholds, box_filter=NUMBA, **kwargs)
+
+
+@register("legacy")
+def legacy_frame(fcst, obs, windows, thresholds, percentiles=False, threshold_mode="over",
+                 tolerance=0.1, mode=None, eps=False, raw=False, obs_cache=None, n_jobs=1):
+    """The FFT approximation; it only knows the "over" threshold mode and
+    does not use the observation cache.  `n_jobs` are scipy.fft workers."""
+    if threshold_mode != "over":
+        logger.warning(f"Legacy FFT FSS ignores threshold_mode={threshold_mode}, using 'over'!")
+    mode = mode or 'same'
+    if eps:
+        return fss_FFT.fss_frame_eps(fcst, obs, windows, thresholds, percentiles=percentiles, mode=mode,
+                                     workers=n_jobs)
+    if raw:
+        return fss_FFT.fss_raw(fcst, obs, windows, thresholds, percentiles=percentiles, mode=mode,
+                               workers=n_jobs)
+    return fss_FFT.fss_frame(fcst, obs, windows, thresholds, percentiles=percentiles, mode=mode,
+                             workers=n_jobs)
+
+
+# backends that give identical results and may be picked by "auto"
+AUTO_CANDIDATES = ("sat", "uniform_filter", "numba")
+
+# largest probe grid per dimension, larger domains are probed on a sub-grid
+AUTO_PROBE_SIZE = 512
+
+_auto_lock = threading.Lock()
+_auto_choice = {}   # (probe shape, probe windows) -> backend name
+
+
+def _probe(name, fcst, obs, windows):
+    """Best of two wall-clock timings of one backend on the probe fields."""
+    func = BACKENDS[name]
+    func(fcst[:8, :8], obs[:8, :8], [(3, 3)], [1.])    # warm up (JIT compilation)
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        func(fcst, obs, windows, [1.])
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def auto_backend(shape, windows):
+    """
+    Name of the fastest exact backend for a grid of `shape` and these
+    windows, timed once on a synthetic probe (one threshold, the smallest,
+    middle and largest window) and remembered for later calls.  The probe
+    grid is `shape` capped at AUTO_PROBE_SIZE per dimension, with the
+    windows clipped to it, so probing a large domain costs less than one
+    of its scores.
+    """
+    windows = [tuple(w) for w in np.atleast_2d(windows)]
+    probe_shape = tuple(min(int(n), AUTO_PROBE_SIZE) for n in shape[-2:])
+    clip = min(probe_shape)
+    probe_windows = sorted(set(tuple(min(int(w), clip) for w in window)
+                               for window in (windows[0], windows[len(windows) // 2], windows[-1])))
+    key = (probe_shape, tuple(probe_windows))
+    with _auto_lock:
+        if key not in _auto_choice:
+            rng = np.random.default_rng(0)
+            obs = rng.gamma(0.5, 2., probe_shape)
+            fcst = np.roll(obs, 3, axis=-1)
+            timings = {name: _probe(name, fcst, obs, probe_windows)
+                       for name in AUTO_CANDIDATES if name in BACKENDS}
+            _auto_choice[key] = min(timings, key=timings.get)
+            logger.info(f"FSS backend probe on {probe_shape[0]}x{probe_shape[1]}: "
+                        + ", ".join(f"{n} {1e3 * t:.1f} ms" for n, t in timings.items())
+                        + f" -> using {_auto_choice[key]}")
+        return _auto_choice[key]
+
+
+def get_backend(method, shape=None, windows=None):
+    """
+    Frame function for --fss_method `method` ("default" is "sat"); "auto"
+    needs the grid `shape` and `windows` to probe.
+    """
+    if method in (None, "default"):
+        method = "sat"
+    if method == "auto":
+        method = auto_backend(shape, windows)
+    if method not in BACKENDS:
+        raise ValueError(f"Unknown FSS method {method!r}, available: "
+                         f"{', '.join(['default', 'auto'] + sorted(BACKENDS))}")
+    return BACKENDS[method]
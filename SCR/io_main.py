@@ -13,6 +13,7 @@ from io_gdal import read_data_gdal
 from io_netcdf import read_data_netcdf, read_inca_plus_netcdf
 from io_netcdf import read_HungaroMet_netcdf
 
+import parameter_settings
 from paths import PAN_DIR_TMP, PAN_DIR_MODEL, PAN_DIR_MODEL2, PAN_DIR_DATA
 
 import logging
@@ -624,7 +625,7 @@ def get_sims_and_file_list(data_list, args):
                     "name": "{:s} {:s}".format(model_name, exp_init_date.strftime("%Y-%m-%d %H")),
                     "lon": lon,
                     "lat": lat,
-                    "precip_data": mod_field_data,
+                    "precip_data": parameter_settings.as_field_dtype(mod_field_data, args),
                     "color" : mod.color,
                     "ensemble" : mod.ensemble}
                 data_list.append(sim)
@@ -1,20 +1,28 @@
 # make map plots and panel them nicely to compare multiple simulations
 
 #
+import os
+# try avoiding hanging during parallelized portions of the program; the BLAS
+# runtimes read these once when numpy is first imported, so they have to be
+# set before any other import.  thread_budget raises the limit per section.
+os.environ['MKL_NUM_THREADS'] = '1'
+os.environ['OMP_NUM_THREADS'] = '1'
+os.environ['MKL_DYNAMIC'] = 'FALSE'
+
 import pyresample
 from datetime import datetime
 from datetime import timedelta as dt
 from misc import loop_datetime, str2bool
 import argparse
 import logging
-import numbers
-from joblib import Parallel, delayed
 import numpy as np
-import os
 import sys
 
 from model_parameters import *
 import scoring
+import score_pool
+import score_table
+import fss_SAT
 import inca_functions as inca
 import read_SAF
 import read_opera as opera
@@ -32,11 +40,6 @@ import ensembles
 import ranking_check
 import austria_mask
 
-# try avoiding hanging during parallelized portions of the program
-os.environ['MKL_NUM_THREADS'] = '1'
-os.environ['OMP_NUM_THREADS'] = '1'
-os.environ['MKL_DYNAMIC'] = 'FALSE'
-
 global args, start_date, end_date
 start_date = datetime(2019,8,12,15,0,0)
 end_date = datetime(2019,8,12,18,0,0)
@@ -184,7 +187,9 @@ def parse_arguments():
         help = 'save full fields to pickle files')
     parser.add_argument('--fss_mode', type=str, default='ranks')
     parser.add_argument('--fss_calc_mode', type=str, default='same')
-    parser.add_argument('--fss_method', type=str, default='default')
+    parser.add_argument('--fss_method', type=str, default='default',
+        help = 'FSS backend: default (= sat), sat, uniform_filter, numba (if installed), '
+               'legacy (FFT approximation) or auto (time the exact backends on the grid and use the fastest)')
     parser.add_argument('--fss_threshold_mode', type=str, default='over',
         choices=['over', 'under', 'between', 'tolerance'],
         help = 'Threshold mode for FSS binarisation (default: over)')
@@ -215,6 +220,11 @@ def parse_arguments():
         help = """Draw line plots of model performance, init on x axis, score on y axis""")
     parser.add_argument('--check_ranking', nargs='?', default=False, const=True, type=str2bool,
         help = 'Use random sampling and bootstrapping to test the robustness of the suggested ranking')
+    parser.add_argument('--bootstrap_seed', type=int, default=None,
+        help = 'Seed of the --check_ranking bootstrap; by default a random seed is drawn and logged')
+    parser.add_argument('--ranking_threshold_bins', type=int, default=0,
+        help = 'Snap the sampled thresholds of --check_ranking onto this many levels so that binary fields '
+               'are built once per level (faster, approximate); 0 evaluates every sampled threshold exactly')
     parser.add_argument('--highlight_threshold', '-u', type=int, default=[], nargs='+',
         help = """Highlight specific precipitation contour line""")
     parser.add_argument('--time_series_panel_width', default=0.66, type=float,
@@ -242,7 +252,14 @@ def parse_arguments():
     parser.add_argument('--save_percentiles', nargs='?', default=False, const=True, type=str2bool,
         help = 'Save all percentiles to CSV')
     parser.add_argument('--threads', type=int, default=8,
-        help = 'Number of threads used for parallel processing (joblib)')
+        help = 'Thread budget, split between the parallel workers, the threshold jobs of each FSS and '
+               'the BLAS threads (see thread_budget.py)')
+    parser.add_argument('--score_backend', type=str, default='threads', choices=['threads', 'processes'],
+        help = 'Score the simulations in --threads threads, or in --threads processes that read the '
+               'fields from shared memory (scales better, the Python-level scoring holds the GIL)')
+    parser.add_argument('--precision', type=str, default='float64', choices=['float64', 'float32'],
+        help = 'Floating point type of the precipitation fields from the readers to the plots; '
+               'float32 halves their memory, sums and scores are still accumulated in float64')
     parser.add_argument('--opera_qi_threshold', type=float, default=0.8,
         help = 'Minimum OPERA quality index (0..1) to keep a pixel; lower-QI '
                'pixels are masked as NaN. Set to 0.0 to mask only QI==0 cells.')
@@ -319,7 +336,7 @@ def print_some_basics(models, start_date, end_date, min_lead, max_lead):
             logging.info(f"Limiting {mod} to lead times between {mil} and {mal} hours before {start_date_str}.")
 
 
-def sort_data_list_by_metric(data_list, sorting):
+def sort_data_list_by_metric(data_list, sorting, scores=None):
     """Sort the simulation panels by a verification metric.
 
     `sorting` refers to a key present in the data_list entries (e.g. 'mae',
@@ -327,18 +344,26 @@ def sort_data_list_by_metric(data_list, sorting):
     suffix reverses the order. The observation (data_list[0]) always stays
     first. Entries missing the requested key or holding a non-numeric value are
     kept at the end in their original order. The list is sorted in place.
+    The values are taken from the score_table.ScoreTable `scores` if it holds
+    the key, from the entries otherwise.
     """
     key, _, direction = sorting.partition(':')
     reverse = direction.lower() == 'desc'
     sims = data_list[1::]
-    missing = [s for s in sims if not isinstance(s.get(key), numbers.Number)]
+    if scores is None or key not in scores:
+        scores = score_table.ScoreTable(sims, columns=[key])
+    values = scores.values(key, sims)
+    present = scores.has(key, sims)
+    missing = [s for s, p in zip(sims, present) if not p]
     if missing:
         names = ", ".join(s.get('name', '?') for s in missing)
         logging.warning(f"Cannot sort by '{key}': missing/non-numeric value for {names}. "
                         "These panels are placed last.")
-    sortable = [s for s in sims if isinstance(s.get(key), numbers.Number)]
-    sortable.sort(key=lambda d: d[key], reverse=reverse)
-    data_list[1::] = sortable + missing
+    sortable = np.flatnonzero(present)
+    # stable in both directions: equal values keep their original order
+    keys = -values[sortable] if reverse else values[sortable]
+    order = sortable[np.argsort(keys, kind='stable')]
+    data_list[1::] = [sims[ii] for ii in order] + missing
     return data_list
 
 
@@ -393,23 +418,29 @@ def main():
             austria_mask.mask_data_list_to_austria(data_list)
             if args.fss_calc_mode and args.fss_method != "legacy":
                 logging.warning(f"fss_mode was set to {args.fss_calc_mode}, this is ignored unless fss_method is set to legacy!")
-            Parallel(n_jobs=args.threads,backend='threading')(delayed(scoring.calc_scores)(sim, data_list[0], args) for ii, sim in enumerate(data_list))
-            scoring.rank_scores(data_list)
+            # observation-side FSS intermediates, shared by all sims of this subdomain
+            obs_cache = fss_SAT.ObsFSSCache(data_list[0]['precip_data_resampled'])
+            scores = score_pool.calc_all_scores(data_list, args, obs_cache=obs_cache)
+            scoring.rank_scores(data_list, scores)
             if args.sorting not in ('model', 'default', 'init'):
                 # sort panels by a verification metric (a key in data_list
                 # entries); only possible now that scores have been calculated
-                sort_data_list_by_metric(data_list, args.sorting)
+                sort_data_list_by_metric(data_list, args.sorting, scores)
             if args.check_ranking:
-                ranking_check.add_rank_robustness_info(data_list, args)
+                ranking_check.add_rank_robustness_info(data_list, args, obs_cache=obs_cache, scores=scores)
                 ranking_check.draw_ranking_confidence_plot(data_list, start_date, end_date, subdomain_name, args)
             # scoring.total_fss_rankings(data_list, windows, thresholds)
             if args.ensemble_scores:
                 ens_data = ensembles.detect_ensembles(data_list)
-                ensemble_data = [ensembles.Ensemble(data_list, ens, nam, args) for nam, ens in ens_data.items()]
+                ensemble_data = [ensembles.Ensemble(data_list, ens, nam, args, obs_cache=obs_cache, scores=scores)
+                                 for nam, ens in ens_data.items()]
+            logging.debug(f"Observation FSS cache: {obs_cache.hits} hits, {obs_cache.misses} misses, "
+                          f"{obs_cache.nbytes / 2**20:.0f} MiB")
         else:
             logging.info("Skipping "+dom['name']+", nothing is requested.")
         if dom['score']:
-            scoring.write_scores_to_csv(data_list, start_date, end_date, args, subdomain_name, windows, thresholds)
+            scoring.write_scores_to_csv(data_list, start_date, end_date, args, subdomain_name, windows, thresholds,
+                                        scores=scores)
         if dom['draw']:
             if args.mask_plot_to_obs:
                 # display only the scored area: blank out model pixels where the
@@ -473,6 +504,7 @@ def read_obs(start_date, end_date, data_list, args):
     else:
         logging.critical("Unknown verification dataset {args.precip_verif_dataset} for parameter {args.parameter}! Exiting...")
         exit(1)            
+    data_list[0]['precip_data'] = parameter_settings.as_field_dtype(data_list[0]['precip_data'], args)
     return data_list
 
 
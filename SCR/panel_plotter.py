@@ -18,6 +18,8 @@ from matplotlib.patches import Rectangle
 import numpy as np
 from model_parameters import verification_subdomains
 import parameter_settings
+import quantiles
+import thread_budget
 from joblib import Parallel, delayed
 from multiprocessing import Pool
 import pickle
@@ -370,7 +372,7 @@ def draw_single_figure(sim, obs, r, jj, levels, cmap, norm, verification_subdoma
                     norm=norm, shading='auto')
     ax.set_facecolor("silver")
     if args.draw_p90:
-        p90 = np.nanpercentile(np.copy(sim['precip_data_resampled']), 90) # circumvent numpy bug #21524
+        p90 = quantiles.percentile(sim['precip_data_resampled'], 90, nan=True)
         sim['rr90'] = np.where(sim['precip_data_resampled'] > p90, 1, 0)
         sim['p90_color'] = 'black' if p90 <= 10. else 'white'
         mpl.rcParams['hatch.linewidth']=0.5
@@ -427,8 +429,8 @@ def draw_single_figure(sim, obs, r, jj, levels, cmap, norm, verification_subdoma
         draw_RGB_colorbars(tmp_string, args)
 
 
-def _run_worker(cmd):
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+def _run_worker(cmd, env=None):
+    result = subprocess.run(cmd, shell=True, capture_output=True, text=True, env=env)
     for line in result.stdout.splitlines():
         if line.strip():
             logger.info("[worker] %s", line)
@@ -588,7 +590,8 @@ def draw_panels(data_list,start_date, end_date, verification_subdomain, args):
     # generate a list of commands, one for each model, these will call panel_plotter.py to draw a single model
     cmd_list = [f"{sys.executable} {PAN_DIR_SCR}/panel_plotter.py -p {pickle_file}" for pickle_file in glob.glob(f"{PAN_DIR_TMP}/{tmp_string}/???.p")]
     # execute the commands in parallel; capture worker output and re-emit via the parent logger
-    Parallel(n_jobs=args.threads, verbose=10)(delayed(_run_worker)(cmd) for cmd in cmd_list)
+    alloc = thread_budget.allocate(args.threads, len(cmd_list), "panels")
+    Parallel(n_jobs=alloc.outer, verbose=10)(delayed(_run_worker)(cmd, env=alloc.environ()) for cmd in cmd_list)
     logger.debug(f"montage {PAN_DIR_TMP}/{tmp_string}/???.png -geometry +0+0 -tile {lins}x{cols} {PAN_DIR_TMP}/{tmp_string}/999.png")
     # use the individual panels and combine them into one large plot using imagemagick
     os.system(f"montage {PAN_DIR_TMP}/{tmp_string}/???.png -geometry +0+0 -tile {lins}x{cols} {PAN_DIR_TMP}/{tmp_string}/999.png")
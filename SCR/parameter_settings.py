@@ -61,6 +61,18 @@ def get_fss_thresholds(args):
     }
     return thresholds_for_fss[args.parameter]
 
+# floating point type of the fields (--precision); only the type the fields
+# are stored in, scores still accumulate their sums in float64
+def get_field_dtype(args):
+    return np.dtype(getattr(args, 'precision', 'float64'))
+
+def as_field_dtype(field, args):
+    """`field` in the --precision float type, without a copy if it already
+    is; non-float fields (e.g. cloud masks) are returned unchanged."""
+    if getattr(field, 'dtype', None) is None or field.dtype.kind != 'f':
+        return field
+    return field.astype(get_field_dtype(args), copy=False)
+
 def get_windows(args):
 
     if len(args.d_windows) ==0:
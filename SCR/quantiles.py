@@ -0,0 +1,157 @@
+"""Per-field percentile lookups from a single sort.
+
+Every resampled field is asked for percentiles several times per run: the
+percentile FSS thresholds, the p90 of the d90 score, the percentile columns
+of the score CSV and the p90 hatching of the panels.  ``np.percentile`` and
+``np.nanpercentile`` partition the full field on every call.  Here each
+field is sorted once, lazily, on the first query, and every later query is
+answered from the sorted copy with the same linear interpolation numpy
+uses, so the values are identical to calling numpy directly.
+
+Use :func:`for_field` to get the shared :class:`FieldQuantiles` of an array.
+Entries are keyed by the identity of the array, so replacing a field (e.g.
+resampling to the next subdomain or masking it for plotting) starts a fresh
+cache; fields must not be modified in place after they have been queried.
+"""
+
+import collections
+import logging
+import threading
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sorted copies are full-size arrays; only the most recently used ones are
+# kept while their total size stays below this budget.  Percentile values
+# that were already computed stay memoized when a sorted copy is dropped.
+MAX_SORTED_BYTES = 2**30
+
+_lock = threading.RLock()   # re-entrant: weakref callbacks may fire while it is held
+_registry = {}                            # id(field) -> (weakref to field, FieldQuantiles)
+_sorted_lru = collections.OrderedDict()   # id(FieldQuantiles) -> FieldQuantiles
+
+
+def _lerp(a, b, t):
+    """Linear interpolation exactly as numpy's quantile implementation does it."""
+    diff_b_a = b - a
+    out = np.add(a, diff_b_a * t)
+    np.subtract(b, diff_b_a * (1 - t), out=out, where=t >= 0.5)
+    return out
+
+
+class FieldQuantiles:
+    """
+    Percentiles of one field, answered from a single sorted copy.
+
+    Only a weak reference to the field is kept, the caller keeps it alive.
+
+    :param field: nd-array, any shape (it is flattened).
+    """
+    def __init__(self, field):
+        self._field = weakref.ref(field)
+        self._sorted = None
+        self._nvalid = None
+        self._values = {}
+        self._sort_lock = threading.RLock()   # re-entrant: weakref callbacks may fire while it is held
+
+    def _sorted_values(self):
+        """Sorted, flattened copy of the field (NaNs last), sorting on first use."""
+        s = self._sorted
+        if s is None:
+            with self._sort_lock:
+                s = self._sorted
+                if s is None:
+                    field = self._field()
+                    if field is None:
+                        raise ReferenceError("the field of this FieldQuantiles no longer exists")
+                    s = np.sort(field, axis=None)
+                    self._nvalid = s.size - int(np.count_nonzero(np.isnan(s))) \
+                        if s.dtype.kind == "f" else s.size
+                    self._sorted = s
+                    _keep_sorted(self)
+        return s
+
+    def percentile(self, q, nan=False):
+        """
+        Same result as np.percentile(field, q) (np.nanpercentile if `nan`).
+
+        :param q: percentile or sequence of percentiles in [0, 100].
+        :param nan: ignore NaNs, otherwise any NaN makes the result NaN.
+        :return: float for a scalar `q`, array otherwise.
+        """
+        key = (tuple(np.atleast_1d(q).tolist()), np.ndim(q), type(q) in (int, float), nan)
+        try:
+            value = self._values[key]
+        except KeyError:
+            value = self._values.setdefault(key, self._compute(q, nan))
+        return value.copy() if isinstance(value, np.ndarray) else value
+
+    def searchsorted(self, v, side="right"):
+        """Positions of the values `v` in the sorted field (NaNs sort last),
+        see np.searchsorted.  Two thresholds with the same position binarise
+        the field identically."""
+        return np.searchsorted(self._sorted_values(), v, side=side)
+
+    def _compute(self, q, nan):
+        scalar = np.ndim(q) == 0
+        weak_q = type(q) in (int, float)    # numpy keeps the field's dtype for these
+        quantiles = np.true_divide(np.atleast_1d(np.asarray(q, dtype=float)), 100)
+        if np.any((quantiles < 0) | (quantiles > 1)):
+            raise ValueError("Percentiles must be in the range [0, 100]")
+        s = self._sorted_values()
+        n = self._nvalid if nan else s.size
+        if n == 0 or (not nan and self._nvalid < s.size):
+            # numpy: all-NaN field, or NaNs present without nan=True
+            dtype = s.dtype if s.dtype.kind == "f" and (scalar or nan) else np.float64
+            result = np.full(quantiles.shape, np.nan, dtype=dtype)
+        else:
+            virtual = (n - 1) * quantiles
+            prev = np.floor(virtual).astype(np.intp)
+            nxt = np.minimum(prev + 1, n - 1)
+            gamma = virtual - prev
+            if weak_q:
+                gamma = float(gamma[0])
+            result = _lerp(s[prev], s[nxt], gamma)
+        return result[0] if scalar else result
+
+
+def _keep_sorted(fq):
+    """Register a newly sorted FieldQuantiles, dropping the sorted copies of
+    the least recently sorted ones above MAX_SORTED_BYTES."""
+    with _lock:
+        _sorted_lru[id(fq)] = fq
+        total = sum(f._sorted.nbytes for f in _sorted_lru.values() if f._sorted is not None)
+        while total > MAX_SORTED_BYTES and len(_sorted_lru) > 1:
+            _, old = _sorted_lru.popitem(last=False)
+            if old._sorted is not None:
+                total -= old._sorted.nbytes
+                old._sorted = None
+
+
+def _forget(key):
+    with _lock:
+        entry = _registry.pop(key, None)
+        if entry is not None:
+            _sorted_lru.pop(id(entry[1]), None)
+
+
+def for_field(field):
+    """
+    The FieldQuantiles of `field`, shared by every caller that passes the
+    same array object (the entry disappears together with the array).
+    """
+    key = id(field)
+    with _lock:
+        entry = _registry.get(key)
+        if entry is not None and entry[0]() is field:
+            return entry[1]
+        fq = FieldQuantiles(field)
+        _registry[key] = (weakref.ref(field, lambda _, key=key: _forget(key)), fq)
+        return fq
+
+
+def percentile(field, q, nan=False):
+    """np.percentile / np.nanpercentile of `field`, served from its cached sort."""
+    return for_field(field).percentile(q, nan=nan)
@@ -3,30 +3,47 @@ import matplotlib.pyplot as plt
 import datetime as dt
 import matplotlib as mpl
 import matplotlib.colors as colors
-from joblib import Parallel, delayed
 import fss_SAT as fss
+import thread_budget
 
 from paths import PAN_DIR_PLOTS
 
 import logging
 logger = logging.getLogger(__name__)
 
-def add_rank_robustness_info(data_list, args):
+def add_rank_robustness_info(data_list, args, obs_cache=None, scores=None):
+    """
+    CWFSS of every simulation from 1250 threshold/window samples, with
+    bootstrap statistics (sim['cwfss'], sim['cwfss_robust']).  The robust
+    CWFSS is also added to the score_table.ScoreTable `scores` if given.
+    """
     logger.info("Calculating FSS samples for ranking robustness check, this can take a few minutes...")
     threshold_mode = getattr(args, 'fss_threshold_mode', 'over')
     tolerance = getattr(args, 'fss_tolerance', 0.1)
-    cwfss_tmp = Parallel(n_jobs=args.threads, backend='threading')(
-        delayed(fss.CWFSS)(
-        sim["precip_data_resampled"], data_list[0]['precip_data_resampled'],
+    threshold_bins = getattr(args, 'ranking_threshold_bins', 0) or None
+    # all models are sampled at the same thresholds/windows against the same
+    # observation: its binarised integral tables and box sums are built once
+    # and every model is scored against them
+    reference = fss.CWFSSObservation(
+        data_list[0]['precip_data_resampled'],
         nsamples=1250, threshold_limiting="relative",
         window_limits=[10., 200.],
-        threshold_mode=threshold_mode, tolerance=tolerance) for sim in data_list[1::])
+        threshold_mode=threshold_mode, tolerance=tolerance,
+        obs_cache=obs_cache, threshold_bins=threshold_bins)
+    with thread_budget.allocate(args.threads, len(reference.groups), "ranking check") as alloc:
+        cwfss_tmp = reference.evaluate([sim["precip_data_resampled"] for sim in data_list[1::]],
+                                       n_jobs=alloc.outer)
     logger.info("Done. Bootstrapping results")
-    for cwfss, sim in zip(cwfss_tmp, data_list[1::]):
+    # one independent, reproducible random stream per model
+    seeds = np.random.SeedSequence(getattr(args, 'bootstrap_seed', None))
+    logger.info(f"Bootstrap seed: {seeds.entropy} (pass --bootstrap_seed to reproduce)")
+    for cwfss, sim, seed in zip(cwfss_tmp, data_list[1::], seeds.spawn(len(cwfss_tmp))):
         logger.debug(f"Bootstraping {sim['name']}, N = {10000}")
-        cwfss.bootstrap(N=10000)
+        cwfss.bootstrap(N=10000, rng=seed)
         sim[f"cwfss"] = cwfss
         sim[f"cwfss_robust"] = cwfss.cwfss
+    if scores is not None:
+        scores.add('cwfss_robust', data_list)
         
 
 
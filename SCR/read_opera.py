@@ -3,6 +3,7 @@ import numpy as np
 import pyproj
 import datetime as dt
 from misc import loop_datetime
+import parameter_settings
 
 import logging
 logger = logging.getLogger(__name__)
@@ -130,7 +131,9 @@ def read_OPERA(data_list, start_date, end_date, args):
     logger.info("Accumulating OPERA from {:s} to {:s} (QI threshold {:.2f})".format(
         start_date.strftime("%Y-%m-%d %H:%M"),
         end_date.strftime("%Y-%m-%d %H:%M"), qi_threshold))
-    data = np.full((dim, 2200, 1900), np.nan)
+    # hourly fields are kept in the --precision type, accumulated in float64
+    field_dtype = parameter_settings.get_field_dtype(args)
+    data = np.full((dim, 2200, 1900), np.nan, dtype=field_dtype)
     idx = 0
     read_dt = dt.timedelta(minutes=60)
     read_opera_date = start_date + dt.timedelta(minutes=60)
@@ -154,13 +157,13 @@ def read_OPERA(data_list, start_date, end_date, args):
     # only accumulate pixels that are valid (non-NaN) for *every* hour;
     # a pixel masked in any hour stays NaN so we never under-count coverage gaps
     valid_all_hours = ~np.any(np.isnan(data), axis=0)
-    tmp_precip = np.where(valid_all_hours, np.nansum(data, 0), np.nan)
+    tmp_precip = np.where(valid_all_hours, np.nansum(data, 0, dtype=np.float64), np.nan)
     n_clamped = int(np.sum(tmp_precip > 2000.))
     if n_clamped:
         logger.warning("Clamping %d OPERA pixels with accumulation > 2000 mm to NaN",
                        n_clamped)
     tmp_precip = np.where(tmp_precip>2000., np.nan, tmp_precip)
-    tmp_precip = np.flip(tmp_precip, 0)
+    tmp_precip = np.flip(tmp_precip, 0).astype(field_dtype, copy=False)
     nan_frac = np.mean(np.isnan(tmp_precip))
     logger.info("OPERA accumulated field: {:d} valid pixels ({:.1%}), NaN fraction {:.1%}".format(
         int(valid_all_hours.sum()), valid_all_hours.mean(), nan_frac))
@@ -404,6 +404,9 @@ class Region():
             orig_def, data, targ_def, reduce_data=False,
             radius_of_influence=25000.)
         data_resampled = np.where(data_resampled > 9999., np.nan, data_resampled)
+        if np.asarray(data).dtype.kind == 'f':
+            # keep the float type of the input (--precision)
+            data_resampled = data_resampled.astype(np.asarray(data).dtype, copy=False)
         if np.isnan(data_resampled).sum() > 0:
             if fix_nans:
                 logging.warning("--fix_nans is set to True, replaced {:d} NaNs with 0.!".format(
@@ -0,0 +1,154 @@
+"""Scoring of all simulations of a subdomain, selected with --score_backend.
+
+    threads    scoring.calc_scores in a joblib thread pool (the default).
+               The numpy parts release the GIL, the Python-level loops and
+               DataFrame handling do not.
+    processes  a pool of up to --threads worker processes.  The resampled fields
+               are copied once into multiprocessing.shared_memory blocks,
+               the workers score read-only zero-copy views of them and only
+               the score entries of each simulation are sent back.
+
+Each worker keeps its own fss_SAT.ObsFSSCache of the observation, the one
+passed by the caller is only used by the thread backend.  Workers, their
+threshold jobs and BLAS threads share the --threads budget (thread_budget).
+"""
+
+import argparse
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import numpy as np
+from joblib import Parallel, delayed
+
+import fss_SAT
+import parameter_settings
+import score_table
+import scoring
+import thread_budget
+
+import logging
+logger = logging.getLogger(__name__)
+
+FIELD = "precip_data_resampled"
+
+
+class SharedFields:
+    """
+    Copies of `fields` in shared memory blocks, one per field, removed
+    again on close (use as a context manager).  `specs` describes the
+    blocks for attach().
+    """
+    def __init__(self, fields):
+        self.blocks = []
+        self.specs = []
+        try:
+            for field in fields:
+                field = np.ascontiguousarray(field)
+                shm = shared_memory.SharedMemory(create=True, size=max(field.nbytes, 1))
+                self.blocks.append(shm)
+                np.ndarray(field.shape, field.dtype, buffer=shm.buf)[...] = field
+                self.specs.append((shm.name, field.shape, field.dtype.str))
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(specs):
+    """Attach to the blocks of SharedFields.specs, returns the blocks (keep
+    them open while the views are used) and read-only array views."""
+    # pool workers share the resource tracker of the creating process,
+    # which unlinks the blocks should it die without closing them
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    views = []
+    for shm, (_, shape, dtype) in zip(blocks, specs):
+        view = np.ndarray(shape, dtype, buffer=shm.buf)
+        view.flags.writeable = False
+        views.append(view)
+    return blocks, views
+
+
+_worker = {}
+
+
+def _init_worker(specs, args, blas_threads):
+    blocks, fields = attach(specs)
+    _worker.update(blocks=blocks, fields=fields, args=args,
+                   obs_cache=fss_SAT.ObsFSSCache(fields[0]),
+                   blas_limiter=thread_budget.limit_blas(blas_threads))
+
+
+def _score_worker(index, sim, obs, n_jobs=1, points=None):
+    """Score simulation `index` in a worker, returns its score entries."""
+    fields = _worker["fields"]
+    sim = dict(sim, **{FIELD: fields[index]})
+    obs = dict(obs, **{FIELD: fields[0]})
+    scoring.calc_scores(sim, obs, _worker["args"], obs_cache=_worker["obs_cache"], n_jobs=n_jobs,
+                        points=points)
+    return {key: value for key, value in sim.items() if key != FIELD}
+
+
+def _light(sim):
+    """The entries of `sim` without its arrays (fields, coordinates)."""
+    return {key: value for key, value in sim.items() if not isinstance(value, np.ndarray)}
+
+
+def _allocate(data_list, args):
+    return thread_budget.allocate(args.threads, len(data_list), "scoring",
+                                  inner_tasks=len(parameter_settings.get_fss_thresholds(args)))
+
+
+def calc_scores_threads(data_list, args, obs_cache=None):
+    points = scoring.batch_point_scores(data_list)
+    with _allocate(data_list, args) as alloc:
+        Parallel(n_jobs=alloc.outer, backend='threading')(
+            delayed(scoring.calc_scores)(sim, data_list[0], args, obs_cache=obs_cache, n_jobs=alloc.inner,
+                                         points=sim_points)
+            for sim, sim_points in zip(data_list, points))
+
+
+def calc_scores_processes(data_list, args, obs_cache=None):
+    # the region holds map projections, scoring does not need it
+    worker_args = argparse.Namespace(**{k: v for k, v in vars(args).items() if k != 'region'})
+    alloc = _allocate(data_list, args)
+    points = scoring.batch_point_scores(data_list)
+    fields = [np.asarray(sim[FIELD]) for sim in data_list]
+    logger.info(f"Scoring {len(data_list)} fields in {alloc.outer} processes "
+                f"({sum(f.nbytes for f in fields) / 2**20:.0f} MiB shared)")
+    with SharedFields(fields) as shared, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=alloc.outer, initializer=_init_worker,
+                                                   initargs=(shared.specs, worker_args, alloc.blas)) as pool:
+        obs = _light(data_list[0])
+        futures = [pool.submit(_score_worker, ii, _light(sim), obs, alloc.inner, points[ii])
+                   for ii, sim in enumerate(data_list)]
+        for sim, future in zip(data_list, futures):
+            sim.update(future.result())
+
+
+BACKENDS = {
+    "threads": calc_scores_threads,
+    "processes": calc_scores_processes,
+}
+
+
+def calc_all_scores(data_list, args, obs_cache=None):
+    """scoring.calc_scores for every entry of data_list (the observation
+    first) with the --score_backend of `args`; returns the scalar scores
+    as a score_table.ScoreTable.  The point scores of all models are
+    computed beforehand in one pass (scoring.batch_point_scores)."""
+    backend = getattr(args, 'score_backend', 'threads')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown score backend {backend!r}, available: {', '.join(BACKENDS)}")
+    BACKENDS[backend](data_list, args, obs_cache=obs_cache)
+    return score_table.ScoreTable(data_list)
@@ -0,0 +1,141 @@
+"""Columnar table of the scalar scores of all simulations of a subdomain.
+
+scoring.calc_scores stores its results as keys of each simulation dict.
+Ranking, sorting, the CSV output and the ensemble summaries all need one
+score of every simulation, so score_pool.calc_all_scores collects the scalar
+scores once into a ScoreTable: a DataFrame with one row per data_list entry
+(in scoring order) and one column per score.  The rank columns of all
+metrics are computed with one stable argsort each (rank).
+
+The simulation dicts stay the interface of the plotting code, the rank
+columns are written back into them (publish).  Rows are matched to the
+dicts by identity, so the table stays valid when data_list is re-sorted.
+"""
+
+import numbers
+
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+# scalar scores set by scoring.calc_scores (and ranking_check: cwfss_robust)
+SCORE_COLUMNS = [
+    'bias', 'bias_real', 'mae', 'rms', 'corr', 'd90',
+    'fss_condensed', 'fss_condensed_weighted', 'fss_condensed_weighted_rect',
+    'fss_total_abs_score', 'fss_total_rel_score', 'fss_success_rate_abs', 'fss_success_rate_rel',
+    'cwfss_robust',
+]
+
+# how each ranked metric is ordered:
+#   asc ..... lowest is best (MAE, RMSE, D90)
+#   abs ..... lowest absolute is best (BIAS)
+#   desc .... highest is best (CORRELATION, FSS scores)
+RANK_ORDER = {
+    'mae': 'asc', 'bias': 'abs', 'rms': 'asc', 'corr': 'desc', 'd90': 'asc',
+    'fss_condensed': 'desc', 'fss_condensed_weighted': 'desc',
+    'fss_total_abs_score': 'desc', 'fss_total_rel_score': 'desc',
+    'fss_success_rate_abs': 'desc', 'fss_success_rate_rel': 'desc',
+}
+
+
+def _number(value):
+    """A score as int or float, None for missing or non-numeric values."""
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return None
+
+
+def ordinal_ranks(values, order="asc"):
+    """
+    Ranks 1 ... n of `values`, best first (see RANK_ORDER for `order`).
+    Equal values are ranked in list order, like a stable sort, NaN last.
+    """
+    keys = np.asarray(values, dtype=float)
+    if order == "abs":
+        keys = np.abs(keys)
+    elif order == "desc":
+        keys = -keys
+    ranks = np.empty(keys.size, dtype=int)
+    ranks[np.argsort(keys, kind='stable')] = np.arange(1, keys.size + 1)
+    return ranks
+
+
+class ScoreTable:
+    """
+    Scalar scores of the entries of `data_list` (the observation first),
+    one column per key of `columns` that any entry holds.  Missing and
+    non-numeric values are NaN in `frame` and False in `present`; columns
+    of integers only (ranks) stay integer.
+    """
+    def __init__(self, data_list, columns=SCORE_COLUMNS):
+        self._rows = {id(sim): ii for ii, sim in enumerate(data_list)}
+        self.frame = pd.DataFrame(index=pd.RangeIndex(len(data_list)))
+        self.present = pd.DataFrame(index=self.frame.index)
+        for key in columns:
+            if any(key in sim for sim in data_list):
+                self.add(key, data_list)
+
+    def __contains__(self, key):
+        return key in self.frame.columns
+
+    def add(self, key, data_list):
+        """(Re)collect column `key` from the dicts, e.g. for scores added
+        after the table was built."""
+        values = [_number(sim.get(key)) for sim in data_list]
+        rows = self.rows(data_list)
+        present = np.zeros(len(self.frame), dtype=bool)
+        present[rows] = [v is not None for v in values]
+        if present.all() and all(isinstance(v, int) for v in values):
+            column = np.zeros(len(self.frame), dtype=int)     # e.g. ranks
+        else:
+            column = np.full(len(self.frame), np.nan)
+            values = [np.nan if v is None else v for v in values]
+        column[rows] = values
+        self.frame[key] = column
+        self.present[key] = present
+
+    def rows(self, sims):
+        """Table rows of the dicts `sims`."""
+        return np.array([self._rows[id(sim)] for sim in sims], dtype=int)
+
+    def values(self, key, sims=None):
+        """Column `key` for the dicts `sims` (all rows in table order if
+        None), all NaN if no entry holds it."""
+        if key not in self:
+            return np.full(len(self.frame) if sims is None else len(sims), np.nan)
+        column = self.frame[key].to_numpy()
+        return column if sims is None else column[self.rows(sims)]
+
+    def has(self, key, sims=None):
+        """Per dict of `sims` (all rows if None), whether it holds a numeric `key`."""
+        if key not in self:
+            return np.zeros(len(self.frame) if sims is None else len(sims), dtype=bool)
+        present = self.present[key].to_numpy()
+        return present if sims is None else present[self.rows(sims)]
+
+    def complete(self, key, sims=None):
+        """Whether every dict of `sims` holds a numeric `key`."""
+        return key in self and bool(self.has(key, sims).all())
+
+    def rank(self, metrics):
+        """Add the rank column 'rank_<metric>' of each metric in `metrics`
+        (ordered as in RANK_ORDER), ranking all rows."""
+        for metric in metrics:
+            if metric not in self:
+                raise KeyError(metric)
+            self.frame['rank_' + metric] = ordinal_ranks(self.frame[metric], RANK_ORDER[metric])
+            self.present['rank_' + metric] = True
+        return self
+
+    def publish(self, data_list, columns):
+        """Write `columns` into the dicts of `data_list` (the dict view used
+        by the plotting code); ranks are stored as int."""
+        rows = self.rows(data_list)
+        for key in columns:
+            column = self.frame[key].to_numpy()[rows]
+            for sim, value in zip(data_list, column.tolist()):
+                sim[key] = value
@@ -2,10 +2,13 @@ import numpy as np
 import copy
 import os
 import pandas as pd
-import fss_FFT
+import fss_backends
 import fss_SAT
 import parameter_settings
+import quantiles
+import score_table
 import csv
+import warnings
 
 
 import logging
@@ -100,53 +103,122 @@ def rank_array(a_in,t):
     return ranks
 
 
-def fss_condensed(sim):
+def _row_thresholds(t, ndim):
+    """Thresholds of the second (threshold) axis, broadcastable against a
+    (models, thresholds, ...) cube."""
+    return np.asarray(t, dtype=float).reshape((1, -1) + (1,) * (ndim - 2))
+
+
+def rank_cube(fss, t):
+    """
+    rank_array along the model axis of a (models, thresholds, windows)
+    cube, all cells at once; `t` holds the skillful/useful threshold of
+    each threshold row.  Same ranks as rank_array (as integers):
+
+    0 ..... NaN
+    1 ..... below the threshold
+    2 ..... perfect score
+    3+ .... 3 plus the number of better ranked values, minus one if a
+            perfect score was found (ties share a rank, the following
+            ranks are skipped)
+
+    Values of -88 and below are never ranked by rank_array and keep 0.
+    """
+    a = np.asarray(fss, dtype=float)
+    nan = np.isnan(a)
+    with np.errstate(invalid='ignore'):
+        useless = ~nan & (a < _row_thresholds(t, a.ndim))
+        ranked = ~nan & ~useless & (a > -88.)
+    perfect = ranked & (a == 1.)
+    values = np.where(ranked, a, -np.inf)
+    # values ranked before each one, with its ties counted once
+    better = (values[None, :] > values[:, None]).sum(axis=1)
+    # rank 3 is skipped unless the best value is not a perfect score
+    first = np.where(values.max(axis=0) == 1., 2, 3)
+    ranks = np.where(ranked, first + better, 0)
+    ranks[useless] = 1
+    ranks[perfect] = 2
+    return ranks
+
+
+def cube_minus_avg(fss, t):
+    """
+    array_minus_avg along the model axis of a (models, thresholds, windows)
+    cube, all cells at once; `t` holds the threshold of each threshold row.
+    """
+    a = np.asarray(fss, dtype=float)
+    t = _row_thresholds(t, a.ndim)
+    a_filtered = np.where(a > t, a, np.nan)
+    # average over a contiguous model axis, summed like the 1d rows of array_minus_avg
+    # cells without any value above the threshold average to NaN, silently
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "Mean of empty slice", RuntimeWarning)
+        avg_filtered = np.nanmean(np.ascontiguousarray(np.moveaxis(a_filtered, 0, -1)), axis=-1)
+    a_normed = a - avg_filtered
+    a_normed = np.where(a < t, -10., a_normed)
+    a_normed = np.where(np.isnan(a), 10., a_normed)
+    return a_normed
+
+
+def rescaled_fss(sim):
+    """
+    Condensed FSS points of the threshold rows of sim['fss']: FSS values
+    from 0 to 0.5 get 0 points and values between 0.5 and 1 are mapped to
+    0 ... 1.  Rows with a usefulness threshold of 1 (the entire domain is
+    above the precip threshold) only score perfect values.  Computed once
+    per sim and shared by the three condensed scores.
+    """
+    a = np.array(sim['fss'].values, dtype=float)
+    t = np.asarray(sim['fss_thresholds'], dtype=float)[:, None]
+    s = 1. / (1. - 0.5)
+    with np.errstate(invalid='ignore'):
+        a = np.where(t == 1., np.where(a == 1., 1., 0.), s * (a - 1) + 1)
+    return clamp_array(a)
+
+
+def _sequential_sum(values):
+    """Sum of `values` added one after the other (np.cumsum), so the
+    condensed scores round exactly like a running total."""
+    values = np.asarray(values, dtype=float).ravel()
+    return np.cumsum(values)[-1] if values.size else 0.
+
+
+def _condensed_factors(sim, levels):
+    """
+    Threshold and window factors of the weighted condensed FSS: linear
+    weighting where the smallest window is roughly 2x the weight of the
+    largest and the largest threshold is roughly 2x the weight of 0.
+    """
+    # reduce the x and y window sizes and take only the larger one
+    wins = np.asarray([np.max(w) for w in sim['fss_windows']], dtype=float)
+    lvls = np.asarray(levels[:len(sim['fss_thresholds'])], dtype=float)
+    max_l = np.max(levels[0:9])
+    max_w = wins.max()
+    l_fac = (max_l + lvls) / max_l          # 2 for max precip, 1 for 0.
+    w_fac = 2. * max_w / (max_w + wins)     # 2 for window size of 0, 1 for max window size
+    return l_fac, w_fac
+
+
+def fss_condensed(sim, rescaled=None):
     """
     assign 0 to 1 points per window/threshold combo where RSS values from 0 to f0
     geet 0 points and values between f0 and 1 are mapped to 0 ... 1
+    (`rescaled` is the rescaled_fss of sim, computed if not given)
     """
-    score = 0.
-    score_arr = np.zeros(sim['fss'].values.shape)
-    for ii, t in enumerate(sim['fss_thresholds']):
-        a_ = sim['fss'].values[ii, :]
-        a = copy.copy(a_)
-        if t == 1.: #catch cases where the entire domain is above the precip threshold
-            a = np.where(a == 1., 1. ,0.) #???
-        else:
-            s = 1. / (1. - 0.5)
-            a = s * (a - 1) + 1
-        a = clamp_array(a)
-        score_arr [ii, :] = a
-        score += np.nansum(a)
+    score_arr = rescaled_fss(sim) if rescaled is None else rescaled
+    # 1d row sums: a 2d reduction may round differently
+    score = _sequential_sum([np.nansum(row) for row in score_arr])
     return score, score_arr
 
 
-def weighted_fss_condensed(sim, levels):
-    score = 0.
+def weighted_fss_condensed(sim, levels, rescaled=None):
+    a = rescaled_fss(sim) if rescaled is None else rescaled
+    l_fac, w_fac = _condensed_factors(sim, levels)
+    cells = l_fac[:, None] * w_fac[None, :] * a
+    valid = ~np.isnan(a)
     score_arr = np.zeros(sim['fssf'].values.shape)
-    wins = np.asarray(sim['fss_windows'])
-    max_l = np.max(levels[0:9])
-    max_w = wins.max()
-    for ii, t in enumerate(sim['fss_thresholds']):
-        a_ = sim['fss'].values[ii, :]
-        a = copy.copy(a_)
-        if t == 1.: #catch cases where the entire domain is above the precip threshold
-            a = np.where(a == 1., 1. ,0.) #???
-        else:
-            s = 1. / (1. - 0.5)
-            a = s * (a - 1) + 1
-        a = clamp_array(a)
-        l = levels[ii]
-        for jj, w in enumerate(sim['fss_windows']):
-            w = np.max(w) # reduce the x and y and take only the larger one
-            # linear weighting where smallest window is roughlty 2x the weight of the largest
-            # and smallest threshold is roughtly 2x the weight of the largest
-            if not np.isnan(a[jj]):
-                l_fac = (max_l + l) / max_l      # 2 for max precip, 1 for 0.
-                w_fac = 2. * max_w / (max_w + w) # 2 for window size of 0, 1 for max window size
-                score += l_fac * w_fac * a[jj]
-                score_arr [ii, jj] = l_fac * w_fac * a[jj]
-    return score, score_arr
+    score_arr[:a.shape[0]] = np.where(valid, cells, 0.)
+    return _sequential_sum(cells[valid]), score_arr
 
 
 def voronoi_widths_1d(values, clip_min=0.0):
@@ -172,7 +244,7 @@ def voronoi_widths_1d(values, clip_min=0.0):
     return np.diff(edges)
 
 
-def weighted_fss_condensed_rect(sim, obs, levels):
+def weighted_fss_condensed_rect(sim, obs, levels, rescaled=None, obs_cache=None):
     """Linear-Voronoi (rectangle) area-weighted condensed FSS on the fixed
     `(threshold x window)` grid, normalised to [0, 1], restricted to the
     obs-supported integration domain.
@@ -206,10 +278,14 @@ def weighted_fss_condensed_rect(sim, obs, levels):
     sum). The companion `score_arr` returned here holds the
     un-normalised per-cell contributions for diagnostic use (zero for
     skipped cells).
-    """
-    obs_field = obs['precip_data_resampled']
 
-    score_arr = np.zeros(sim['fssf'].values.shape)
+    `rescaled` is the rescaled_fss of sim (computed if not given); the
+    observation's exceedance counts of the N1 rule are taken from
+    `obs_cache` (fss_SAT.ObsFSSCache) if given, so they are counted once
+    for all models.
+    """
+    if rescaled is None:
+        rescaled = rescaled_fss(sim)
     wins = np.asarray([np.max(w) for w in sim['fss_windows']], dtype=float)
     lvls = np.asarray(levels, dtype=float)
 
@@ -217,34 +293,24 @@ def weighted_fss_condensed_rect(sim, obs, levels):
     dw = voronoi_widths_1d(wins, clip_min=0.0)
     cell_area = np.outer(dl, dw)
 
-    weighted_sum = 0.0
-    weight_sum = 0.0
-    skipped_thresholds = []
+    # N1 rule: thresholds without any observed point above them are skipped
+    n_rows = rescaled.shape[0]
+    if obs_cache is not None:
+        obs_over = obs_cache.count_over(lvls[:n_rows])
+    else:
+        obs_over = np.array([(obs['precip_data_resampled'] > l).sum() for l in lvls[:n_rows]])
+    supported = obs_over > 0
+    skipped_thresholds = [levels[ii] for ii in np.flatnonzero(~supported)]
 
-    max_l = np.max(levels[0:9])
-    max_w = wins.max()
-    for ii, t in enumerate(sim['fss_thresholds']):
-        l = levels[ii]
-        if (obs_field > l).sum() == 0:
-            skipped_thresholds.append(l)
-            continue
-        a_ = sim['fss'].values[ii, :]
-        a = copy.copy(a_)
-        if t == 1.:
-            a = np.where(a == 1., 1., 0.)
-        else:
-            s = 1. / (1. - 0.5)
-            a = s * (a - 1) + 1
-        a = clamp_array(a)
-        for jj, w in enumerate(sim['fss_windows']):
-            w = np.max(w)
-            if not np.isnan(a[jj]):
-                l_fac = (max_l + l) / max_l
-                w_fac = 2. * max_w / (max_w + w)
-                weight = cell_area[ii, jj] * l_fac * w_fac
-                weighted_sum += weight * a[jj]
-                weight_sum += weight
-                score_arr[ii, jj] = weight * a[jj]
+    l_fac, w_fac = _condensed_factors(sim, levels)
+    weight = cell_area[:n_rows] * l_fac[:, None] * w_fac[None, :]
+    valid = supported[:, None] & ~np.isnan(rescaled)
+    cells = weight * rescaled
+    weighted_sum = _sequential_sum(cells[valid])
+    weight_sum = _sequential_sum(weight[valid])
+
+    score_arr = np.zeros(sim['fssf'].values.shape)
+    score_arr[:n_rows] = np.where(valid, cells, 0.)
 
     if skipped_thresholds:
         logger.debug(
@@ -255,27 +321,30 @@ def weighted_fss_condensed_rect(sim, obs, levels):
     return cwfss, score_arr
 
 
-def rank_fss_all(data_list):
+RANKED_METRICS = ['mae', 'bias', 'rms', 'corr', 'd90', 'fss_condensed', 'fss_condensed_weighted']
+RANKED_FSS_TOTALS = ['fss_total_abs_score', 'fss_total_rel_score', 'fss_success_rate_abs', 'fss_success_rate_rel']
+
+
+def _rank_metrics(data_list, metrics, scores=None):
+    """Rank columns of `metrics` in the ScoreTable `scores` (built from
+    data_list if None), published as 'rank_<metric>' keys of the sims."""
+    if scores is None:
+        scores = score_table.ScoreTable(data_list)
+    scores.rank(metrics).publish(data_list, ['rank_' + metric for metric in metrics])
+    return scores
+
+
+def rank_fss_all(data_list, scores=None):
     """
     Add some keys to the sim dicts which indicate the
-    rank of the respective sim for each metric
-
-    MAE, RMSE ..... lowest is best
-    BIAS .......... lowest absolute is best
-    CORRELATION ... highest is best
+    rank of the respective sim for each total FSS score
+    (highest is best), see rank_scores.
     """
-    namelist = [d['name'] for d in data_list]
-    for metric in ['fss_total_abs_score', 'fss_total_rel_score', 'fss_success_rate_abs', 'fss_success_rate_rel']:
-        rank=1
-        rank_name='rank_'+metric
-        data_list_metric = sorted(data_list, key=lambda k: -k[metric])
-        for data_entry in data_list_metric:
-            data_list[namelist.index(data_entry['name'])][rank_name] = rank
-            rank = rank + 1
+    _rank_metrics(data_list, RANKED_FSS_TOTALS, scores)
     return data_list
 
 
-def rank_scores(data_list):
+def rank_scores(data_list, scores=None):
     """
     Add some keys to the sim dicts which indicate the
     rank of the respective sim for each metric
@@ -283,32 +352,20 @@ def rank_scores(data_list):
     MAE, RMSE ..... lowest is best
     BIAS .......... lowest absolute is best
     CORRELATION ... highest is best
+
+    The ranks are computed as columns of the ScoreTable `scores` (built
+    from data_list if None, see score_table.py).  Equal scores are ranked
+    in data_list order, NaN scores last.
     """
-    namelist = [d['name'] for d in data_list]
     logging.info("Ranking")
-    for metric in ['mae', 'bias', 'rms', 'corr', 'd90', 'fss_condensed', 'fss_condensed_weighted']:
-        rank=1
-        rank_name='rank_'+metric
-        if metric == 'bias':
-            data_list_metric = sorted(data_list, key=lambda k: np.abs(k[metric]))
-        elif metric == 'corr' or metric == 'fss_success_rate_abs' or metric == 'fss_success_rate_rel' \
-             or metric == 'fss_condensed' or metric == 'fss_condensed_weighted':
-            data_list_metric = sorted(data_list, key=lambda k: -k[metric])
-        else:
-            data_list_metric = sorted(data_list, key=lambda k: k[metric])
-        for data_entry in data_list_metric:
-            data_list[namelist.index(data_entry['name'])][rank_name] = rank
-            rank = rank + 1
+    _rank_metrics(data_list, RANKED_METRICS, scores)
     fss_list = []
     for sim in data_list[1:]:
         fss_list.append(np.asarray(sim['fssf'].values, dtype=float))
     fss = np.asarray(fss_list, dtype=float)
-    fss_order = np.zeros(fss.shape, dtype = int)
-    fss_rel = np.zeros(fss.shape, dtype = float) 
-    for ii in range(fss.shape[1]):
-        for jj in range(fss.shape[2]):
-            fss_order[:,ii,jj] = rank_array(fss[:,ii,jj], sim['fssf_thresholds'][ii])
-            fss_rel[:,ii,jj] = array_minus_avg(fss[:,ii,jj], sim['fssf_thresholds'][ii])
+    thresholds = np.asarray(sim['fssf_thresholds'], dtype=float)[:fss.shape[1]]
+    fss_order = rank_cube(fss, thresholds)
+    fss_rel = cube_minus_avg(fss, thresholds)
     bogus_fss = np.empty((fss.shape[1],fss.shape[2]))
     bogus_fss[:,:] = -999
     sim['fss_ranks'] = bogus_fss
@@ -319,30 +376,41 @@ def rank_scores(data_list):
     return data_list
 
 
-def write_scores_to_csv(data_list, start_date, end_date, args, verification_subdomain, windows, thresholds):
+CSV_SCORE_COLUMNS = ["bias_real", "mae", "rms", "corr", "d90", "fss_condensed", "fss_condensed_weighted",
+                     "rank_mae", "rank_bias", "rank_rms", "rank_corr", "rank_d90", "rank_fss_condensed",
+                     "rank_fss_condensed_weighted"]
+
+
+def write_scores_to_csv(data_list, start_date, end_date, args, verification_subdomain, windows, thresholds,
+                        scores=None):
+    """
+    Write the scores of every entry of data_list to a CSV file, the score
+    and rank columns taken from the ScoreTable `scores` (built from the
+    sim dicts if None or incomplete).
+    """
     name_part = '' # if args.mode == 'None' else args.mode+'_'
     csv_file = "../SCORES/"+args.name+"RR_"+name_part+"score_"+start_date.strftime("%Y%m%d_%HUTC_")+'{:02d}h_acc_'.format(args.duration)+verification_subdomain+'.csv'
     logging.info("Saving {csv_file}")
     start_date_str = start_date.strftime("%Y%m%d_%H")
     end_date_str = end_date.strftime("%Y%m%d_%H")
     csv_file = f"{PAN_DIR_SCORES}/{args.name}RR_{name_part}score_{start_date_str}UTC_{args.duration:02d}h_acc_{verification_subdomain}.csv"
+    if scores is None or not all(key in scores for key in CSV_SCORE_COLUMNS):
+        scores = score_table.ScoreTable(data_list, columns=CSV_SCORE_COLUMNS)
+    rows = scores.rows(data_list)
+    table = [scores.frame[key].to_numpy()[rows].tolist() for key in CSV_SCORE_COLUMNS]
     with open(csv_file, 'w') as f:
         score_writer = csv.writer(f, delimiter=';')
         col_labels = ["conf", "init", "lead", "name", "maximum", "average", "99th", "95th", "90th", "75th", "50th",
                       "bias", "mae", "rms", "corr", "d90", "fss_condensed", "fss_condensed_weighted",
                       "rank_mae", "rank_bias", "rank_rms", "rank_corr", "rank_d90", "rank_fss_condensed", "rank_fss_condensed_weighted"]
         score_writer.writerow(col_labels)
-        for sim in data_list:
+        for sim, sim_scores in zip(data_list, zip(*table)):
             percs = [sim["precip_data_resampled"].max(), sim["precip_data_resampled"].mean()]
-            for p in [99., 95., 90., 75., 50.]:
-                percs.append(np.percentile(sim["precip_data_resampled"], p))
+            percs.extend(quantiles.percentile(sim["precip_data_resampled"], [99., 95., 90., 75., 50.]))
             score_writer.writerow([
                 sim['conf'], sim['init'], sim['lead'], sim['name'], 
                 percs[0], percs[1], percs[2], percs[3], percs[4], percs[5], percs[6],
-                sim['bias_real'], sim['mae'], sim['rms'], sim['corr'], sim['d90'], 
-                sim['fss_condensed'], sim['fss_condensed_weighted'], 
-                sim['rank_mae'], sim['rank_bias'], sim['rank_rms'], sim['rank_corr'], sim['rank_d90'], 
-                sim['rank_fss_condensed'], sim['rank_fss_condensed_weighted']])
+                *sim_scores])
     if args.save_percentiles:
         csv_file = f"{PAN_DIR_SCORES}/{args.name}RR_percentiles_{name_part}score_{start_date_str}UTC_{args.duration:02d}h_acc_{verification_subdomain}.csv"
         logging.info("Saving percentiles to {csv_file}")
@@ -353,9 +421,7 @@ def write_scores_to_csv(data_list, start_date, end_date, args, verification_subd
                 col_labels.append(f"{p:d}th")
             score_writer.writerow(col_labels)
             for sim in data_list:
-                percs = []
-                for p in range(0, 101):
-                    percs.append(np.percentile(sim["precip_data_resampled"], p))
+                percs = list(quantiles.percentile(sim["precip_data_resampled"], np.arange(0, 101)))
                 write_data = [sim['conf'], sim['init'], sim['lead'], sim['name'], *percs]
                 score_writer.writerow(write_data)
 
@@ -368,12 +434,101 @@ def prep_windows(ww, mode, nx, ny):
         windows_ret[idx, 1] = nx if mode == 'valid_adaptive' and w > nx else w
     return windows_ret
         
-def calc_scores(sim, obs, args):
+
+POINT_CHUNK_BYTES = 2**20      # row chunks of the stacked fields, cache-sized
+
+
+def _point_chunks(fields, obs_field, rows):
+    """Row chunks (model stack, obs, missing) of `fields` and `obs_field` in
+    float64; missing where either is NaN, zeroed in both."""
+    for start in range(0, obs_field.shape[0], rows):
+        rr = slice(start, start + rows)
+        obs = np.asarray(obs_field[rr], dtype=np.float64)
+        mod = np.stack([np.asarray(field[rr], dtype=np.float64) for field in fields])
+        missing = np.isnan(mod) | np.isnan(obs)
+        mod[missing] = 0.
+        yield mod, np.where(missing, 0., obs), missing
+
+
+def point_scores(fields, obs_field, chunk_bytes=POINT_CHUNK_BYTES):
+    """
+    Bias, MAE, RMS and Pearson correlation of every field in `fields`
+    against `obs_field`, each over the points valid (not NaN) in both.
+
+    All fields are scored together, in row chunks of about `chunk_bytes` of
+    the stacked (n_fields, rows, nx) float64 fields, so no masked copies of
+    whole fields are made.  A first pass sums the differences and values, a
+    second the products about each field's own means, like np.corrcoef, so
+    constant (e.g. dry) fields get a NaN or ~0 correlation, not rounding
+    noise.  Fields with fewer than 2 valid points get NaN scores.
+
+    :return: dict of (n_fields,) arrays 'bias', 'mae', 'rms', 'corr' and
+        'n_valid'.
+    """
+    fields = list(fields)
+    n_fields = len(fields)
+    rows = max(1, int(chunk_bytes) // max(1, n_fields * obs_field.shape[1] * 8))
+    n_valid = np.zeros(n_fields, dtype=np.int64)
+    sums = np.zeros((5, n_fields))            # diff, |diff|, diff^2, model, obs
+    for mod, obs, missing in _point_chunks(fields, obs_field, rows):
+        n_valid += missing[0].size - missing.sum(axis=(1, 2))
+        sums[3] += mod.sum(axis=(1, 2))
+        sums[4] += obs.sum(axis=(1, 2))
+        mod -= obs                            # the differences, 0 where missing
+        sums[0] += mod.sum(axis=(1, 2))
+        sums[2] += np.einsum('ijk,ijk->i', mod, mod)
+        sums[1] += np.abs(mod, out=mod).sum(axis=(1, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / n_valid
+    mean_mod, mean_obs = means[3][:, None, None], means[4][:, None, None]
+    products = np.zeros((3, n_fields))        # model x obs, model^2, obs^2 about the means
+    for mod, obs, missing in _point_chunks(fields, obs_field, rows):
+        mod -= mean_mod
+        mod[missing] = 0.
+        obs = obs - mean_obs
+        obs[missing] = 0.
+        products[0] += np.einsum('ijk,ijk->i', mod, obs)
+        products[1] += np.einsum('ijk,ijk->i', mod, mod)
+        products[2] += np.einsum('ijk,ijk->i', obs, obs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.clip(products[0] / np.sqrt(products[1]) / np.sqrt(products[2]), -1., 1.)
+    scores = {'bias': means[0], 'mae': means[1], 'rms': np.sqrt(means[2]), 'corr': corr}
+    for value in scores.values():
+        value[n_valid < 2] = np.nan
+    scores['n_valid'] = n_valid
+    return scores
+
+
+def batch_point_scores(data_list, chunk_bytes=POINT_CHUNK_BYTES):
+    """
+    point_scores of all models in data_list against the observation
+    (data_list[0]) in one pass; one dict of scalars per entry, None for
+    the observation entries.  Passed to calc_scores as `points`.
+    """
+    field = "precip_data_resampled"
+    models = [ii for ii, sim in enumerate(data_list) if sim['type'] != 'obs']
+    result = [None] * len(data_list)
+    if models:
+        scores = point_scores([data_list[ii][field] for ii in models], data_list[0][field],
+                              chunk_bytes=chunk_bytes)
+        for jj, ii in enumerate(models):
+            result[ii] = {key: value[jj] for key, value in scores.items()}
+    return result
+
+
+def calc_scores(sim, obs, args, obs_cache=None, n_jobs=1, points=None):
     """
     calculate verification metrics MAE, RMSE, BIAS and CORRELATION COEFFICIENT
 
     INCA is perfect, so it gets assinged really bad values manually to exclude it from
     the ranking later on
+
+    obs_cache ... optional fss_SAT.ObsFSSCache of obs["precip_data_resampled"],
+                  shared by all sims so the observation side of the FSS is
+                  only computed once per subdomain
+    n_jobs ...... threads over the FSS thresholds (see thread_budget.py)
+    points ...... optional point scores of sim from batch_point_scores,
+                  computed here (point_scores) if not given
     """
     logger.info('Calculating scores for '+sim['name'])
     percs=[25, 50, 75, 90, 95]
@@ -383,10 +538,9 @@ def calc_scores(sim, obs, args):
 
     ny, nx = sim["precip_data_resampled"].shape
     windows = prep_windows(windows, args.fss_calc_mode, nx, ny)
-    fss_calc_func = fss_SAT.fss_cumsum_frame
+    fss_calc_func = fss_backends.get_backend(args.fss_method, (ny, nx), windows)
     if args.fss_method == 'legacy':
         logger.info("FSS method is set to legacy, using old FFT approximation!")
-        fss_calc_func = fss_FFT.fss_frame
     if sim['type'] == 'obs':
         sim['bias'] = 999
         sim['bias_real'] = 999
@@ -427,35 +581,33 @@ def calc_scores(sim, obs, args):
         # point statistic to pixels valid in *both* fields so a single NaN
         # does not poison the whole score.
         _mod = sim["precip_data_resampled"]
-        _obs = obs["precip_data_resampled"]
-        valid = ~(np.isnan(_mod) | np.isnan(_obs))
-        n_valid = int(valid.sum())
+        if points is None:
+            # float32 fields (--precision) are still scored in float64
+            points = {key: value[0] for key, value in
+                      point_scores([_mod], obs["precip_data_resampled"]).items()}
+        bias, mae, rms, corr = points['bias'], points['mae'], points['rms'], points['corr']
+        n_valid = int(points['n_valid'])
         if n_valid < 2:
             logger.warning("%s: fewer than 2 jointly-valid pixels vs obs, "
                            "point scores set to NaN", sim['name'])
-            bias = mae = rms = corr = np.nan
-        else:
-            _diff = _mod[valid] - _obs[valid]
-            bias = np.mean(_diff)
-            mae = np.mean(np.abs(_diff))
-            rms = np.sqrt(np.mean(np.square(_diff)))
-            corr = np.corrcoef(_mod[valid], _obs[valid])[0, 1]
-            if n_valid < _mod.size:
-                logger.debug("%s: point scores over %d/%d valid pixels (%.1f%% masked)",
-                             sim['name'], n_valid, _mod.size,
-                             100.0 * (1.0 - n_valid / _mod.size))
+        elif n_valid < _mod.size:
+            logger.debug("%s: point scores over %d/%d valid pixels (%.1f%% masked)",
+                         sim['name'], n_valid, _mod.size,
+                         100.0 * (1.0 - n_valid / _mod.size))
         threshold_mode = getattr(args, 'fss_threshold_mode', 'over')
         tolerance = getattr(args, 'fss_tolerance', 0.1)
         fss_num, fss_den, fss, ovest = fss_calc_func(
             sim["precip_data_resampled"],
             obs["precip_data_resampled"],
             windows,levels,percentiles=False, mode=args.fss_calc_mode.replace("_adaptive", ""),
-            threshold_mode=threshold_mode, tolerance=tolerance)
+            threshold_mode=threshold_mode, tolerance=tolerance, obs_cache=obs_cache, n_jobs=n_jobs)
+        # percentile thresholds come from the fields' cached sorts (quantiles.py),
+        # which never modify the fields, so no copies are needed for numpy #21524
         fssp_num, fssp_den, fssp, ovestp = fss_calc_func(
-            np.copy(sim["precip_data_resampled"]), # circumvent numpy issue #21524
-            np.copy(obs["precip_data_resampled"]), # circumvent numpy issue #21524
+            sim["precip_data_resampled"],
+            obs["precip_data_resampled"],
             windows,percs,percentiles=True, mode=args.fss_calc_mode.replace("_adaptive", ""),
-            threshold_mode=threshold_mode, tolerance=tolerance)
+            threshold_mode=threshold_mode, tolerance=tolerance, obs_cache=obs_cache, n_jobs=n_jobs)
         fssf = pd.concat((fss, fssp), axis=0)
         ovestf = pd.concat((ovest, ovestp), axis=0)
         sim['bias'] = np.abs(bias)
@@ -472,34 +624,43 @@ def calc_scores(sim, obs, args):
         sim['fssp_den'] = fssp_den
         sim['fssf'] = fssf
         sim['fss_overestimated'] = ovestf
-        sim['fss_condensed'], sim['fss_normalized_arr'] = fss_condensed(sim)
-        sim['fss_condensed_weighted'], sim['fss_normalized_weighted_arr'] = weighted_fss_condensed(sim, levels)
-        sim['fss_condensed_weighted_rect'], sim['fss_normalized_weighted_rect_arr'] = weighted_fss_condensed_rect(sim, obs, levels)
+        rescaled = rescaled_fss(sim)
+        sim['fss_condensed'], sim['fss_normalized_arr'] = fss_condensed(sim, rescaled)
+        sim['fss_condensed_weighted'], sim['fss_normalized_weighted_arr'] = weighted_fss_condensed(
+            sim, levels, rescaled)
+        sim['fss_condensed_weighted_rect'], sim['fss_normalized_weighted_rect_arr'] = weighted_fss_condensed_rect(
+            sim, obs, levels, rescaled, obs_cache=obs_cache)
         logger.info(
             f"{sim['name']}: fss_condensed_weighted = {sim['fss_condensed_weighted']:.4f} (sum), "
             f"fss_condensed_weighted_rect = {sim['fss_condensed_weighted_rect']:.4f} (cwFSS in [0, 1])")
-        sim['d90'] = fss_d90(sim["precip_data_resampled"], obs["precip_data_resampled"], args)
+        sim['d90'] = fss_d90(sim["precip_data_resampled"], obs["precip_data_resampled"], args,
+                             obs_cache=obs_cache)
     return(sim)
 
 
-def fss_d90(rrm, rro, args):
+# windows of the legacy D90 search, the largest one limits the bisection
+D90_WINDOWS = [3, 5, 7, 11, 21, 31, 41, 51, 61, 81, 101, 121, 141, 181, 251, 351, 501, 701]
+
+
+def fss_d90(rrm, rro, args, obs_cache=None):
     """
     Estimate the displacement of the 90th-percentile precipitation field.
 
     Computes the FSS between the surplus (non-overlapping) parts of the
-    binary p90 fields at increasing window sizes, and finds the half-window
-    at which the FSS reaches 0.5 via linear interpolation.
+    binary p90 fields and finds the half-window at which the FSS reaches
+    0.5.  The exact backends evaluate the FSS lazily (fss_SAT.LazyFSS) and
+    bracket and bisect the crossing down to neighbouring window sizes, up
+    to the largest of D90_WINDOWS (see _d90_bisect).  The legacy FFT
+    backend computes all of D90_WINDOWS and interpolates linearly between
+    them.
+
+    The surplus fields depend on the model, so only the observation's p90
+    and its binary field are taken from `obs_cache` (if given).
 
     Returns the displacement in km (half-window size), or 9999. / np.nan
     for degenerate cases.
     """
-    fss_calc_func = fss_SAT.fss_cumsum_frame
-    if args.fss_method == 'legacy':
-        logger.info("FSS method is set to legacy, using old FFT approximation for D90!")
-        fss_calc_func = fss_FFT.fss_frame
-    windows = [3, 5, 7, 11, 21, 31, 41, 51, 61, 81, 101, 121, 141, 181, 251, 351, 501, 701]
-    windows_2d = prep_windows(windows, args.mode, *rrm.shape)
-    levels = [0.5]
+    windows = D90_WINDOWS
     # NaN-aware: observation fields (e.g. OPERA) may contain NaN where there is
     # no radar coverage. A plain np.percentile would return NaN and silently
     # turn the binary intense field into all-zeros. Use nanpercentile and treat
@@ -508,10 +669,16 @@ def fss_d90(rrm, rro, args):
     if obs_unobserved.all() or np.isnan(rrm).all():
         logger.warning("Observation or model field is entirely NaN, returning no d90!")
         return np.nan
-    p90_obs = np.nanpercentile(np.copy(rro), 90)
-    p90_mod = np.nanpercentile(np.copy(rrm), 90)
+    p90_mod = quantiles.percentile(rrm, 90, nan=True)
     # comparisons against NaN yield False, so NaN pixels become 0 (non-event)
-    _rro = np.where(rro >= p90_obs, 1, 0)
+    # the observation's binary field is kept as bool (it is cached per
+    # subdomain) and only widened to int by the surplus differences below
+    if obs_cache is not None:
+        p90_obs = obs_cache.percentile(90, nan=True)
+        _rro = obs_cache.get(('d90_binary', p90_obs), lambda: rro >= p90_obs, large=True)
+    else:
+        p90_obs = quantiles.percentile(rro, 90, nan=True)
+        _rro = rro >= p90_obs
     _rrm = np.where(rrm >= p90_mod, 1, 0) # circumvent numpy issue #21524
     # do not credit/penalise displacement where the obs is unobserved
     _rrm[obs_unobserved] = 0
@@ -529,8 +696,17 @@ def fss_d90(rrm, rro, args):
                         "cannot identify intense precipitation area, returning no d90!", p90_mod)
         return np.nan
     # surplus fields: non-overlapping parts of the binary p90 fields
+    _rro = _rro.astype(_rrm.dtype)
     rro_s = np.maximum(_rro - _rrm, 0)
     rrm_s = np.maximum(_rrm - _rro, 0)
+    if args.fss_method != 'legacy':
+        # valid_adaptive clips the windows to the grid (see prep_windows)
+        max_window = prep_windows([max(windows)], args.mode, *rrm.shape).min()
+        return _d90_bisect(fss_SAT.LazyFSS(rro_s, rrm_s, max_window), max_window)
+    logger.info("FSS method is set to legacy, using old FFT approximation for D90!")
+    windows_2d = prep_windows(windows, args.mode, *rrm.shape)
+    fss_calc_func = fss_backends.get_backend(args.fss_method, rrm.shape, windows_2d)
+    levels = [0.5]
     _, _, _arr, _ = fss_calc_func(
         rro_s.astype(float), rrm_s.astype(float), windows_2d, levels,
         mode=args.fss_calc_mode)
@@ -556,3 +732,53 @@ def fss_d90(rrm, rro, args):
     if d < 0:
         d = 0.
     return 0.5 * d
+
+
+def _d90_bisect(fss_at, max_window):
+    """
+    D90 from an FSS evaluated on demand, `fss_at(window)`.  The crossing of
+    0.5 is bracketed by doubling the half width from 1 (window 3) up to that
+    of `max_window`, then the bracket is bisected over half widths, the
+    window sizes the SAT distinguishes, until the crossing lies between
+    neighbouring windows, which are interpolated linearly.
+
+    Bisection needs a monotonous FSS, so every evaluated window is checked:
+    a drop of more than 0.01 from the previous bracketing step, or a
+    bisection midpoint more than 0.01 outside its bracket values, means
+    non-monotonous (9999.).  Unlike the scan of all D90_WINDOWS, drops at
+    windows that are never evaluated (e.g. beyond the crossing) are not
+    detected.
+    """
+    w_max = max_window // 2
+    lo, hi = 0, 1
+    f_lo = None
+    while True:
+        f_hi = fss_at(2 * hi + 1)
+        if np.isnan(f_hi):
+            # both surplus fields empty
+            return np.nan
+        if f_lo is not None and f_hi - f_lo < -0.01:
+            logger.info("non-monotonous FSS array in D90, returning no d90!")
+            return 9999.
+        if f_hi >= 0.5:
+            break
+        if hi == w_max:
+            logger.info("FSS never reaches 0.5, returning no d90!")
+            return 9999.
+        f_lo = f_hi
+        lo, hi = hi, min(2 * hi, w_max)
+    if lo == 0:
+        return 0.
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        f_mid = fss_at(2 * mid + 1)
+        if f_mid - f_lo < -0.01 or f_hi - f_mid < -0.01:
+            logger.info("non-monotonous FSS array in D90, returning no d90!")
+            return 9999.
+        if f_mid >= 0.5:
+            hi, f_hi = mid, f_mid
+        else:
+            lo, f_lo = mid, f_mid
+    t = (0.5 - f_lo) / (f_hi - f_lo)
+    d = 2 * lo + 1 + 2. * t
+    return 0.5 * max(d, 0.)
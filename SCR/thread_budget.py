@@ -0,0 +1,96 @@
+"""Split of the --threads budget between nested levels of parallelism.
+
+A run has three nested levels of parallelism:
+
+    outer  the joblib/process pools over simulations (scoring), ensemble
+           member pairs (dFSS), CWFSS sample groups (ranking check) and
+           panels (plotting)
+    inner  the threshold jobs of one FSS computation
+           (fss_SAT.fss_cumsum_parallel n_jobs)
+    blas   the BLAS/OpenMP threads of numpy and scipy
+
+Each parallel section asks for an Allocation, which gives the outer pool at
+most --threads workers and splits what is left between the inner jobs and
+the BLAS threads, so that outer * inner * blas never exceeds the budget:
+
+    with thread_budget.allocate(args.threads, len(data_list), "scoring") as alloc:
+        Parallel(n_jobs=alloc.outer)(...)
+
+Inside the `with` block the BLAS libraries loaded by this process are
+limited to `alloc.blas` threads with threadpoolctl; without threadpoolctl
+they keep the thread count set by the environment variables at start-up
+(main.py sets them to 1).  Subprocesses get the limit through
+Allocation.environ().
+"""
+
+import os
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+# environment variables read by the BLAS/OpenMP runtimes at start-up
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                 "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def limit_blas(threads):
+    """Limit the BLAS/OpenMP libraries of this process to `threads`, returns
+    the threadpoolctl limiter (None without threadpoolctl)."""
+    if threadpoolctl is None:
+        return None
+    return threadpoolctl.threadpool_limits(limits=threads)
+
+
+class Allocation:
+    """
+    Threads of one parallel section: `outer` pool workers, each running up
+    to `inner` FSS threshold jobs that use `blas` BLAS threads each.
+    """
+    def __init__(self, name, budget, outer, inner, blas):
+        self.name = name
+        self.budget = budget
+        self.outer = outer
+        self.inner = inner
+        self.blas = blas
+        self._limiter = None
+
+    def environ(self):
+        """Copy of os.environ with the BLAS limit, for subprocesses."""
+        env = dict(os.environ)
+        env.update({var: str(self.blas) for var in BLAS_ENV_VARS})
+        return env
+
+    def __enter__(self):
+        self._limiter = limit_blas(self.blas)
+        return self
+
+    def __exit__(self, *exc):
+        if self._limiter is not None:
+            self._limiter.restore_original_limits()
+            self._limiter = None
+
+    def __repr__(self):
+        return (f"Allocation({self.name!r}, budget={self.budget}: {self.outer} workers x "
+                f"{self.inner} inner jobs x {self.blas} BLAS threads)")
+
+
+def allocate(threads, n_tasks, name="", inner_tasks=1):
+    """
+    Allocation of a budget of `threads` for a section with `n_tasks` outer
+    tasks, each of which could use up to `inner_tasks` inner jobs.  Outer
+    workers are filled first, then inner jobs, the rest goes to BLAS.
+    """
+    budget = max(1, int(threads))
+    outer = max(1, min(budget, int(n_tasks)))
+    inner = max(1, min(budget // outer, int(inner_tasks)))
+    blas = max(1, budget // (outer * inner))
+    alloc = Allocation(name, budget, outer, inner, blas)
+    blas_note = "" if threadpoolctl is not None else " (subprocesses only, threadpoolctl is not installed)"
+    logger.info(f"Threads for {name or 'parallel section'}: {outer} workers x {inner} inner jobs x "
+                f"{blas} BLAS threads{blas_note}, budget {budget}")
+    return alloc
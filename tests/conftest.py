@@ -17,6 +17,24 @@ import numpy as np
 import pytest
 
 
+# ---------------------------------------------------------------------------
+# timing benchmarks are opt-in (they depend on machine load)
+# ---------------------------------------------------------------------------
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", default=False,
+                     help="also run the timing micro-benchmarks (marker 'benchmark')")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="timing benchmark, run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 # ---------------------------------------------------------------------------
 # synthetic field helpers
 # ---------------------------------------------------------------------------
@@ -103,3 +121,20 @@ def make_test_args():
         defaults.update(overrides)
         return argparse.Namespace(**defaults)
     return _make
+
+
+@pytest.fixture
+def make_sim_dict():
+    """Factory fixture returning a data_list entry (simulation dict) of
+    `field`; further keys (e.g. color) may be overridden."""
+    def _make(field, name="sim", entry_type="model", **overrides):
+        entry = {
+            "case": "t", "exp": "t", "conf": name, "type": entry_type,
+            "init": "2024-01-01", "lead": 1, "name": name,
+            "lon": np.zeros(field.shape), "lat": np.zeros(field.shape),
+            "precip_data": field, "precip_data_resampled": field.copy(),
+            "color": None, "ensemble": None,
+        }
+        entry.update(overrides)
+        return entry
+    return _make
@@ -1,10 +1,11 @@
-"""Tests for ensembles.py — detect_ensembles and add_ensemble_pseudo_members."""
+"""Tests for ensembles.py — detect_ensembles, add_ensemble_pseudo_members, dFSS and CRPS."""
 
 import datetime as dt
 import numpy as np
 import pytest
 
 import ensembles
+import fss_backends
 
 
 def _sim(name, ensemble, init, precip, lon=None, lat=None):
@@ -103,3 +104,67 @@ class TestAddEnsemblePseudoMembers:
         data = [_sim('obs', None, dt.datetime(2026, 1, 1), np.zeros((2, 2)))]
         ensembles.add_ensemble_pseudo_members(data, {})
         assert len(data) == 1
+
+
+class TestCalcDFSS:
+
+    @staticmethod
+    def _ensemble(members, fss_method="sat"):
+        ens = object.__new__(ensembles.Ensemble)
+        ens.name = "e"
+        ens.precip_data_resampled = members
+        ens.member_count = len(members)
+        ens.thresholds = [0.1, 1.0, 10.0]
+        ens.windows = [(3, 3), (11, 11), (21, 21)]
+        ens.fss_method = fss_method
+        ens.threads = 2
+        return ens
+
+    def test_shared_box_sums_match_pairs(self, small_fields):
+        obs, fcst = small_fields
+        members = np.array([obs, fcst, np.roll(obs, 4, axis=1), np.zeros_like(obs)])
+        ens = self._ensemble(members)
+        frame = fss_backends.get_backend("sat")
+        ens.calc_dFSS(frame)
+        np.testing.assert_array_equal(ens.dFSS, ens._pairwise_dFSS(frame))
+        assert len(ens.dFSS) == 6
+        assert ens.dFSSmean.shape == (3, 3)
+
+    def test_missing_data_uses_pairs(self, small_fields):
+        obs, fcst = small_fields
+        gap = fcst.copy()
+        gap[:4, :4] = np.nan
+        ens = self._ensemble(np.array([obs, gap, fcst]))
+        frame = fss_backends.get_backend("sat")
+        ens.calc_dFSS(frame)
+        np.testing.assert_array_equal(ens.dFSS, ens._pairwise_dFSS(frame))
+
+
+class TestCrpsEnsemble:
+
+    @staticmethod
+    def _pairwise_crps(members, obs):
+        t1 = np.mean(np.abs(members - obs), axis=0)
+        diffs = np.abs(members[:, None, :, :] - members[None, :, :, :])
+        return t1 - 0.5 * np.mean(diffs, axis=(0, 1))
+
+    @pytest.mark.parametrize("n_members", [1, 2, 5, 17])
+    @pytest.mark.parametrize("chunk_bytes", [1, 2**10, 2**26])
+    def test_matches_pairwise_formula(self, n_members, chunk_bytes):
+        rng = np.random.default_rng(n_members)
+        members = rng.gamma(0.5, 2., (n_members, 13, 9))
+        members[:, 0, 0] = 0.      # ties
+        obs = rng.gamma(0.5, 2., (13, 9))
+        np.testing.assert_allclose(ensembles.crps_ensemble(members, obs, chunk_bytes=chunk_bytes),
+                                   self._pairwise_crps(members, obs), rtol=1e-12, atol=1e-12)
+
+    def test_nan_propagates(self):
+        rng = np.random.default_rng(1)
+        members = rng.random((4, 5, 6))
+        obs = rng.random((5, 6))
+        members[2, 1, 1] = np.nan
+        obs[3, 3] = np.nan
+        crps = ensembles.crps_ensemble(members, obs)
+        expected = self._pairwise_crps(members, obs)
+        np.testing.assert_array_equal(np.isnan(crps), np.isnan(expected))
+        assert np.isnan(crps[1, 1]) and np.isnan(crps[3, 3])
@@ -0,0 +1,122 @@
+"""Tests for fss_backends.py — interchangeable FSS backends."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fss_backends
+import fss_FFT
+import fss_SAT
+
+
+EXACT = [name for name in fss_backends.AUTO_CANDIDATES if name in fss_backends.BACKENDS]
+WINDOWS = [(w, w) for w in (2, 3, 10, 31, 101, 400)]
+THRESHOLDS = [0.1, 1.0, 5.0, 10.0]
+
+
+@pytest.fixture
+def fields():
+    rng = np.random.default_rng(0)
+    obs = rng.gamma(0.5, 4., (60, 75))
+    fcst = np.roll(obs, 5, axis=0) * rng.uniform(0.5, 1.5, obs.shape)
+    return obs, fcst
+
+
+def _gap(field):
+    out = field.copy()
+    out[:10, :20] = np.nan
+    return out
+
+
+class TestUniformFilterBoxFilter:
+
+    @pytest.mark.parametrize("ndim", [2, 3])
+    def test_box_sums_match_sat(self, ndim):
+        rng = np.random.default_rng(1)
+        field = rng.random((2, 37, 53) if ndim == 3 else (37, 53)) > 0.6
+        windows = [1, 2, 3, 10, 21, 80, 200]
+        sat = fss_SAT.compute_integral_table(field)
+        boxes = fss_backends.UNIFORM_FILTER.boxes(fss_backends.UNIFORM_FILTER.table(field), windows)
+        for n, box in zip(windows, boxes):
+            np.testing.assert_array_equal(box, fss_SAT.integral_filter(sat, n))
+
+
+class TestFusedProducts:
+    """The plain Python version of the JIT kernel (runs without numba)."""
+
+    @pytest.mark.parametrize("w", [1, 2, 7, 40])
+    def test_matches_box_sum_products(self, w):
+        rng = np.random.default_rng(2)
+        S, T = fss_SAT.compute_integral_table(rng.random((2, 17, 23)) > 0.5)
+        expected = fss_SAT._products(fss_SAT.integral_filter(S, 2 * w), fss_SAT.integral_filter(T, 2 * w))
+        assert fss_backends._fused_products_py(S, T, w) == expected
+
+
+class TestExactBackends:
+
+    @pytest.mark.parametrize("name", EXACT)
+    @pytest.mark.parametrize("mode", ["over", "under", "between", "tolerance"])
+    @pytest.mark.parametrize("gap", [False, True])
+    def test_identical_to_sat(self, fields, name, mode, gap):
+        obs, fcst = fields
+        if gap:
+            obs = _gap(obs)
+        for eps, model in ((False, fcst), (True, np.stack([fcst, np.roll(fcst, 3, axis=1), obs]))):
+            ref = fss_backends.BACKENDS["sat"](model, obs, WINDOWS, THRESHOLDS, threshold_mode=mode, eps=eps)
+            got = fss_backends.BACKENDS[name](model, obs, WINDOWS, THRESHOLDS, threshold_mode=mode, eps=eps)
+            for a, b in zip(ref, got):
+                pd.testing.assert_frame_equal(a, b, check_exact=True)
+
+    @pytest.mark.parametrize("name", EXACT)
+    def test_percentiles_and_raw(self, fields, name):
+        obs, fcst = fields
+        ref = fss_backends.BACKENDS["sat"](fcst, obs, WINDOWS, [25, 50, 90], percentiles=True, raw=True)
+        got = fss_backends.BACKENDS[name](fcst, obs, WINDOWS, [25, 50, 90], percentiles=True, raw=True)
+        np.testing.assert_array_equal(got, ref)
+
+
+class TestLegacyBackend:
+
+    def test_matches_fss_fft(self, fields):
+        obs, fcst = fields
+        ref = fss_FFT.fss_frame(fcst, obs, WINDOWS, THRESHOLDS)
+        got = fss_backends.BACKENDS["legacy"](fcst, obs, WINDOWS, THRESHOLDS,
+                                              threshold_mode="over", tolerance=0.1, obs_cache=None)
+        for a, b in zip(ref, got):
+            pd.testing.assert_frame_equal(a, b)
+
+
+class TestGetBackend:
+
+    def test_default_is_sat(self):
+        assert fss_backends.get_backend("default") is fss_backends.BACKENDS["sat"]
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError, match="Unknown FSS method"):
+            fss_backends.get_backend("nonsense")
+
+    def test_auto_probes_once_per_grid(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(fss_backends, "_auto_choice", {})
+        monkeypatch.setattr(fss_backends, "_probe",
+                            lambda name, *a: calls.append(name) or (0. if name == "sat" else 1.))
+        for _ in range(3):
+            assert fss_backends.get_backend("auto", (50, 60), WINDOWS) is fss_backends.BACKENDS["sat"]
+        assert sorted(calls) == sorted(EXACT)
+
+    def test_auto_probe_is_bounded(self, monkeypatch):
+        probes = []
+        monkeypatch.setattr(fss_backends, "_auto_choice", {})
+        monkeypatch.setattr(fss_backends, "_probe",
+                            lambda name, fcst, obs, windows: probes.append((obs.shape, windows)) or 0.)
+        fss_backends.auto_backend((2200, 1900), [(3, 3), (101, 101), (701, 701)])
+        for shape, windows in probes:
+            assert shape == (512, 512)
+            assert windows == [(3, 3), (101, 101), (512, 512)]
+        # every large domain shares the probe of the capped grid
+        fss_backends.auto_backend((1500, 3000), [(3, 3), (101, 101), (701, 701)])
+        assert len(probes) == len([n for n in fss_backends.AUTO_CANDIDATES if n in fss_backends.BACKENDS])
+
+    def test_auto_probe_runs(self):
+        name = fss_backends.auto_backend((30, 40), WINDOWS[:3])
+        assert name in EXACT
@@ -127,3 +127,44 @@ class TestSatVsFft:
                     continue
                 assert fft_fss[i, j] == pytest.approx(sat_fss[i, j], abs=0.05), \
                     f"SAT ({sat_fss[i,j]:.4f}) vs FFT ({fft_fss[i,j]:.4f}) differ at [{i},{j}]"
+
+
+# =====================================================================
+# spectral engine (field spectra shared between windows and levels)
+# =====================================================================
+
+class TestSpectralEngine:
+
+    WINDOWS = [(1, 1), (4, 4), (11, 11), (21, 9), (80, 80)]
+    LEVELS = [0.1, 5.0, 10.0, 100.0]
+
+    @pytest.mark.parametrize("mode", ["same", "valid", "full"])
+    def test_box_sums_match_fftconvolve(self, small_fields, mode):
+        obs, fcst = small_fields
+        fields = np.array([fcst > 5.0, obs > 5.0])
+        windows = [(1, 1), (4, 4), (21, 9), (40, 64)]
+        for window, hats in zip(windows, fss_FFT.spectral_box_sums(fields, windows, mode)):
+            for field, hat in zip(fields, hats):
+                np.testing.assert_allclose(hat, fss_FFT.fourier_filter(field, window, mode), atol=1e-9)
+
+    @pytest.mark.parametrize("mode", ["same", "valid"])
+    @pytest.mark.parametrize("percentiles", [False, True])
+    def test_frame_matches_convolve(self, small_fields, mode, percentiles):
+        obs, fcst = small_fields
+        levels = [50., 90., 99.] if percentiles else self.LEVELS
+        spectral = fss_FFT.fss_frame(fcst, obs, self.WINDOWS, levels, percentiles, mode, workers=2)
+        convolve = fss_FFT.fss_frame(fcst, obs, self.WINDOWS, levels, percentiles, mode, engine="convolve")
+        for a, b in zip(spectral, convolve):
+            pd.testing.assert_frame_equal(a, b, atol=1e-9)
+        np.testing.assert_allclose(
+            fss_FFT.fss_raw(fcst, obs, self.WINDOWS, levels, percentiles, mode),
+            fss_FFT.fss_raw(fcst, obs, self.WINDOWS, levels, percentiles, mode, engine="convolve"),
+            atol=1e-9)
+
+    def test_eps_matches_convolve(self, small_fields):
+        obs, fcst = small_fields
+        members = np.array([fcst, obs, np.roll(fcst, 7, axis=0)])
+        spectral = fss_FFT.fss_frame_eps(members, obs, self.WINDOWS, self.LEVELS)
+        convolve = fss_FFT.fss_frame_eps(members, obs, self.WINDOWS, self.LEVELS, engine="convolve")
+        for a, b in zip(spectral, convolve):
+            pd.testing.assert_frame_equal(a, b, atol=1e-9)
@@ -1,5 +1,9 @@
 """Tests for fss_SAT.py — the summed area table FSS implementation."""
 
+import concurrent.futures
+import threading
+import time
+
 import numpy as np
 import pandas as pd
 import pytest
@@ -46,6 +50,37 @@ class TestComputeIntegralTable:
         result = fss_SAT.compute_integral_table(field)
         np.testing.assert_array_equal(result, field)
 
+    def test_boolean_field_uses_int32(self):
+        field = np.random.default_rng(1).random((3, 40, 50)) > 0.5
+        result = fss_SAT.compute_integral_table(field)
+        assert result.dtype == np.int32
+        np.testing.assert_array_equal(result, field.astype(np.int64).cumsum(2).cumsum(1))
+
+    def test_count_field_bounded_by_maximum(self):
+        counts = np.full((10, 10), 7, dtype=np.int64)
+        result = fss_SAT.compute_integral_table(counts)
+        assert result.dtype == np.int32
+        assert result[-1, -1] == 700
+
+
+class TestSatDtype:
+
+    def test_opera_grid_fits_int32(self):
+        assert fss_SAT._sat_dtype((2200, 1900)) == np.int32
+
+    def test_large_grid_falls_back_to_int64(self):
+        # corners of a box sum are added before subtracting, so 2 * max must fit
+        assert fss_SAT._sat_dtype((40000, 40000)) == np.int64
+        assert fss_SAT._sat_dtype((2200, 1900), vmax=300) == np.int64
+
+    def test_products_do_not_overflow(self):
+        # box sums of a 301x301 window squared exceed int32
+        field = np.ones((400, 400), dtype=bool)
+        box = fss_SAT.integral_filter(fss_SAT.compute_integral_table(field), 301)
+        assert box.dtype == np.int32
+        ff, oo, fo = fss_SAT._products(box, box)
+        assert ff == np.sum(box.astype(float) ** 2)
+
 
 # =====================================================================
 # integral_filter
@@ -80,6 +115,33 @@ class TestIntegralFilter:
         np.testing.assert_array_almost_equal(result, result[:, ::-1])
 
 
+class TestIntegralFilterMulti:
+
+    windows = [1, 3, 4, 5, 11, 21, 41, 201]
+
+    def test_matches_single_window_2d(self):
+        field = (np.random.default_rng(1).random((40, 56)) > 0.7).astype(int)
+        sat = fss_SAT.compute_integral_table(field)
+        for n, box in zip(self.windows, fss_SAT.integral_filter_multi(sat, self.windows)):
+            w = n // 2
+            if w < 1:
+                np.testing.assert_array_equal(box, sat)
+                continue
+            # reference: the original pad-per-window implementation
+            p = np.pad(sat, w, mode='edge')
+            D = 2 * w
+            ref = (p[D:D+40, D:D+56] + p[:40, :56] - p[:40, D:D+56] - p[D:D+40, :56])
+            np.testing.assert_array_equal(box, ref)
+
+    def test_matches_single_window_3d(self):
+        field = np.random.default_rng(2).random((3, 24, 30))
+        sat = fss_SAT.compute_integral_table(field)
+        boxes = list(fss_SAT.integral_filter_multi(sat, self.windows[::-1]))
+        for n, box in zip(self.windows[::-1], boxes):
+            np.testing.assert_array_equal(box, fss_SAT.integral_filter(sat, n))
+            assert box.shape == sat.shape
+
+
 # =====================================================================
 # _fss_score
 # =====================================================================
@@ -111,6 +173,58 @@ class TestFssScore:
                 assert 0.0 <= score <= 1.0 + 1e-10
 
 
+class TestProducts:
+    """_products computes the sums as float64 (BLAS) dot products."""
+
+    @staticmethod
+    def _int64_sums(fhat, ohat):
+        f = fhat.ravel().astype(np.int64)
+        o = ohat.ravel().astype(np.int64)
+        return np.dot(f, f), np.dot(o, o), np.dot(f, o)
+
+    @pytest.mark.parametrize("window", [1, 5, 31, 101])
+    def test_exact_against_integer_dot(self, window):
+        rng = np.random.default_rng(7)
+        fields = rng.random((2, 150, 130)) > 0.6
+        sat = fss_SAT.compute_integral_table(fields)
+        fhat, ohat = fss_SAT.integral_filter(sat, window)
+        assert fss_SAT._products(fhat, ohat) == self._int64_sums(fhat, ohat)
+
+    def test_falls_back_to_int64_beyond_float_precision(self):
+        rng = np.random.default_rng(3)
+        fhat = rng.integers(2**25, 2**26, 1000)
+        ohat = rng.integers(2**25, 2**26, 1000)
+        ff, oo, fo = fss_SAT._products(fhat, ohat)
+        assert ff + oo > 2**53
+        assert (int(ff), int(oo), int(fo)) == tuple(
+            sum(int(a) * int(b) for a, b in zip(x, y))
+            for x, y in ((fhat, fhat), (ohat, ohat), (fhat, ohat)))
+
+    def test_float_box_sums(self):
+        rng = np.random.default_rng(5)
+        fhat, ohat = rng.random((2, 40, 30))
+        ff, oo, fo = fss_SAT._products(fhat, ohat)
+        np.testing.assert_allclose([ff, oo, fo], [np.dot(fhat.ravel(), fhat.ravel()),
+                                                  np.dot(ohat.ravel(), ohat.ravel()),
+                                                  np.dot(fhat.ravel(), ohat.ravel())])
+
+    @pytest.mark.benchmark
+    def test_speedup_per_window(self, record_property):
+        """Micro-benchmark of the reduction stage for one window on a
+        1000x1000 grid: float64 BLAS dots vs. the generic int64 loop.  The
+        timings are recorded as test properties (e.g. in --junitxml)."""
+        import timeit
+        rng = np.random.default_rng(0)
+        sat = fss_SAT.compute_integral_table(rng.random((2, 1000, 1000)) > 0.7)
+        fhat, ohat = fss_SAT.integral_filter(sat, 21)
+        work = np.empty((2, fhat.size))
+        t_int = min(timeit.repeat(lambda: self._int64_sums(fhat, ohat), number=5, repeat=7)) / 5
+        t_blas = min(timeit.repeat(lambda: fss_SAT._products(fhat, ohat, work), number=5, repeat=7)) / 5
+        record_property("int64_ms", 1e3 * t_int)
+        record_property("blas_ms", 1e3 * t_blas)
+        assert fss_SAT._products(fhat, ohat, work) == self._int64_sums(fhat, ohat)
+
+
 # =====================================================================
 # R2 quasi-random sequence
 # =====================================================================
@@ -317,6 +431,61 @@ class TestFssCumsumFrame:
         assert not np.allclose(fss_over, fss_tol, equal_nan=True)
 
 
+# =====================================================================
+# fss_pairwise (all member pairs from one Gram matrix)
+# =====================================================================
+
+class TestFssPairwise:
+
+    @staticmethod
+    def _members(small_fields):
+        obs, fcst = small_fields
+        rng = np.random.default_rng(11)
+        return np.array([obs, fcst, np.roll(obs, 5, axis=0), obs * rng.random(obs.shape),
+                         np.zeros_like(obs)])
+
+    def _pairwise(self, stack, thresholds, windows):
+        from itertools import combinations
+        return np.array([fss_SAT.fss_cumsum_frame(stack[i], stack[j], [(w, w) for w in windows],
+                                                  thresholds, raw=True)
+                         for i, j in combinations(range(len(stack)), 2)])
+
+    def test_identical_to_pair_frames(self, small_fields):
+        stack = self._members(small_fields)
+        windows, thresholds = [1, 3, 10, 21, 64], [0.1, 1.0, 10.0, 100.0]
+        result = fss_SAT.fss_pairwise(stack, thresholds, windows)
+        assert result.shape == (10, 4, 5)
+        np.testing.assert_array_equal(result, self._pairwise(stack, thresholds, windows))
+        assert np.isnan(result[-1, -1]).all()    # no exceedances in either member
+
+    def test_int64_fallback(self, small_fields, monkeypatch):
+        stack = self._members(small_fields)
+        expected = fss_SAT.fss_pairwise(stack, [1.0], [5, 11])
+        monkeypatch.setattr(fss_SAT, "_EXACT_FLOAT_LIMIT", 1.0)
+        np.testing.assert_array_equal(fss_SAT.fss_pairwise(stack, [1.0], [5, 11]), expected)
+
+    def test_single_member(self, small_fields):
+        assert fss_SAT.fss_pairwise(self._members(small_fields)[:1], [1.0], [5]).shape == (0, 1, 1)
+
+
+class TestLazyFSS:
+
+    def test_matches_frame(self, small_fields):
+        obs, fcst = small_fields
+        fb, ob = fcst > 5.0, obs > 5.0
+        windows = [1, 2, 3, 10, 21, 64, 201]
+        lazy = fss_SAT.LazyFSS(fb, ob, 201)
+        frame = fss_SAT.fss_cumsum_frame(fb.astype(float), ob.astype(float), [(w, w) for w in windows],
+                                         [0.5], raw=True)[0]
+        np.testing.assert_array_equal([lazy(w) for w in reversed(windows)], frame[::-1])
+        assert sorted(lazy.scores) == [0, 1, 5, 10, 32, 100]
+
+    def test_window_limit(self, small_fields):
+        obs, fcst = small_fields
+        with pytest.raises(ValueError):
+            fss_SAT.LazyFSS(fcst > 1.0, obs > 1.0, 21)(23)
+
+
 # =====================================================================
 # CWFSS class
 # =====================================================================
@@ -362,6 +531,29 @@ class TestCWFSS:
         assert len(cwfss.bootstrap_info) == 100
         assert np.std(cwfss.bootstrap_info) >= 0
 
+    def test_bootstrap_seeded(self, small_fields):
+        obs, fcst = small_fields
+        cwfss = fss_SAT.CWFSS(fcst, obs, nsamples=50, threshold_limiting="relative",
+                               window_limits=[3, 30])
+        cwfss.bootstrap(N=200, rng=7)
+        first = cwfss.bootstrap_info.copy()
+        cwfss.bootstrap(N=200, rng=np.random.default_rng(7), chunk_bytes=1)
+        np.testing.assert_array_equal(cwfss.bootstrap_info, first)
+        cwfss.bootstrap(N=200, rng=8)
+        assert not np.array_equal(cwfss.bootstrap_info, first)
+
+    def test_bootstrap_matches_loop(self, small_fields):
+        """Same statistic as resampling one index vector at a time."""
+        obs, fcst = small_fields
+        cwfss = fss_SAT.CWFSS(fcst, obs, nsamples=50, threshold_limiting="relative",
+                               window_limits=[3, 30])
+        cwfss.bootstrap(N=20, rng=3)
+        weighted_fss, weighted_fss_max = cwfss._weights()
+        rng = np.random.default_rng(3)
+        for value in cwfss.bootstrap_info:
+            idx = rng.integers(0, cwfss.nsamples, size=(1, cwfss.nsamples))[0]
+            assert value == pytest.approx(np.nanmean(weighted_fss[idx]) / np.nanmean(weighted_fss_max[idx]))
+
     def test_tolerance_mode(self, small_fields):
         obs, fcst = small_fields
         cwfss_over = fss_SAT.CWFSS(fcst, obs, nsamples=50,
@@ -376,6 +568,41 @@ class TestCWFSS:
         assert 0 <= cwfss_over.cwfss <= 1
         assert 0 <= cwfss_tol.cwfss <= 1
 
+    @pytest.mark.parametrize("mode", ["over", "under", "tolerance"])
+    def test_shared_tables_match_per_sample(self, small_fields, mode):
+        """Samples grouped onto one table pair score as if evaluated alone."""
+        obs, fcst = small_fields
+        cwfss = fss_SAT.CWFSS(fcst, obs, nsamples=200, threshold_limiting="relative",
+                               window_limits=[3, 30], threshold_mode=mode)
+        assert cwfss.sat_builds < cwfss.nsamples
+        for N in range(0, 200, 7):
+            t, w = cwfss.thresholds[N], int(cwfss.windows[N])
+            fhat = fss_SAT.integral_filter(fss_SAT.compute_integral_table(cwfss._binarise(fcst, t)), w)
+            ohat = fss_SAT.integral_filter(fss_SAT.compute_integral_table(cwfss._binarise(obs, t)), w)
+            ff, oo, fo = fss_SAT._products(fhat, ohat)
+            assert cwfss.numerators[N] == (ff + oo - 2.0 * fo) / fhat.size
+            assert cwfss.denominators[N] == (ff + oo) / fhat.size
+
+    @pytest.mark.parametrize("with_gap", [False, True])
+    def test_threshold_bins(self, small_fields, with_gap):
+        obs, fcst = small_fields
+        if with_gap:
+            obs = obs.copy()
+            obs[:10, :10] = np.nan
+        kwargs = dict(nsamples=300, threshold_limiting="relative", window_limits=[3, 30])
+        exact = fss_SAT.CWFSS(fcst, obs, **kwargs)
+        binned = fss_SAT.CWFSS(fcst, obs, threshold_bins=16, **kwargs)
+        assert binned.sat_builds <= 16
+        levels = np.linspace(binned.tmin, binned.tmax, 16)
+        assert np.all(np.isclose(binned.thresholds[:, None], levels).any(axis=1))
+        np.testing.assert_array_equal(binned.windows, exact.windows)
+        assert abs(binned.cwfss - exact.cwfss) < 0.05
+
+    def test_threshold_bins_invalid(self, small_fields):
+        obs, fcst = small_fields
+        with pytest.raises(ValueError):
+            fss_SAT.CWFSS(fcst, obs, nsamples=10, threshold_bins=1)
+
 
 # =====================================================================
 # missing-data (NaN) handling
@@ -437,6 +664,80 @@ class TestFssScoreMasked:
         _, _, score_clean = fss_SAT._fss_score(fhat, ohat, 1.0 / area ** 2)
         assert score_masked == pytest.approx(score_clean)
 
+    @staticmethod
+    def _masked_boxes(window, shape=(90, 70)):
+        rng = np.random.default_rng(window)
+        mask = np.ones(shape, dtype=bool)
+        mask[:30, :25] = False
+        fields = (rng.random((2,) + shape) > 0.6) & mask
+        Sf, So = fss_SAT.integral_filter(fss_SAT.compute_integral_table(fields), window)
+        invalid = fss_SAT.integral_filter(fss_SAT.compute_integral_table(~mask), window)
+        return Sf, So, fss_SAT._valid_counts(invalid, window // 2)
+
+    @pytest.mark.parametrize("window", [1, 5, 31, 201])
+    def test_workspace_identical(self, window):
+        Sf, So, C = self._masked_boxes(window)
+        ws = fss_SAT.MaskedWorkspace(Sf.shape)
+        expected = fss_SAT._fss_score_masked(Sf, So, C)
+        assert fss_SAT._fss_score_masked(Sf, So, C, ws) == expected
+        weights = fss_SAT._masked_weights(C, ws)
+        assert fss_SAT._fss_score_masked(Sf, So, None, ws, weights) == expected
+
+    def test_workspace_per_thread_and_shape(self):
+        ws = fss_SAT.workspace((4, 5))
+        assert fss_SAT.workspace((4, 5)) is ws
+        others = []
+        thread = threading.Thread(target=lambda: others.append(fss_SAT.workspace((4, 5))))
+        thread.start()
+        thread.join()
+        assert others[0] is not ws
+        assert fss_SAT.workspace((6, 5)).shape == (6, 5)
+
+    @pytest.mark.benchmark
+    def test_workspace_allocations(self, record_property):
+        """Allocation benchmark of the missing-data score stage, 10 thresholds
+        x 12 windows on a 600x325 grid: per-call temporaries vs. the
+        workspace, measured with tracemalloc and recorded as test properties."""
+        import tracemalloc
+        rng = np.random.default_rng(0)
+        shape = (600, 325)
+        mask = np.ones(shape, dtype=bool)
+        mask[:200, :150] = False
+        tables = fss_SAT.compute_integral_table((rng.random((20,) + shape) > 0.7) & mask)
+        invalid = fss_SAT.compute_integral_table(~mask)
+        windows = [10, 20, 30, 40, 60, 80, 100, 120, 140, 160, 180, 200]
+
+        def run(ws):
+            """Scores, seconds and the bytes allocated on top of the box sums
+            by each window's weights and each score (sum of their peaks)."""
+            scores, seconds, allocated = [], 0., 0
+            for window, boxes, inv_box in zip(windows, fss_SAT.integral_filter_multi(tables, windows),
+                                              fss_SAT.integral_filter_multi(invalid, windows)):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter()
+                C = fss_SAT._valid_counts(inv_box, window // 2, out=None if ws is None else ws.valid)
+                weights = None if ws is None else fss_SAT._masked_weights(C, ws)
+                for Sf, So in zip(boxes[0::2], boxes[1::2]):
+                    scores.append(fss_SAT._fss_score_masked(Sf, So, C, ws, weights))
+                seconds += time.perf_counter() - start
+                allocated += tracemalloc.get_traced_memory()[1] - base
+                del C, weights
+            return scores, seconds, allocated
+
+        stats = {}
+        tracemalloc.start()
+        try:
+            stats["temporaries"] = run(None)
+            stats["workspace"] = run(fss_SAT.MaskedWorkspace(shape))
+        finally:
+            tracemalloc.stop()
+        for name, (_, seconds, allocated) in stats.items():
+            record_property(f"{name}_ms", 1e3 * seconds)
+            record_property(f"{name}_MiB", allocated / 2**20)
+        assert stats["workspace"][0] == stats["temporaries"][0]
+        assert stats["workspace"][2] < stats["temporaries"][2]
+
 
 class TestBuildBinarySatMasked:
     """_build_binary_sat_masked — NaN points must be zeroed out of the sums."""
@@ -470,6 +771,65 @@ class TestBuildBinarySatMasked:
         np.testing.assert_array_equal(mod_bin, expected_mod)
 
 
+class TestValidCrop:
+    """Scoring only the bounding box of the valid points (plus half the
+    largest window) must reproduce the whole-grid missing-data path."""
+
+    windows = np.array([1, 3, 11, 21])
+    thresholds = [0.1, 1.0, 5.0]
+
+    @staticmethod
+    def _framed(small_fields):
+        obs, fcst = small_fields
+        obs = obs.copy()
+        obs[:15] = np.nan                 # only a blob inside the grid is valid
+        obs[:, :20] = np.nan
+        obs[:, -8:] = np.nan
+        obs[40:44, 30:33] = np.nan
+        return obs, fcst
+
+    def _full_grid(self, fcst, obs):
+        mask = fss_SAT._validity_mask(fcst, obs)
+        obs_b = fss_SAT._binary_stack(obs, self.thresholds, None, "over", None) & mask
+        mod_b = fss_SAT._binary_stack(fcst, self.thresholds, None, "over", None) & mask
+        return fss_SAT._fss_windows(fss_SAT.compute_integral_table(mod_b),
+                                    fss_SAT.compute_integral_table(obs_b), self.windows,
+                                    invalid_cache=fss_SAT._invalid_sat(mask))
+
+    def test_bounds(self):
+        mask = np.zeros((20, 30), dtype=bool)
+        mask[5:8, 10:12] = True
+        assert fss_SAT._valid_crop(mask, 2) == (slice(3, 10), slice(8, 14))
+        assert fss_SAT._valid_crop(mask, 10) == (slice(0, 18), slice(0, 22))
+        assert fss_SAT._valid_crop(np.zeros((4, 4), dtype=bool), 1) == np.s_[:, :]
+
+    @pytest.mark.parametrize("cached", [False, True])
+    @pytest.mark.parametrize("engine", ["batched", "threshold"])
+    def test_matches_full_grid(self, small_fields, cached, engine):
+        obs, fcst = self._framed(small_fields)
+        cache = fss_SAT.ObsFSSCache(obs) if cached else None
+        got = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows,
+                                          engine=engine, obs_cache=cache)
+        for ref, res in zip(self._full_grid(fcst, obs), got):
+            np.testing.assert_allclose(res, ref, rtol=1e-13, atol=0)
+
+    @pytest.mark.parametrize("cached", [False, True])
+    def test_eps_matches_full_grid(self, small_fields, cached):
+        obs, fcst = self._framed(small_fields)
+        ens = np.stack([fcst, np.roll(fcst, 2, axis=1)])
+        cache = fss_SAT.ObsFSSCache(obs) if cached else None
+        got = fss_SAT.fss_cumsum_parallel(ens, obs, self.thresholds, self.windows, eps=True,
+                                          obs_cache=cache)
+        mask = ~np.isnan(obs)
+        p_f = np.stack([np.where(mask, (ens > t).mean(axis=0), 0.0) for t in self.thresholds])
+        obs_b = fss_SAT._binary_stack(obs, self.thresholds, None, "over", None) & mask
+        ref = fss_SAT._fss_windows(fss_SAT.compute_integral_table(p_f),
+                                   fss_SAT.compute_integral_table(obs_b), self.windows,
+                                   invalid_cache=fss_SAT._invalid_sat(mask))
+        for r, res in zip(ref, got):
+            np.testing.assert_allclose(res, r, rtol=1e-13, atol=0)
+
+
 class TestFssThresholdMissingData:
     """fss_threshold deterministic path with NaN in the inputs."""
 
@@ -514,6 +874,62 @@ class TestFssThresholdMissingData:
             assert np.isnan(val) or 0.0 <= val <= 1.0
 
 
+class TestMemberExceedance:
+    """Shared member counts must equal the per-threshold comparisons."""
+
+    def _ensemble(self, nan=False):
+        rng = np.random.default_rng(5)
+        ens = rng.gamma(0.5, 4., (7, 30, 40))
+        ens[:, :5, :5] = 0.                        # ties at a threshold
+        if nan:
+            ens[2, 10:20, 10:20] = np.nan
+            ens[:, :3, -3:] = np.nan               # no valid member
+        return ens
+
+    @pytest.mark.parametrize("nan", [False, True])
+    @pytest.mark.parametrize("mode", ["over", "under", "between", "tolerance"])
+    def test_counts_match_comparisons(self, nan, mode):
+        ens = self._ensemble(nan)
+        exceedance = fss_SAT.MemberExceedance(ens)
+        for t1, t2 in [(0., 1.), (0.5, 4.), (2., 2.), (7.5, 1.), (100., 200.)]:
+            ref = np.count_nonzero(fss_SAT._binary_stack(ens, [t1], [t2], mode, 0.2), axis=0)
+            got = exceedance.counts(t1, t2, mode, 0.2)
+            np.testing.assert_array_equal(got, ref)
+
+    def test_prepare_once(self):
+        ens = self._ensemble()
+        exceedance = fss_SAT.MemberExceedance(ens)
+        exceedance.prepare([0.1, 1., 5.])
+        assert set(exceedance._over) == {0.1, 1., 5.}
+        first = exceedance.over(1.)
+        exceedance.prepare([1., 2.])
+        assert exceedance.over(1.) is first
+        np.testing.assert_array_equal(exceedance.over(np.nan), 0)
+
+    @pytest.mark.parametrize("nan", [False, True])
+    def test_percentile_thresholds(self, nan):
+        ens = self._ensemble(nan)
+        exceedance = fss_SAT.MemberExceedance(ens)
+        t1f, t2f = exceedance.thresholds(90, None, True)
+        assert t1f == (np.nanpercentile(ens, 90) if nan else np.percentile(ens, 90))
+        assert t2f is None
+        assert exceedance.thresholds(2., None, False) == (2., None)
+
+    @pytest.mark.parametrize("nan", [False, True])
+    @pytest.mark.parametrize("percentiles", [False, True])
+    def test_shared_across_thresholds(self, small_fields, nan, percentiles):
+        obs, fcst = small_fields
+        ens = fcst * np.linspace(0.5, 1.5, 5)[:, None, None]
+        if nan:
+            ens[1, :4, :4] = np.nan
+        thresholds = [25., 50., 90.] if percentiles else [0.1, 1., 5.]
+        windows = np.array([3, 7])
+        got = fss_SAT.fss_cumsum_parallel(ens, obs, thresholds, windows, percentiles=percentiles, eps=True)
+        for ii, t in enumerate(thresholds):
+            ref = fss_SAT.fss_threshold_eps(ens, obs, t, None, windows, percentiles=percentiles)
+            np.testing.assert_array_equal(got[:, ii], np.array(ref))
+
+
 class TestFssThresholdEpsMissingData:
     """fss_threshold_eps (ensemble) path — NaN members used to raise."""
 
@@ -541,6 +957,19 @@ class TestFssThresholdEpsMissingData:
         for val in fss_vals:
             assert val == pytest.approx(1.0) or np.isnan(val)
 
+    def test_clean_matches_float_mean_tables(self, small_fields):
+        """The clean path integrates exact member counts; it agrees with the
+        former tables of float member means up to their rounding."""
+        obs, fcst = small_fields
+        ens = np.stack([fcst, np.roll(fcst, 3, axis=0), np.roll(fcst, -2, axis=1)])
+        windows = np.array([3, 5, 11, 21])
+        got = fss_SAT.fss_threshold_eps(ens, obs, 1.0, None, windows)
+        mod_bin = fss_SAT.compute_integral_table(np.mean(ens > 1.0, axis=0))
+        obs_bin = fss_SAT.compute_integral_table(obs > 1.0)
+        ref = fss_SAT._fss_windows(mod_bin, obs_bin, windows)
+        for got_v, ref_v in zip(got[:3], ref):
+            np.testing.assert_allclose(got_v, ref_v, rtol=1e-9)
+
     def test_clean_ensemble_still_works(self, small_fields):
         obs, fcst = small_fields
         ens = self._stack(fcst, 4)
@@ -550,6 +979,53 @@ class TestFssThresholdEpsMissingData:
             assert np.isnan(val) or 0.0 <= val <= 1.0
 
 
+class TestCWFSSObservation:
+    """Two-phase CWFSS: one observation set-up, many forecasts."""
+
+    kwargs = dict(nsamples=120, threshold_limiting="relative", window_limits=[3, 30])
+
+    def _forecasts(self, obs, fcst):
+        gap = fcst.copy()
+        gap[-8:, -8:] = np.nan
+        return [obs.copy(), fcst, np.roll(fcst, 2, axis=0), gap]
+
+    @pytest.mark.parametrize("with_gap", [False, True])
+    @pytest.mark.parametrize("n_jobs", [1, 2])
+    def test_matches_single_forecast(self, small_fields, with_gap, n_jobs):
+        obs, fcst = small_fields
+        if with_gap:
+            obs = obs.copy()
+            obs[:10, :10] = np.nan
+        fcsts = self._forecasts(obs, fcst)
+        reference = fss_SAT.CWFSSObservation(obs, **self.kwargs)
+        results = reference.evaluate(fcsts, n_jobs=n_jobs)
+        assert len(results) == len(fcsts)
+        for got, f in zip(results, fcsts):
+            ref = fss_SAT.CWFSS(f, obs, **self.kwargs)
+            np.testing.assert_array_equal(got.values, ref.values)
+            np.testing.assert_array_equal(got.windows, ref.windows)
+            assert got.cwfss == ref.cwfss
+
+    def test_observation_tables_built_once(self, small_fields):
+        obs, fcst = small_fields
+        reference = fss_SAT.CWFSSObservation(obs, **self.kwargs)
+        reference.evaluate([fcst, np.roll(fcst, 3, axis=1), obs.copy()])
+        assert reference.sat_builds == len(reference.groups) < reference.nsamples
+
+    def test_box_budget_chunks(self, small_fields, monkeypatch):
+        obs, fcst = small_fields
+        ref = fss_SAT.CWFSSObservation(obs, **self.kwargs).evaluate([fcst])[0]
+        monkeypatch.setattr(fss_SAT, "CWFSS_BOX_BYTES", 1)
+        got = fss_SAT.CWFSSObservation(obs, **self.kwargs).evaluate([fcst])[0]
+        np.testing.assert_array_equal(got.values, ref.values)
+
+    def test_bootstrap_on_results(self, small_fields):
+        obs, fcst = small_fields
+        cwfss = fss_SAT.CWFSSObservation(obs, **self.kwargs).evaluate([fcst])[0]
+        cwfss.bootstrap(N=50, rng=0)
+        assert cwfss.bootstrap_info.shape == (50,)
+
+
 class TestCWFSSMissingData:
     """CWFSS with NaN observations (e.g. OPERA coverage gaps)."""
 
@@ -586,3 +1062,195 @@ class TestCWFSSMissingData:
                                window_limits=[3, 30])
         assert np.isfinite(cwfss.tmin) and np.isfinite(cwfss.tmax)
         assert np.isfinite(cwfss.cwfss)
+
+
+class TestFssThresholdBatch:
+    """Batched multi-threshold engine must match the per-threshold engine."""
+
+    windows = np.array([3, 5, 11, 21])
+    thresholds = [0.1, 1.0, 5.0, 10.0, 40.0]
+
+    def _both(self, fcst, obs, **kwargs):
+        batched = fss_SAT.fss_cumsum_parallel(
+            fcst, obs, self.thresholds, self.windows, engine="batched", **kwargs)
+        single = fss_SAT.fss_cumsum_parallel(
+            fcst, obs, self.thresholds, self.windows, engine="threshold", **kwargs)
+        return batched, single
+
+    @pytest.mark.parametrize("mode", ["over", "under", "between", "tolerance"])
+    def test_matches_per_threshold(self, small_fields, mode):
+        obs, fcst = small_fields
+        batched, single = self._both(fcst, obs, threshold_mode=mode)
+        assert batched.shape == (4, len(self.thresholds), self.windows.size)
+        np.testing.assert_array_equal(batched, single)
+
+    def test_percentiles_match(self, small_fields):
+        obs, fcst = small_fields
+        batched, single = self._both(fcst, obs, percentiles=True)
+        np.testing.assert_array_equal(batched, single)
+
+    @pytest.mark.parametrize("percentiles", [False, True])
+    def test_missing_data_matches(self, small_fields, percentiles):
+        obs, fcst = small_fields
+        obs = obs.copy()
+        obs[:8, :12] = np.nan
+        fcst = fcst.copy()
+        fcst[40:44, 30:50] = np.nan
+        batched, single = self._both(fcst, obs, percentiles=percentiles)
+        np.testing.assert_array_equal(batched, single)
+
+    def test_chunked_jobs_match(self, small_fields):
+        obs, fcst = small_fields
+        serial = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows)
+        chunked = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows, n_jobs=2)
+        np.testing.assert_array_equal(serial, chunked)
+
+    def test_frames_match(self, small_fields):
+        obs, fcst = small_fields
+        windows = [(w, w) for w in self.windows]
+        for df_b, df_t in zip(
+                fss_SAT.fss_cumsum_frame(fcst, obs, windows, self.thresholds),
+                fss_SAT.fss_cumsum_frame(fcst, obs, windows, self.thresholds, engine="threshold")):
+            pd.testing.assert_frame_equal(df_b, df_t)
+
+
+class TestObsFSSCache:
+    """ObsFSSCache lookups must reproduce the uncached results exactly."""
+
+    windows = np.array([3, 5, 11, 21])
+    thresholds = [0.1, 1.0, 5.0, 10.0]
+
+    @staticmethod
+    def _gap(field, sl):
+        out = field.copy()
+        out[sl] = np.nan
+        return out
+
+    @pytest.mark.parametrize("mode", ["over", "under", "between", "tolerance"])
+    @pytest.mark.parametrize("percentiles", [False, True])
+    @pytest.mark.parametrize("engine", ["batched", "threshold"])
+    def test_matches_uncached(self, small_fields, mode, percentiles, engine):
+        if mode == "between" and percentiles:
+            pytest.skip("between mode prepends -1, which is not a valid percentile")
+        obs, fcst = small_fields
+        cache = fss_SAT.ObsFSSCache(obs)
+        kwargs = dict(percentiles=percentiles, threshold_mode=mode, engine=engine)
+        ref = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows, **kwargs)
+        for _ in range(2):   # second pass is served from the cache
+            got = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows,
+                                              obs_cache=cache, **kwargs)
+            np.testing.assert_array_equal(got, ref)
+        assert cache.hits > 0
+
+    @pytest.mark.parametrize("percentiles", [False, True])
+    def test_masked_matches_uncached(self, small_fields, percentiles):
+        obs, fcst = small_fields
+        obs = self._gap(obs, np.s_[:10, :10])
+        cache = fss_SAT.ObsFSSCache(obs)
+        for model in (fcst, self._gap(fcst, np.s_[30:40, 5:25])):   # two different masks
+            ref = fss_SAT.fss_cumsum_parallel(model, obs, self.thresholds, self.windows,
+                                              percentiles=percentiles)
+            got = fss_SAT.fss_cumsum_parallel(model, obs, self.thresholds, self.windows,
+                                              percentiles=percentiles, obs_cache=cache)
+            np.testing.assert_array_equal(got, ref)
+
+    @pytest.mark.parametrize("with_gap", [False, True])
+    def test_eps_matches_uncached(self, small_fields, with_gap):
+        obs, fcst = small_fields
+        if with_gap:
+            obs = self._gap(obs, np.s_[:10, :10])
+        ens = np.stack([fcst, np.roll(fcst, 3, axis=0), obs])
+        cache = fss_SAT.ObsFSSCache(obs)
+        ref = fss_SAT.fss_cumsum_parallel(ens, obs, self.thresholds, self.windows, eps=True)
+        got = fss_SAT.fss_cumsum_parallel(ens, obs, self.thresholds, self.windows, eps=True,
+                                          obs_cache=cache)
+        np.testing.assert_array_equal(got, ref)
+
+    def test_memory_budget(self, small_fields):
+        obs, fcst = small_fields
+        cache = fss_SAT.ObsFSSCache(obs, max_bytes=0)
+        ref = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows)
+        got = fss_SAT.fss_cumsum_parallel(fcst, obs, self.thresholds, self.windows, obs_cache=cache)
+        np.testing.assert_array_equal(got, ref)
+        assert cache.nbytes == 0
+
+    def test_concurrent_misses(self, small_fields):
+        obs, _ = small_fields
+        cache = fss_SAT.ObsFSSCache(obs)
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def build():
+            calls.append(1)
+            time.sleep(0.01)
+            return np.ones((64, 64))
+
+        def worker():
+            barrier.wait()
+            return cache.get(("key",), build, large=True)
+
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            values = list(pool.map(lambda _: worker(), range(8)))
+        assert len(calls) == 1
+        assert all(value is values[0] for value in values)
+        assert cache.nbytes == values[0].nbytes
+        assert (cache.hits, cache.misses) == (7, 1)
+
+    def test_failed_build_is_retried(self, small_fields):
+        obs, _ = small_fields
+        cache = fss_SAT.ObsFSSCache(obs)
+        attempts = []
+
+        def build():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise MemoryError("first build fails")
+            return np.ones(3)
+
+        with pytest.raises(MemoryError):
+            cache.get(("key",), build)
+        assert cache._pending == {}
+        np.testing.assert_array_equal(cache.get(("key",), build), np.ones(3))
+        assert len(attempts) == 2 and cache._pending == {}
+
+    def test_valid_weights_shared(self, small_fields):
+        obs, fcst = small_fields
+        obs = self._gap(obs, np.s_[:10, :10])
+        cache = fss_SAT.ObsFSSCache(obs)
+        models = [fcst, 2.0 * fcst, np.roll(fcst, 5, axis=1)]   # same mask, three "models"
+        for percentiles in (False, True):
+            for model in models:
+                fss_SAT.fss_cumsum_parallel(model, obs, self.thresholds, self.windows,
+                                            percentiles=percentiles, obs_cache=cache)
+        mask = fss_SAT._validity_mask(fcst, obs)
+        key = ('weights', fss_SAT._mask_key(mask))
+        assert {k for k in cache._store if k[0] == 'weights'} == {key + (n,) for n in self.windows}
+        assert len([k for k in cache._store if k[0] == 'invalid']) == 1
+        # the cached weights are those of the uncached path
+        invalid_hats = fss_SAT.integral_filter_multi(fss_SAT._invalid_sat(mask), self.windows)
+        for n, (inv, wsum) in zip(self.windows, cache.valid_weights(mask, self.windows)):
+            ref_inv, ref_wsum = fss_SAT._masked_weights(fss_SAT._valid_counts(next(invalid_hats), n // 2))
+            np.testing.assert_array_equal(inv, ref_inv)
+            assert wsum == ref_wsum
+
+    def test_cwfss_shares_valid_weights(self, small_fields):
+        obs, fcst = small_fields
+        obs = self._gap(obs, np.s_[:10, :10])
+        cache = fss_SAT.ObsFSSCache(obs)
+        sample_set = fss_SAT.CWFSSObservation(obs, nsamples=50, window_limits=[3, 30], obs_cache=cache)
+        sample_set.evaluate([fcst, 2.0 * fcst])
+        weights = [k for k in cache._store if k[0] == 'weights']
+        assert sorted(k[-1] for k in weights) == np.unique(sample_set.windows).tolist()
+
+    @pytest.mark.parametrize("with_gap", [False, True])
+    def test_cwfss_matches_uncached(self, small_fields, with_gap):
+        obs, fcst = small_fields
+        if with_gap:
+            obs = self._gap(obs, np.s_[:10, :10])
+        kwargs = dict(nsamples=50, threshold_limiting="relative", window_limits=[3, 30])
+        ref = fss_SAT.CWFSS(fcst, obs, **kwargs)
+        cache = fss_SAT.ObsFSSCache(obs)
+        for _ in range(2):
+            got = fss_SAT.CWFSS(fcst, obs, obs_cache=cache, **kwargs)
+            np.testing.assert_array_equal(got.values, ref.values)
+            assert got.cwfss == ref.cwfss
@@ -63,6 +63,27 @@ class TestGetWindows:
         assert result == custom
 
 
+# =====================================================================
+# get_field_dtype / as_field_dtype
+# =====================================================================
+
+class TestFieldDtype:
+
+    def test_default_float64(self):
+        assert parameter_settings.get_field_dtype(_args()) == np.float64
+
+    def test_float32(self):
+        args = _args(precision="float32")
+        field = parameter_settings.as_field_dtype(np.ones((3, 3)), args)
+        assert field.dtype == np.float32
+        same = np.ones((3, 3), dtype=np.float32)
+        assert parameter_settings.as_field_dtype(same, args) is same
+
+    def test_non_float_fields_unchanged(self):
+        mask = np.ones((3, 3), dtype=np.int8)
+        assert parameter_settings.as_field_dtype(mask, _args(precision="float32")) is mask
+
+
 # =====================================================================
 # get_cmap_and_levels
 # =====================================================================
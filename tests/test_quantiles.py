@@ -0,0 +1,96 @@
+"""Tests for quantiles.py — percentiles answered from a single cached sort."""
+
+import warnings
+
+import numpy as np
+import pytest
+
+import quantiles
+
+
+def _field(dtype=float, nan_fraction=0.0, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    field = (rng.gamma(0.5, 3.0, (n // 25, 25)) * 3).astype(dtype)
+    if nan_fraction:
+        field[rng.random(field.shape) < nan_fraction] = np.nan
+    return field
+
+
+class TestPercentileMatchesNumpy:
+    """Values and result types must be identical to np.(nan)percentile."""
+
+    @pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int64])
+    @pytest.mark.parametrize("q", [90., 90, 0, 100, 37.3, np.float64(37.3),
+                                   [25, 50, 75, 90, 95], np.arange(0, 101)])
+    @pytest.mark.parametrize("nan", [False, True])
+    def test_clean_field(self, dtype, q, nan):
+        field = _field(dtype)
+        func = np.nanpercentile if nan else np.percentile
+        ref = func(field, q)
+        got = quantiles.percentile(field, q, nan=nan)
+        np.testing.assert_array_equal(got, ref)
+        assert np.asarray(got).dtype == np.asarray(ref).dtype
+
+    @pytest.mark.parametrize("nan_fraction", [0.2, 1.0])
+    @pytest.mark.parametrize("nan", [False, True])
+    def test_field_with_nans(self, nan_fraction, nan):
+        field = _field(nan_fraction=nan_fraction)
+        func = np.nanpercentile if nan else np.percentile
+        for q in (90., [10., 50., 99.]):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN slice
+                ref = func(field, q)
+            np.testing.assert_array_equal(quantiles.percentile(field, q, nan=nan), ref)
+
+    def test_3d_field(self):
+        field = np.stack([_field(seed=s) for s in range(3)])
+        np.testing.assert_array_equal(quantiles.percentile(field, [5, 50, 95]),
+                                      np.percentile(field, [5, 50, 95]))
+
+    def test_out_of_range(self):
+        with pytest.raises(ValueError):
+            quantiles.percentile(_field(), 101)
+
+
+class TestFieldQuantilesCache:
+
+    def test_sorts_once(self, monkeypatch):
+        calls = []
+        sort = np.sort
+        monkeypatch.setattr(quantiles.np, "sort", lambda *a, **k: calls.append(1) or sort(*a, **k))
+        field = _field()
+        quantiles.percentile(field, [25, 50, 75, 90, 95])
+        quantiles.percentile(field, 90, nan=True)
+        quantiles.percentile(field, np.arange(0, 101))
+        assert len(calls) == 1
+
+    def test_keyed_by_array_identity(self):
+        field = _field()
+        assert quantiles.for_field(field) is quantiles.for_field(field)
+        masked = np.where(field > 1., np.nan, field)
+        assert quantiles.for_field(masked) is not quantiles.for_field(field)
+        assert np.isnan(quantiles.percentile(masked, 50))
+
+    def test_entry_removed_with_field(self):
+        field = _field()
+        key = id(field)
+        quantiles.percentile(field, 50)
+        assert key in quantiles._registry
+        del field
+        assert key not in quantiles._registry
+
+    def test_memory_budget_keeps_values(self, monkeypatch):
+        monkeypatch.setattr(quantiles, "MAX_SORTED_BYTES", 0)
+        first, second = _field(seed=1), _field(seed=2)
+        fq = quantiles.for_field(first)
+        p90 = fq.percentile(90)
+        quantiles.percentile(second, 90)
+        assert fq._sorted is None            # dropped for the newer field
+        assert fq.percentile(90) == p90       # memoized
+        assert fq.percentile(10) == np.percentile(first, 10)   # sorts again
+
+    def test_searchsorted_counts_values(self):
+        field = _field()
+        fq = quantiles.for_field(field)
+        t = np.array([-1., 0.5, 1., 10.])
+        np.testing.assert_array_equal(fq.searchsorted(t), [np.count_nonzero(field <= v) for v in t])
@@ -65,6 +65,16 @@ class TestAddRankRobustnessInfo:
             assert 0 <= sim["cwfss_robust"] <= 1
 
 
+    def test_bootstrap_seed_reproducible(self, scored_data):
+        data_list, args = scored_data
+        args.bootstrap_seed = 11
+        ranking_check.add_rank_robustness_info(data_list, args)
+        first = [sim["cwfss"].bootstrap_info.copy() for sim in data_list[1:]]
+        ranking_check.add_rank_robustness_info(data_list, args)
+        for sim, info in zip(data_list[1:], first):
+            np.testing.assert_array_equal(sim["cwfss"].bootstrap_info, info)
+
+
 class TestExtractCwfssArray:
 
     @pytest.fixture
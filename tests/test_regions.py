@@ -95,3 +95,9 @@ class TestRegion:
         valid = result[~np.isnan(result)]
         if len(valid) > 0:
             np.testing.assert_allclose(valid, 42.0, atol=0.5)
+
+    def test_resample_keeps_float32(self, test_region):
+        lon, lat = np.meshgrid(np.linspace(6.0, 21.0, 200), np.linspace(43.0, 52.0, 200))
+        data = np.full(lon.shape, 3.5, dtype=np.float32)
+        result, _, _ = test_region.resample_to_subdomain(data, lon, lat, "Default")
+        assert result.dtype == np.float32
@@ -0,0 +1,64 @@
+"""Tests for score_pool.py — thread and process scoring backends."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from multiprocessing import shared_memory
+
+import score_pool
+
+
+def _data_list(make_sim_dict, obs_field, model_fields):
+    return [make_sim_dict(obs_field, "OBS", "obs", color="C0")] + \
+           [make_sim_dict(field, f"M{i}", color=f"C{i}") for i, field in enumerate(model_fields, start=1)]
+
+
+def _assert_same_scores(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        if isinstance(a[key], (pd.DataFrame, pd.Series)):
+            pd.testing.assert_frame_equal(pd.DataFrame(a[key]), pd.DataFrame(b[key]))
+        elif isinstance(a[key], np.ndarray):
+            np.testing.assert_array_equal(a[key], b[key])
+        elif isinstance(a[key], float) and np.isnan(a[key]):
+            assert np.isnan(b[key])
+        else:
+            assert a[key] == b[key], key
+
+
+class TestSharedFields:
+
+    def test_round_trip_and_unlink(self, small_fields):
+        obs, fcst = small_fields
+        with score_pool.SharedFields([obs, fcst.astype(np.float32)]) as shared:
+            blocks, views = score_pool.attach(shared.specs)
+            np.testing.assert_array_equal(views[0], obs)
+            assert views[1].dtype == np.float32
+            assert not views[0].flags.writeable
+            names = [name for name, _, _ in shared.specs]
+            del views
+            for shm in blocks:
+                shm.close()
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+
+class TestCalcAllScores:
+
+    def test_processes_match_threads(self, small_fields, make_test_args, make_sim_dict):
+        obs, fcst = small_fields
+        gap = fcst.copy()
+        gap[:5, :5] = np.nan
+        models = [fcst, np.roll(fcst, 3, axis=0), gap]
+        threaded, pooled = _data_list(make_sim_dict, obs, models), _data_list(make_sim_dict, obs, models)
+        score_pool.calc_all_scores(threaded, make_test_args(score_backend="threads"))
+        score_pool.calc_all_scores(pooled, make_test_args(score_backend="processes", threads=2))
+        for a, b in zip(threaded, pooled):
+            _assert_same_scores(a, b)
+            assert b["precip_data_resampled"].flags.writeable
+
+    def test_unknown_backend(self, small_fields, make_test_args, make_sim_dict):
+        obs, fcst = small_fields
+        with pytest.raises(ValueError):
+            score_pool.calc_all_scores(_data_list(make_sim_dict, obs, [fcst]), make_test_args(score_backend="mpi"))
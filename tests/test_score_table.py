@@ -0,0 +1,91 @@
+"""Tests for score_table.py — columnar scores and vectorised ranks."""
+
+import numpy as np
+import pytest
+
+import score_table
+import scoring
+
+
+def _sims(rng, n=12):
+    # coarse values, so that ties are frequent
+    sims = [{"name": "OBS", "mae": 999, "bias": 999, "rms": 999, "corr": -999, "d90": 9999.,
+             "fss_condensed": -999, "fss_condensed_weighted": -999}]
+    for ii in range(n):
+        sims.append({
+            "name": f"M{ii}",
+            "mae": float(rng.choice([0.5, 1.0, 1.5])),
+            "bias": float(rng.choice([-0.2, 0.0, 0.2, 0.4])),
+            "rms": float(rng.uniform(1, 2)),
+            "corr": float(rng.choice([0.3, 0.6, 0.9])),
+            "d90": float(rng.choice([10., 20., 9999.])),
+            "fss_condensed": float(rng.choice([3.0, 4.5, 6.0])),
+            "fss_condensed_weighted": float(rng.uniform(0, 10)),
+        })
+    return sims
+
+
+def _sorted_ranks(data_list, metric):
+    """The ranks of the former sorted()-based rank_scores."""
+    if metric == 'bias':
+        ordered = sorted(data_list, key=lambda k: np.abs(k[metric]))
+    elif score_table.RANK_ORDER[metric] == 'desc':
+        ordered = sorted(data_list, key=lambda k: -k[metric])
+    else:
+        ordered = sorted(data_list, key=lambda k: k[metric])
+    ranks = {}
+    for rank, sim in enumerate(ordered, start=1):
+        ranks[sim['name']] = rank
+    return [ranks[sim['name']] for sim in data_list]
+
+
+class TestOrdinalRanks:
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_matches_sorted(self, seed):
+        sims = _sims(np.random.default_rng(seed))
+        table = score_table.ScoreTable(sims).rank(scoring.RANKED_METRICS)
+        for metric in scoring.RANKED_METRICS:
+            np.testing.assert_array_equal(table.values('rank_' + metric), _sorted_ranks(sims, metric))
+
+    def test_nan_last(self):
+        ranks = score_table.ordinal_ranks([0.5, np.nan, 0.2, 0.5], "desc")
+        np.testing.assert_array_equal(ranks, [1, 4, 3, 2])
+
+
+class TestScoreTable:
+
+    def test_columns_and_presence(self):
+        sims = [{"name": "a", "mae": 1.5, "corr": None}, {"name": "b", "mae": 2, "corr": 0.5},
+                {"name": "c", "mae": 3}]
+        table = score_table.ScoreTable(sims)
+        assert "mae" in table and "corr" in table and "d90" not in table
+        np.testing.assert_array_equal(table.values("mae"), [1.5, 2.0, 3.0])
+        np.testing.assert_array_equal(table.has("corr"), [False, True, False])
+        assert table.complete("mae") and not table.complete("corr")
+        assert table.complete("corr", sims[1:2])
+        assert not table.complete("d90")
+        np.testing.assert_array_equal(table.values("d90"), [np.nan] * 3)
+
+    def test_integer_columns(self):
+        sims = [{"name": "a", "rank_mae": 2}, {"name": "b", "rank_mae": 1}]
+        table = score_table.ScoreTable(sims, columns=["rank_mae"])
+        assert table.values("rank_mae").dtype.kind == "i"
+
+    def test_rows_follow_the_dicts(self):
+        sims = _sims(np.random.default_rng(3), n=5)
+        table = score_table.ScoreTable(sims)
+        shuffled = sims[::-1]
+        np.testing.assert_array_equal(table.values("mae", shuffled), [sim["mae"] for sim in shuffled])
+        sims[2]["cwfss_robust"] = 0.7
+        table.add("cwfss_robust", sims)
+        assert table.has("cwfss_robust", shuffled).sum() == 1
+
+    def test_publish(self):
+        sims = _sims(np.random.default_rng(4), n=4)
+        columns = ['rank_' + metric for metric in scoring.RANKED_METRICS]
+        score_table.ScoreTable(sims).rank(scoring.RANKED_METRICS).publish(sims, columns)
+        for metric in scoring.RANKED_METRICS:
+            ranks = [sim['rank_' + metric] for sim in sims]
+            assert ranks == _sorted_ranks(sims, metric)
+            assert all(type(rank) is int for rank in ranks)
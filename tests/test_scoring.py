@@ -6,6 +6,7 @@ import numpy as np
 import pandas as pd
 import pytest
 
+import fss_SAT
 import scoring
 import parameter_settings
 
@@ -98,6 +99,52 @@ class TestRankArray:
         assert ranks[0] == ranks[1]  # tied
 
 
+class TestRankCube:
+    """rank_cube / cube_minus_avg must match rank_array / array_minus_avg cell by cell."""
+
+    @staticmethod
+    def _cube(n_models, seed):
+        rng = np.random.default_rng(seed)
+        # coarse values, so that ties are frequent
+        fss = rng.choice([0.2, 0.45, 0.5, 0.6, 0.7, 0.7, 0.8, 0.9, 0.95, 1.0], size=(n_models, 6, 5))
+        fss[rng.random(fss.shape) < 0.1] = np.nan
+        fss[:, 0, 0] = np.nan                 # a cell without any valid value
+        fss[:, 1, 1] = 1.0                    # a cell of perfect scores only
+        fss[:, 2, 2] = 0.7                    # a cell of ties only
+        return fss, np.array([0.5, 0.5, 0.45, 0.6, np.nan, 0.5])
+
+    @pytest.mark.parametrize("n_models", [1, 2, 5, 9, 17])
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_matches_rank_array(self, n_models, seed):
+        fss, t = self._cube(n_models, seed)
+        ranks = scoring.rank_cube(fss, t)
+        assert ranks.shape == fss.shape
+        for ii in range(fss.shape[1]):
+            for jj in range(fss.shape[2]):
+                np.testing.assert_array_equal(ranks[:, ii, jj], scoring.rank_array(fss[:, ii, jj], t[ii]))
+
+    @pytest.mark.filterwarnings("ignore:Mean of empty slice")
+    @pytest.mark.parametrize("n_models", [1, 5, 9, 17])
+    def test_matches_array_minus_avg(self, n_models):
+        fss, t = self._cube(n_models, 3)
+        fss = fss + np.random.default_rng(4).uniform(-0.01, 0.0, fss.shape)   # not exactly representable
+        rel = scoring.cube_minus_avg(fss, t)
+        for ii in range(fss.shape[1]):
+            for jj in range(fss.shape[2]):
+                expected = scoring.array_minus_avg(fss[:, ii, jj], t[ii])
+                np.testing.assert_array_equal(rel[:, ii, jj], expected)
+
+    @pytest.mark.filterwarnings("error")
+    def test_empty_cells_do_not_warn(self):
+        fss, t = self._cube(5, 0)
+        rel = scoring.cube_minus_avg(fss, t)
+        assert (rel[:, 0, 0] == 10.).all()
+
+    def test_example(self):
+        fss = np.array([0.9, 1.0, np.nan, 0.3, 0.9, 0.7, 1.0])[:, None, None]
+        np.testing.assert_array_equal(scoring.rank_cube(fss, [0.5])[:, 0, 0], [4, 2, 0, 1, 4, 6, 2])
+
+
 # =====================================================================
 # prep_windows
 # =====================================================================
@@ -154,6 +201,70 @@ class TestFssCondensed:
         assert score == 0.0
 
 
+class TestWeightedFssCondensed:
+    """The broadcast condensed scores against the per-cell loops they replace."""
+
+    levels = [0.1, 0.5, 1., 2., 5., 10., 20., 50., 100.]
+
+    def _sim(self, seed):
+        rng = np.random.default_rng(seed)
+        fss = rng.uniform(0, 1, (len(self.levels), 6))
+        fss[rng.random(fss.shape) < 0.2] = np.nan
+        thresholds = [0.5] * len(self.levels)
+        thresholds[2] = 1.
+        windows = scoring.prep_windows([10, 20, 40, 80, 160, 200], 'same', 300, 300)
+        return {'name': 'M0', 'fss': pd.DataFrame(fss), 'fss_thresholds': thresholds,
+                'fssf': pd.DataFrame(np.vstack([fss, np.zeros((3, 6))])), 'fss_windows': windows}
+
+    def _cells(self, sim, obs_field=None):
+        """Points and weights of every scored cell, in loop order."""
+        wins = np.asarray([np.max(w) for w in sim['fss_windows']], dtype=float)
+        cell_area = np.outer(scoring.voronoi_widths_1d(self.levels), scoring.voronoi_widths_1d(wins))
+        max_l, max_w = np.max(self.levels), wins.max()
+        for ii, t in enumerate(sim['fss_thresholds']):
+            if obs_field is not None and (obs_field > self.levels[ii]).sum() == 0:
+                continue
+            for jj, w in enumerate(wins):
+                a = sim['fss'].values[ii, jj]
+                a = float(a == 1.) if t == 1. else min(max(2. * (a - 1) + 1, 0.), 1.)
+                if not np.isnan(a):
+                    fac = (max_l + self.levels[ii]) / max_l * (2. * max_w / (max_w + w))
+                    yield a, fac, cell_area[ii, jj]
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_weighted_matches_loop(self, seed):
+        sim = self._sim(seed)
+        score, score_arr = scoring.weighted_fss_condensed(sim, self.levels)
+        assert score == pytest.approx(sum(a * fac for a, fac, _ in self._cells(sim)), rel=1e-14)
+        assert score_arr.shape == sim['fssf'].shape
+        assert not score_arr[len(self.levels):].any()
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_rect_matches_loop(self, seed):
+        sim = self._sim(seed)
+        obs_field = np.random.default_rng(seed).uniform(0, 30, (20, 20))   # 50 and 100 are skipped
+        cwfss, _ = scoring.weighted_fss_condensed_rect(sim, {'precip_data_resampled': obs_field}, self.levels)
+        cells = list(self._cells(sim, obs_field))
+        expected = sum(a * fac * area for a, fac, area in cells) / sum(fac * area for _, fac, area in cells)
+        assert cwfss == pytest.approx(expected, rel=1e-14)
+
+    def test_shared_rescaling_and_obs_counts(self):
+        obs_field = np.random.default_rng(5).uniform(0, 30, (20, 20))
+        obs = {'precip_data_resampled': obs_field}
+        cache = fss_SAT.ObsFSSCache(obs_field)
+        for seed in (0, 1):
+            sim = self._sim(seed)
+            rescaled = scoring.rescaled_fss(sim)
+            assert scoring.fss_condensed(sim, rescaled)[0] == scoring.fss_condensed(sim)[0]
+            assert (scoring.weighted_fss_condensed(sim, self.levels, rescaled)[0]
+                    == scoring.weighted_fss_condensed(sim, self.levels)[0])
+            cached = scoring.weighted_fss_condensed_rect(sim, obs, self.levels, rescaled, obs_cache=cache)
+            uncached = scoring.weighted_fss_condensed_rect(sim, obs, self.levels)
+            assert cached[0] == uncached[0]
+            np.testing.assert_array_equal(cached[1], uncached[1])
+        assert cache.hits == 1   # the second model reuses the exceedance counts
+
+
 # =====================================================================
 # calc_scores
 # =====================================================================
@@ -206,6 +317,23 @@ class TestCalcScores:
         assert sim["bias_real"] == 0.0
 
 
+    def test_obs_cache_gives_identical_scores(self, make_test_args, small_fields):
+        import fss_SAT
+        args = make_test_args()
+        obs_f, fcst_f = small_fields
+        obs = self._make_sim_dict(obs_f, entry_type="obs")
+        scoring.calc_scores(obs, obs, args)
+        cache = fss_SAT.ObsFSSCache(obs["precip_data_resampled"])
+        for field in (fcst_f, np.roll(obs_f, 4, axis=0)):
+            ref = scoring.calc_scores(self._make_sim_dict(field), obs, args)
+            got = scoring.calc_scores(self._make_sim_dict(field), obs, args, obs_cache=cache)
+            for key in ("fss", "fssp", "fss_overestimated"):
+                pd.testing.assert_frame_equal(got[key], ref[key])
+            for key in ("d90", "fss_condensed", "fss_condensed_weighted"):
+                assert got[key] == ref[key]
+        assert cache.hits > 0
+
+
 # =====================================================================
 # rank_scores
 # =====================================================================
@@ -322,6 +450,70 @@ class TestFssD90:
         assert np.isfinite(clean) and np.isfinite(gapped)
         assert gapped == pytest.approx(clean, rel=0.05)
 
+    # --- lazy bisection search ---------------------------------------------
+
+    def test_bisection_matches_exhaustive_scan(self, make_test_args):
+        """The bracketing/bisection finds the same neighbouring windows as
+        scanning every window size, with fewer FSS evaluations."""
+        args = make_test_args()
+        obs = self._gauss(128, 128, 64, 64)
+        mod = self._gauss(128, 128, 64, 84)
+        rro = (obs >= np.percentile(obs, 90)).astype(int)
+        rrm = (mod >= np.percentile(mod, 90)).astype(int)
+        fss_at = fss_SAT.LazyFSS(np.maximum(rro - rrm, 0), np.maximum(rrm - rro, 0), 701)
+        scan = {w: fss_at(2 * w + 1) for w in range(1, 351)}   # windows 3 ... 701
+        hi = next(w for w, value in scan.items() if value >= 0.5)
+        t = (0.5 - scan[hi - 1]) / (scan[hi] - scan[hi - 1])
+        expected = 0.5 * (2 * hi - 1 + 2 * t)
+        lazy = fss_SAT.LazyFSS(np.maximum(rro - rrm, 0), np.maximum(rrm - rro, 0), 701)
+        assert scoring._d90_bisect(lazy, 701) == pytest.approx(expected, rel=1e-12)
+        assert len(lazy.scores) < len(scoring.D90_WINDOWS)
+        assert scoring.fss_d90(mod, obs, args) == pytest.approx(expected, rel=1e-12)
+
+    def test_bisect_never_reaching_half(self):
+        assert scoring._d90_bisect(lambda window: 0.1, 701) == 9999.
+
+    def test_bisect_non_monotonous(self):
+        assert scoring._d90_bisect(lambda window: 0.4 if window < 9 else 0.2, 701) == 9999.
+
+    def test_bisect_non_monotonous_midpoint(self):
+        """A dip at a bisection midpoint (window 25, between the bracket 17
+        and 33) is caught, not interpolated over."""
+        def fss_at(window):
+            return 0.05 if window == 25 else min(window / 66., 1.)
+        assert scoring._d90_bisect(fss_at, 701) == 9999.
+        assert scoring._d90_bisect(lambda window: min(window / 66., 1.), 701) == pytest.approx(16.5)
+
+    @pytest.mark.parametrize("mode, max_window", [("normal", 701), ("valid_adaptive", 64)])
+    def test_valid_adaptive_clips_max_window(self, make_test_args, monkeypatch, mode, max_window):
+        windows = []
+        monkeypatch.setattr(scoring, "_d90_bisect", lambda fss_at, window: windows.append(window))
+        obs = self._gauss(64, 96, 30, 30)
+        mod = self._gauss(64, 96, 50, 30)
+        scoring.fss_d90(mod, obs, make_test_args(mode=mode))
+        assert windows == [max_window]
+
+    def test_cached_observation_binary(self, make_test_args):
+        obs = self._gauss(128, 128, 64, 64)
+        mod = self._gauss(128, 128, 64, 84)
+        args = make_test_args()
+        cache = fss_SAT.ObsFSSCache(obs)
+        d90 = scoring.fss_d90(mod, obs, args, obs_cache=cache)
+        assert d90 == scoring.fss_d90(mod, obs, args)
+        (binary,) = [v for k, v in cache._store.items() if k[0] == 'd90_binary']
+        assert binary.dtype == bool
+        assert cache.nbytes == binary.nbytes
+        budget = fss_SAT.ObsFSSCache(obs, max_bytes=0)
+        assert scoring.fss_d90(mod, obs, args, obs_cache=budget) == d90
+        assert budget.nbytes == 0
+
+    def test_legacy_ladder(self, make_test_args):
+        obs = self._gauss(128, 128, 64, 64)
+        mod = self._gauss(128, 128, 64, 84)
+        exact = scoring.fss_d90(mod, obs, make_test_args())
+        legacy = scoring.fss_d90(mod, obs, make_test_args(fss_method="legacy"))
+        assert legacy == pytest.approx(exact, rel=0.2)
+
 
 # =====================================================================
 # calc_scores — NaN-aware point statistics
@@ -374,6 +566,87 @@ class TestCalcScoresMissingData:
         assert np.isnan(sim["bias_real"])
 
 
+class TestPointScores:
+    """point_scores scores all models in one chunked pass."""
+
+    def _reference(self, mod, obs):
+        valid = ~(np.isnan(mod) | np.isnan(obs))
+        if valid.sum() < 2:
+            return [np.nan] * 4
+        diff = mod[valid].astype(np.float64) - obs[valid]
+        return [diff.mean(), np.abs(diff).mean(), np.sqrt(np.square(diff).mean()),
+                np.corrcoef(mod[valid].astype(np.float64), obs[valid].astype(np.float64))[0, 1]]
+
+    @pytest.mark.parametrize("chunk_bytes", [scoring.POINT_CHUNK_BYTES, 4096])
+    @pytest.mark.parametrize("dtype", [np.float64, np.float32])
+    def test_matches_per_model(self, small_fields, chunk_bytes, dtype):
+        obs, fcst = small_fields
+        rng = np.random.default_rng(7)
+        obs = obs.astype(dtype)
+        obs[40:50, :] = np.nan
+        fields = []
+        for ii in range(4):
+            field = (fcst * rng.uniform(0.5, 1.5, fcst.shape)).astype(dtype)
+            field[rng.random(field.shape) < 0.1 * ii] = np.nan
+            fields.append(field)
+        fields.append(np.full_like(obs, np.nan))            # no valid pixels
+        scores = scoring.point_scores(fields, obs, chunk_bytes=chunk_bytes)
+        for ii, field in enumerate(fields):
+            got = [scores[key][ii] for key in ("bias", "mae", "rms", "corr")]
+            np.testing.assert_allclose(got, self._reference(field, obs), rtol=1e-10, atol=1e-12)
+            assert scores["n_valid"][ii] == (~(np.isnan(field) | np.isnan(obs))).sum()
+
+    def test_batch_matches_calc_scores(self, make_test_args, make_sim_dict, small_fields):
+        obs_field, fcst_field = small_fields
+        data_list = [make_sim_dict(obs_field, "OBS", "obs")] + \
+                    [make_sim_dict(fcst_field * (1 + 0.1 * ii), f"M{ii}") for ii in range(3)]
+        points = scoring.batch_point_scores(data_list)
+        assert points[0] is None
+        args = make_test_args()
+        for sim, sim_points in zip(data_list[1:], points[1:]):
+            got = scoring.calc_scores(dict(sim), data_list[0], args, points=sim_points)
+            bias, mae, rms, corr = self._reference(sim["precip_data_resampled"], obs_field)
+            np.testing.assert_allclose([got["bias_real"], got["bias"], got["mae"], got["rms"], got["corr"]],
+                                       [bias, abs(bias), mae, rms, corr], rtol=1e-12)
+
+    @pytest.mark.filterwarnings("ignore:invalid value encountered")
+    @pytest.mark.parametrize("seed", range(5))
+    def test_constant_and_dry_models(self, seed):
+        """Constant fields have no correlation, a dry one is NaN like
+        np.corrcoef; mostly dry fields agree with np.corrcoef too."""
+        obs = np.random.default_rng(seed).gamma(0.5, 2.0, (300, 400))
+        wet = np.zeros_like(obs)
+        wet[5, 5], wet[100, 7], wet[200, 300] = 3.0, 1.0, 0.5
+        fields = [np.zeros_like(obs), np.full_like(obs, 0.001), wet]
+        corr = scoring.point_scores(fields, obs)["corr"]
+        assert np.isnan(corr[0])
+        assert abs(corr[1]) < 1e-12
+        assert corr[2] == pytest.approx(self._reference(wet, obs)[3], rel=1e-12)
+
+
+class TestCalcScoresFloat32:
+    """--precision float32 scores stay close to the float64 ones."""
+
+    def test_scores_within_tolerance(self, make_test_args, make_sim_dict, small_fields):
+        obs_field, fcst_field = small_fields
+        rng = np.random.default_rng(4)
+        fcst_field = fcst_field * rng.uniform(0.5, 1.5, fcst_field.shape)
+        fcst_field[:6, :6] = np.nan
+        scores = {}
+        for dtype in (np.float64, np.float32):
+            args = make_test_args(precision=np.dtype(dtype).name)
+            obs = make_sim_dict(obs_field.astype(dtype), "OBS", "obs")
+            sim = make_sim_dict(fcst_field.astype(dtype), "M0")
+            scoring.calc_scores(obs, obs, args)
+            scores[dtype] = scoring.calc_scores(sim, obs, args)
+        single, double = scores[np.float32], scores[np.float64]
+        for key in ("bias_real", "mae", "rms", "corr", "d90", "fss_condensed",
+                    "fss_condensed_weighted", "fss_condensed_weighted_rect"):
+            assert single[key] == pytest.approx(double[key], rel=1e-4, abs=1e-5), key
+        np.testing.assert_allclose(single["fssf"].values, double["fssf"].values, atol=1e-4)
+        assert isinstance(single["mae"], np.float64)
+
+
 # =====================================================================
 # write_scores_to_csv
 # =====================================================================
@@ -418,3 +691,53 @@ class TestWriteScoresToCsv:
         csv_files = list(tmp_path.glob("*.csv"))
         assert len(csv_files) == 1
         assert csv_files[0].stat().st_size > 0
+
+    def test_saved_percentiles_match_numpy(self, make_test_args, make_sim_dict, small_fields, tmp_path):
+        from unittest.mock import patch
+        from datetime import datetime
+
+        args = make_test_args()
+        args.save_percentiles = True
+        obs_f, fcst_f = small_fields
+        data_list = [make_sim_dict(obs_f, "OBS", "obs"), make_sim_dict(fcst_f, "M0")]
+        for sim in data_list:
+            scoring.calc_scores(sim, data_list[0], args)
+        scoring.rank_scores(data_list)
+
+        with patch("scoring.PAN_DIR_SCORES", str(tmp_path)):
+            scoring.write_scores_to_csv(
+                data_list, datetime(2024, 1, 1), datetime(2024, 1, 1, 1), args, "TestDom",
+                parameter_settings.get_windows(args), parameter_settings.get_fss_thresholds(args))
+
+        scores = pd.read_csv(next(tmp_path.glob("*RR_score_*.csv")), sep=";")
+        percs = pd.read_csv(next(tmp_path.glob("*RR_percentiles_*.csv")), sep=";")
+        for ii, sim in enumerate(data_list):
+            field = sim["precip_data_resampled"]
+            np.testing.assert_allclose(percs.iloc[ii, 4:].to_numpy(float),
+                                       np.percentile(field, np.arange(0, 101)), rtol=1e-12)
+            np.testing.assert_allclose(scores.loc[ii, ["99th", "95th", "90th", "75th", "50th"]].to_numpy(float),
+                                       np.percentile(field, [99., 95., 90., 75., 50.]), rtol=1e-12)
+
+
+class TestCalcScoresBackends:
+    """--fss_method selects the FSS backend, see fss_backends.py."""
+
+    @pytest.mark.parametrize("method", ["auto", "uniform_filter"])
+    def test_exact_backends_match_default(self, make_test_args, make_sim_dict, small_fields, method):
+        obs_f, fcst_f = small_fields
+        obs = make_sim_dict(obs_f, "OBS", "obs")
+        ref = scoring.calc_scores(make_sim_dict(fcst_f), obs, make_test_args())
+        args = make_test_args()
+        args.fss_method = method
+        got = scoring.calc_scores(make_sim_dict(fcst_f), obs, args)
+        for key in ("fss", "fssp", "fss_overestimated"):
+            pd.testing.assert_frame_equal(got[key], ref[key])
+        assert got["d90"] == ref["d90"]
+
+    def test_legacy_runs(self, make_test_args, make_sim_dict, small_fields):
+        args = make_test_args()
+        args.fss_method = "legacy"
+        obs_f, fcst_f = small_fields
+        sim = scoring.calc_scores(make_sim_dict(fcst_f), make_sim_dict(obs_f, "OBS", "obs"), args)
+        assert sim["fss"].shape == (len(parameter_settings.get_fss_thresholds(args)),
+                                    len(parameter_settings.get_windows(args)))
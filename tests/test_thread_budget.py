@@ -0,0 +1,56 @@
+"""Tests for thread_budget.py — splitting --threads between nested parallelism."""
+
+import numpy as np
+import pytest
+
+import fss_SAT
+import thread_budget
+
+
+class TestAllocate:
+
+    @pytest.mark.parametrize("threads", [1, 2, 8, 128])
+    @pytest.mark.parametrize("n_tasks", [1, 3, 8, 500])
+    @pytest.mark.parametrize("inner_tasks", [1, 4, 12])
+    def test_never_oversubscribes(self, threads, n_tasks, inner_tasks):
+        alloc = thread_budget.allocate(threads, n_tasks, inner_tasks=inner_tasks)
+        assert 1 <= alloc.outer <= n_tasks
+        assert 1 <= alloc.inner <= inner_tasks
+        assert alloc.blas >= 1
+        assert alloc.outer * alloc.inner * alloc.blas <= threads
+
+    def test_outer_first_then_inner_then_blas(self):
+        alloc = thread_budget.allocate(128, 8, inner_tasks=4)
+        assert (alloc.outer, alloc.inner, alloc.blas) == (8, 4, 4)
+        alloc = thread_budget.allocate(128, 500, inner_tasks=4)
+        assert (alloc.outer, alloc.inner, alloc.blas) == (128, 1, 1)
+
+    def test_reports_allocation(self, caplog):
+        with caplog.at_level("INFO", logger="thread_budget"):
+            thread_budget.allocate(16, 4, "scoring", inner_tasks=2)
+        assert "4 workers x 2 inner jobs x 2 BLAS threads" in caplog.text
+
+    def test_environ_for_subprocesses(self):
+        env = thread_budget.allocate(8, 2).environ()
+        for var in thread_budget.BLAS_ENV_VARS:
+            assert env[var] == "4"
+
+    def test_without_threadpoolctl(self, monkeypatch):
+        monkeypatch.setattr(thread_budget, "threadpoolctl", None)
+        assert thread_budget.limit_blas(2) is None
+        with thread_budget.allocate(4, 1) as alloc:
+            assert alloc.blas == 4
+
+
+class TestInnerThresholdJobs:
+
+    def test_threads_match_serial(self, small_fields):
+        obs, fcst = small_fields
+        windows = [(3, 3), (11, 11), (21, 21)]
+        thresholds = [0.1, 1.0, 5.0, 10.0, 40.0]
+        cache = fss_SAT.ObsFSSCache(obs)
+        serial = fss_SAT.fss_cumsum_frame(fcst, obs, windows, thresholds, raw=True)
+        threaded = fss_SAT.fss_cumsum_frame(fcst, obs, windows, thresholds, raw=True, n_jobs=3,
+                                            obs_cache=cache)
+        np.testing.assert_array_equal(threaded, serial)
+        assert cache.misses > 0